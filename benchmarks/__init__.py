@@ -0,0 +1,7 @@
+""" Benchmarks for xlsx-reader
+
+Run from the top-level directory, e.g.
+
+    python3 -m benchmarks.engines
+
+"""
@@ -0,0 +1,58 @@
+""" Compare rows/sec for each sheet parser engine on a generated wide sheet
+
+Runs each engine in turn for several rounds, so that a noisy machine
+slows them all alike, and prints the range and median of each engine's
+speed relative to the "sax" engine across the rounds. Look at the
+range, not only the median: a single run can be far off either way.
+
+Usage:
+
+    python3 -m benchmarks.engines [rows] [cols] [rounds]
+
+"""
+
+import os, statistics, sys, tempfile, time, xlsxr, xlsxr.engines
+
+from benchmarks.generate import generate
+
+
+def time_engine(filename, engine, repeat=3):
+    """ Return the number of rows and the best time in seconds to read the sheet with an engine """
+    workbook = xlsxr.Workbook(filename=filename, engine=engine)
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        count = 0
+        for row in workbook.sheets[0].iter_rows():
+            count += 1
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return count, best
+
+
+def main(rows=2000, cols=300, rounds=5):
+    engines = xlsxr.engines.available_engines()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "wide.xlsx")
+        generate(filename, "wide", rows, cols)
+        times = {engine: [] for engine in engines}
+        for i in range(rounds):
+            for engine in engines:
+                count, seconds = time_engine(filename, engine, repeat=1)
+                times[engine].append(seconds)
+        baseline = times[xlsxr.engines.SAXSheetEngine.name]
+        for engine in engines:
+            speedups = [base / seconds for base, seconds in zip(baseline, times[engine])]
+            print("{:8s} {:10.0f} rows/sec  {:.2f}x median, {:.2f}-{:.2f}x over {} rounds".format(
+                engine,
+                count / statistics.median(times[engine]),
+                statistics.median(speedups),
+                min(speedups),
+                max(speedups),
+                rounds,
+            ))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
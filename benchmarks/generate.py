@@ -0,0 +1,200 @@
+""" Deterministic generator for large XLSX benchmark fixtures
+
+Writes minimal but valid Excel XLSX workbooks directly with zipfile,
+so that no copy of Excel is needed. The same arguments always
+produce the same workbook.
+
+Usage:
+
+    python3 -m benchmarks.generate wide /tmp/wide.xlsx [rows] [cols] [sheets]
+
+"""
+
+import random, sys, zipfile
+
+from xml.sax.saxutils import escape
+
+from xlsxr.util import col_letters
+
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/><Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>{sheets}<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/><Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>"""
+
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>"""
+
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{sheets}</sheets></workbook>"""
+
+WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{sheets}<Relationship Id="styles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/><Relationship Id="sharedStrings" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/></Relationships>"""
+
+CONTENT_TYPE_SHEET = """<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>"""
+
+WORKBOOK_SHEET = """<sheet name="Sheet{n}" sheetId="{n}" state="visible" r:id="rId{n}"/>"""
+
+WORKBOOK_RELS_SHEET = """<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{n}.xml"/>"""
+
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy\\-mm\\-dd"/></numFmts><cellStyleXfs count="1"><xf numFmtId="0"/></cellStyleXfs><cellXfs count="2"><xf numFmtId="0" xfId="0"/><xf numFmtId="164" xfId="0" applyNumberFormat="1"/></cellXfs><cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>"""
+
+DATE_STYLE = 1
+""" Index into cellXfs of the date style in STYLES """
+
+WORDS = [
+    "WASH", "Health", "Education", "Protection", "Shelter", "Nutrition",
+    "Logistics", "Food Security", "Camp Management", "Early Recovery",
+]
+
+
+class SharedStrings:
+    """ Accumulate the shared-string table for a generated workbook """
+
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+
+    def add(self, s):
+        """ Return the index of a string, adding it if necessary """
+        if s not in self.index:
+            self.index[s] = len(self.strings)
+            self.strings.append(s)
+        return self.index[s]
+
+    def to_xml(self):
+        parts = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" uniqueCount="{}">'.format(len(self.strings))]
+        for s in self.strings:
+            parts.append('<si><t xml:space="preserve">{}</t></si>'.format(escape(s)))
+        parts.append('</sst>')
+        return ''.join(parts)
+
+
+def cell_mixed(rng, strings, row_num, col_num):
+    """ Mixed numbers and repetitive shared strings """
+    if col_num % 3 == 0:
+        return ' t="s"', '<v>{}</v>'.format(strings.add(rng.choice(WORDS)))
+    elif col_num % 3 == 1:
+        return ' t="n"', '<v>{}</v>'.format(rng.randint(0, 100000))
+    else:
+        return ' t="n"', '<v>{:.4f}</v>'.format(rng.random() * 1000)
+
+def cell_strings(rng, strings, row_num, col_num):
+    """ Mostly-unique shared strings, for a large shared-string table """
+    return ' t="s"', '<v>{}</v>'.format(strings.add("{} {}-{}".format(rng.choice(WORDS), row_num, rng.randint(0, 1000000))))
+
+def cell_inline(rng, strings, row_num, col_num):
+    """ Inline strings, with no shared-string table """
+    return ' t="inlineStr"', '<is><t>{} {}</t></is>'.format(escape(rng.choice(WORDS)), row_num)
+
+def cell_dates(rng, strings, row_num, col_num):
+    """ Date-formatted serial numbers, alternating with plain numbers """
+    if col_num % 2 == 0:
+        return ' s="{}" t="n"'.format(DATE_STYLE), '<v>{}</v>'.format(rng.randint(36526, 47482)) # 2000-2029
+    else:
+        return ' t="n"', '<v>{}</v>'.format(rng.randint(0, 100000))
+
+def cell_sparse(rng, strings, row_num, col_num):
+    """ About one cell in twenty, and some rows missing entirely """
+    if row_num % 7 == 0 or rng.random() > 0.05:
+        return None
+    return cell_mixed(rng, strings, row_num, col_num)
+
+def merges_banners(rows, cols):
+    """ A full-width banner merge every 10 rows, and 2x2 blocks in between """
+    last_col = col_letters(cols - 1)
+    for row_num in range(1, rows + 1, 10):
+        yield "A{}:{}{}".format(row_num, last_col, row_num)
+        if row_num + 2 <= rows:
+            for col_num in range(0, cols - 1, 4):
+                yield "{}{}:{}{}".format(col_letters(col_num), row_num + 1, col_letters(col_num + 1), row_num + 2)
+
+
+class Kind:
+    """ A kind of generated workbook, with its default size """
+
+    def __init__(self, make_cell, rows, cols, make_merges=None, sheets=1):
+        self.make_cell = make_cell
+        self.rows = rows
+        self.cols = cols
+        self.make_merges = make_merges
+        self.sheets = sheets
+
+
+KINDS = {
+    "tall": Kind(cell_mixed, 100000, 10),
+    "wide": Kind(cell_mixed, 2000, 300),
+    "strings": Kind(cell_strings, 20000, 20),
+    "inline": Kind(cell_inline, 20000, 20),
+    "dates": Kind(cell_dates, 20000, 20),
+    "sparse": Kind(cell_sparse, 50000, 100),
+    "merges": Kind(cell_mixed, 20000, 20, merges_banners),
+    "tabs": Kind(cell_mixed, 5000, 10, sheets=24),
+}
+""" Workbook kinds by name """
+
+
+def sheet_rows(kind, rows, cols, strings, seed=0):
+    """ Yield the XML for the <row> elements of a generated sheet """
+    rng = random.Random(seed)
+    make_cell = KINDS[kind].make_cell
+    letters = [col_letters(col_num) for col_num in range(cols)]
+    for row_num in range(1, rows + 1):
+        cells = []
+        for col_num in range(cols):
+            cell = make_cell(rng, strings, row_num, col_num)
+            if cell is not None:
+                attributes, content = cell
+                cells.append('<c r="{}{}"{}>{}</c>'.format(letters[col_num], row_num, attributes, content))
+        if cells:
+            yield '<row r="{}">{}</row>'.format(row_num, ''.join(cells))
+
+
+def generate(filename, kind, rows=None, cols=None, sheets=None, seed=0):
+    """ Write a generated workbook
+
+    Parameters:
+      filename(str): the path of the XLSX file to create
+      kind(str): the kind of content (a key in KINDS)
+      rows(int): the number of rows in each sheet (default for the kind if None)
+      cols(int): the number of columns in each sheet (default for the kind if None)
+      sheets(int): the number of sheets (default for the kind if None)
+      seed(int): the random seed, for repeatable output
+
+    """
+    if rows is None:
+        rows = KINDS[kind].rows
+    if cols is None:
+        cols = KINDS[kind].cols
+    if sheets is None:
+        sheets = KINDS[kind].sheets
+    make_merges = KINDS[kind].make_merges
+    strings = SharedStrings()
+
+    def each_sheet(template):
+        return ''.join(template.format(n=n) for n in range(1, sheets + 1))
+
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES.format(sheets=each_sheet(CONTENT_TYPE_SHEET)))
+        archive.writestr("_rels/.rels", ROOT_RELS)
+        archive.writestr("xl/workbook.xml", WORKBOOK.format(sheets=each_sheet(WORKBOOK_SHEET)))
+        archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS.format(sheets=each_sheet(WORKBOOK_RELS_SHEET)))
+        archive.writestr("xl/styles.xml", STYLES)
+        for n in range(1, sheets + 1):
+            with archive.open("xl/worksheets/sheet{}.xml".format(n), "w", force_zip64=True) as output:
+                output.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><dimension ref="A1:{}{}"/><sheetData>'.format(col_letters(cols - 1), rows).encode('utf-8'))
+                for row in sheet_rows(kind, rows, cols, strings, seed + n - 1):
+                    output.write(row.encode('utf-8'))
+                output.write(b'</sheetData>')
+                if make_merges is not None:
+                    merges = ''.join('<mergeCell ref="{}"/>'.format(ref) for ref in make_merges(rows, cols))
+                    output.write('<mergeCells>{}</mergeCells>'.format(merges).encode('utf-8'))
+                output.write(b'</worksheet>')
+        archive.writestr("xl/sharedStrings.xml", strings.to_xml())
+
+
+if __name__ == '__main__':
+    if not 3 <= len(sys.argv) <= 6 or sys.argv[1] not in KINDS:
+        print("Usage: python3 -m benchmarks.generate <kind> <output.xlsx> [rows] [cols] [sheets]", file=sys.stderr)
+        print("Kinds: " + ", ".join(KINDS), file=sys.stderr)
+        sys.exit(2)
+    generate(sys.argv[2], sys.argv[1], *[int(arg) for arg in sys.argv[3:]])
@@ -0,0 +1,241 @@
+""" Benchmark runner for xlsx-reader
+
+Generates (or reuses) one workbook of each kind, then measures each
+case in a fresh Python process so that peak RSS belongs to that case
+alone. Results are written as JSON, and two result files (e.g. from
+two commits) can be compared to catch regressions.
+
+Usage:
+
+    python3 -m benchmarks.run [--kinds tall,wide] [--scale 0.1] [--engine expat] [--output results.json]
+    python3 -m benchmarks.run --compare before.json after.json [--threshold 0.1]
+
+Cases:
+
+- open: construct the Workbook (relations, shared strings, styles)
+- rows: read the whole first sheet into a list with Sheet.rows
+- iter: stream the first sheet with Sheet.iter_rows()
+- batches: stream the first sheet with Sheet.iter_batches() (rows are
+  counted by batch). The batches come from Sheet.iter_rows(), so this
+  measures the same parsing as iter, with a batch held in memory.
+- load: load the first sheet into an in-memory SQLite table, one
+  cursor.execute() for each row from Sheet.iter_rows()
+- load-batches: the same, with one cursor.executemany() for each batch
+  from Sheet.iter_batches()
+- csv: stream the first sheet through csv.writer, like xlsxr convert
+- sheets: read every sheet with Workbook.read_sheets(), in one worker
+  process per CPU (rows are counted across all sheets)
+- pieces: stream the first sheet with Sheet.iter_rows_parallel(), in one
+  worker process per CPU
+
+Metrics for each case: seconds, rows_per_sec, first_row_sec (time to
+the first row, counting from before the Workbook is opened), and
+peak_rss_kb.
+
+"""
+
+import argparse, csv, json, os, platform, resource, sqlite3, subprocess, sys, tempfile, time
+
+from benchmarks.generate import KINDS, generate
+
+
+CASES = ("open", "rows", "iter", "batches", "csv", "load", "load-batches", "sheets", "pieces",)
+""" Names of the cases to measure """
+
+HIGHER_IS_BETTER = ("rows_per_sec",)
+LOWER_IS_BETTER = ("seconds", "first_row_sec", "peak_rss_kb",)
+
+
+def measure(case, filename, engine=None):
+    """ Measure one case in the current process, and return a dict of metrics
+
+    Should normally run in a fresh process (see run_case), so that peak
+    RSS is not inflated by earlier work.
+
+    """
+    import xlsxr # not imported at the top level, so that RSS is measured from a clean start
+
+    start = time.perf_counter()
+    first_row = None
+    count = 0
+
+    workbook = xlsxr.Workbook(filename=filename, engine=engine)
+    sheet = workbook.sheets[0]
+
+    if case == "rows":
+        rows = sheet.rows
+        first_row = time.perf_counter()
+        count = len(rows)
+
+    elif case in ("iter", "pieces",):
+        for row in sheet.iter_rows() if case == "iter" else sheet.iter_rows_parallel():
+            if first_row is None:
+                first_row = time.perf_counter()
+            count += 1
+
+    elif case == "batches":
+        for batch in sheet.iter_batches():
+            if first_row is None:
+                first_row = time.perf_counter()
+            count += len(batch)
+
+    elif case == "csv":
+        with open(os.devnull, "w", newline='') as output:
+            writer = csv.writer(output)
+            for row in sheet.iter_rows():
+                if first_row is None:
+                    first_row = time.perf_counter()
+                writer.writerow(row)
+                count += 1
+
+    elif case in ("load", "load-batches",):
+        # a loader needs the same number of values in every row, so project all the columns
+        width = len(sheet.header())
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE data ({})".format(", ".join("c{}".format(i) for i in range(width))))
+        insert = "INSERT INTO data VALUES ({})".format(", ".join("?" * width))
+        if case == "load":
+            for row in sheet.iter_rows(columns=list(range(width))):
+                if first_row is None:
+                    first_row = time.perf_counter()
+                connection.execute(insert, row)
+                count += 1
+        else:
+            for batch in sheet.iter_batches(columns=list(range(width))):
+                if first_row is None:
+                    first_row = time.perf_counter()
+                connection.executemany(insert, batch)
+                count += len(batch)
+        connection.commit()
+
+    elif case == "sheets":
+        for sheet, rows in workbook.iter_all_sheets():
+            if first_row is None:
+                first_row = time.perf_counter()
+            count += len(rows)
+
+    elif case != "open":
+        raise ValueError("Unknown benchmark case: {}".format(case))
+
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "rows": count,
+        "rows_per_sec": count / seconds if count else None,
+        "first_row_sec": first_row - start if first_row is not None else None,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "engine": workbook.engine,
+    }
+
+
+def run_case(case, filename, engine=None):
+    """ Measure one case in a child process, and return a dict of metrics """
+    command = [sys.executable, "-m", "benchmarks.run", "--measure", case, filename]
+    if engine is not None:
+        command += ["--engine", engine]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(output)
+
+
+def fixture(fixtures_dir, kind, scale):
+    """ Return the path to a generated workbook, creating it if it doesn't exist yet """
+    rows = max(1, int(KINDS[kind].rows * scale))
+    cols = KINDS[kind].cols
+    filename = os.path.join(fixtures_dir, "{}-{}x{}.xlsx".format(kind, rows, cols))
+    if not os.path.exists(filename):
+        print("Generating {}".format(filename), file=sys.stderr)
+        generate(filename, kind, rows, cols)
+    return filename
+
+
+def run(kinds, cases, scale, fixtures_dir, engine=None):
+    """ Run the benchmarks and return the results as a JSON-ready dict """
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "results": {},
+    }
+    for kind in kinds:
+        filename = fixture(fixtures_dir, kind, scale)
+        for case in cases:
+            key = "{}/{}".format(kind, case)
+            metrics = run_case(case, filename, engine)
+            metrics["file_size"] = os.path.getsize(filename)
+            results["results"][key] = metrics
+            print("{:20s} {:8.3f}s {:>12s} rows/sec {:>8s}s first row {:8d} KB".format(
+                key,
+                metrics["seconds"],
+                "-" if metrics["rows_per_sec"] is None else "{:.0f}".format(metrics["rows_per_sec"]),
+                "-" if metrics["first_row_sec"] is None else "{:.3f}".format(metrics["first_row_sec"]),
+                metrics["peak_rss_kb"],
+            ), file=sys.stderr)
+    return results
+
+
+def compare(before, after, threshold=0.1):
+    """ Compare two result sets, and return a list of regression messages
+
+    A metric regresses if it is worse by more than threshold (a fraction).
+
+    """
+    regressions = []
+    print("{:20s} {:14s} {:>14s} {:>14s} {:>7s}".format("case", "metric", "before", "after", "better"))
+    for key, new in sorted(after["results"].items()):
+        old = before["results"].get(key)
+        if old is None:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if not old.get(metric) or new.get(metric) is None:
+                continue
+            change = (new[metric] - old[metric]) / old[metric]
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            status = "REGRESSION" if change > threshold else "ok"
+            print("{:20s} {:14s} {:>14.3f} {:>14.3f} {:+7.1%} {}".format(
+                key, metric, old[metric], new[metric], -change, status
+            ))
+            if change > threshold:
+                regressions.append("{} {} worse by {:.1%}".format(key, metric, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.run", description="Benchmark xlsx-reader on generated workbooks")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="comma-separated workbook kinds ({})".format(", ".join(KINDS)))
+    parser.add_argument("--cases", default=",".join(CASES), help="comma-separated cases ({})".format(", ".join(CASES)))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the default row count of each kind by this")
+    parser.add_argument("--engine", default=None, help="parser engine to use (default: auto)")
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "xlsxr-benchmarks"), help="where to keep generated workbooks")
+    parser.add_argument("--output", "-o", default=None, help="write the JSON results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two JSON result files")
+    parser.add_argument("--threshold", type=float, default=0.1, help="fractional change that counts as a regression (default 0.1)")
+    parser.add_argument("--measure", nargs=2, metavar=("CASE", "FILENAME"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure[0], args.measure[1], args.engine)))
+        return 0
+
+    if args.compare:
+        with open(args.compare[0]) as input:
+            before = json.load(input)
+        with open(args.compare[1]) as input:
+            after = json.load(input)
+        regressions = compare(before, after, args.threshold)
+        for message in regressions:
+            print(message, file=sys.stderr)
+        return 1 if regressions else 0
+
+    os.makedirs(args.fixtures_dir, exist_ok=True)
+    results = run(args.kinds.split(","), args.cases.split(","), args.scale, args.fixtures_dir, args.engine)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,6 +13,13 @@ setup(
     author='David Megginson',
     author_email='megginson@un.org',
     install_requires=['requests',],
+    extras_require={
+        'numpy': ['numpy',],
+        'arrow': ['pyarrow',],
+    },
     packages=['xlsxr',],
+    entry_points={
+        'console_scripts': ['xlsxr = xlsxr.cli:main',],
+    },
     test_suite='tests'
 )
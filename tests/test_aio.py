@@ -0,0 +1,174 @@
+""" Unit tests for the xlsxr.aio module, using a local HTTP server
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import asyncio, http.server, os, shutil, tempfile, threading, time, xlsxr, xlsxr.aio
+
+from unittest import mock
+from benchmarks.generate import generate
+from xlsxr.aio import AsyncWorkbook
+
+from .test_source import RangeHandler
+
+class TestAsync(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filename = os.path.join(cls.tmpdir.name, "tabs.xlsx")
+        generate(cls.filename, "tabs", 3000, 6, sheets=2)
+        cls.count = 6
+        for i in range(cls.count):
+            shutil.copyfile(cls.filename, os.path.join(cls.tmpdir.name, "copy{}.xlsx".format(i)))
+        cls.expected = [sheet.rows for sheet in xlsxr.Workbook(filename=cls.filename).sheets]
+
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        cls.server.directory = cls.tmpdir.name
+        cls.server.bytes_sent = 0
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = "http://127.0.0.1:{}/".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmpdir.cleanup()
+
+    async def ingest(self, source, **options):
+        """ Read every sheet of a workbook, and return the rows """
+        async with await AsyncWorkbook.open(source) as workbook:
+            return [[row async for row in sheet.aiter_rows(**options)] for sheet in workbook.sheets]
+
+    def test_concurrent_urls(self):
+        """ Many remote workbooks are read at once, without stalling the event loop """
+        async def main():
+            gaps = []
+            done = asyncio.Event()
+
+            async def ticker():
+                last = time.monotonic()
+                while not done.is_set():
+                    await asyncio.sleep(0.005)
+                    now = time.monotonic()
+                    gaps.append(now - last)
+                    last = now
+
+            tick = asyncio.ensure_future(ticker())
+            urls = [self.base_url + "copy{}.xlsx".format(i) for i in range(self.count)]
+            results = await asyncio.gather(*[self.ingest(url, batch_size=200) for url in urls])
+            done.set()
+            await tick
+            return results, gaps
+
+        results, gaps = asyncio.run(main())
+        for result in results:
+            self.assertEqual(self.expected, result)
+        self.assertGreater(len(gaps), 10)
+        self.assertLess(max(gaps), 0.5)
+
+    def test_sources(self):
+        with open(self.filename, "rb") as input:
+            for source in (self.filename, os.path.join(self.tmpdir.name, "copy0.xlsx"), input,):
+                with self.subTest(source=source):
+                    self.assertEqual(self.expected, asyncio.run(self.ingest(source)))
+
+    def test_options(self):
+        async def main():
+            workbook = await AsyncWorkbook.open(self.filename, convert_values=True)
+            sheet = workbook.get_sheet(workbook.sheets[1].name)
+            rows = [row async for row in sheet.aiter_rows(columns=[2, 0], min_row=10, max_row=2500, batch_size=7)]
+            return rows, await sheet.row(20), await sheet.cell("B30"), await sheet.header()
+
+        rows, row, cell, header = asyncio.run(main())
+        sheet = xlsxr.Workbook(filename=self.filename, convert_values=True).sheets[1]
+        self.assertEqual(list(sheet.iter_rows(columns=[2, 0], min_row=10, max_row=2500)), rows)
+        self.assertEqual(sheet.rows[19], row)
+        self.assertEqual(sheet.rows[29][1], cell)
+        self.assertEqual(sheet.rows[0], header)
+
+    def test_lazy_shared_strings(self):
+        """ Sheets read at once share the workbook's lazy shared strings safely """
+        filename = os.path.join(self.tmpdir.name, "strings.xlsx")
+        generate(filename, "strings", 600, 10, sheets=2)
+        expected = [sheet.rows for sheet in xlsxr.Workbook(filename=filename).sheets]
+
+        async def main():
+            async with await AsyncWorkbook.open(filename, lazy_shared_strings=True) as workbook:
+                workbook.workbook.shared_strings.cache_size = 256 # mostly misses
+                async def read(sheet):
+                    return [row async for row in sheet.aiter_rows(batch_size=50)]
+                return await asyncio.gather(*[read(sheet) for sheet in workbook.sheets * 3])
+
+        self.assertEqual(expected * 3, asyncio.run(main()))
+
+    def test_backpressure(self):
+        """ Parsing stops when the queue is full, until the consumer catches up """
+        parsed = 0
+        real_iter_batches = xlsxr.sheet.Sheet.iter_batches
+
+        def counting_iter_batches(sheet, *args, **kwargs):
+            nonlocal parsed
+            for batch in real_iter_batches(sheet, *args, **kwargs):
+                parsed += len(batch)
+                yield batch
+
+        async def main():
+            workbook = await AsyncWorkbook.open(self.filename)
+            rows = workbook.sheets[0].aiter_rows(batch_size=10, queue_size=2)
+            await rows.__anext__()
+            await asyncio.sleep(0.2)
+            ahead = parsed
+            consumed = 1 + len([row async for row in rows])
+            return ahead, consumed
+
+        with mock.patch("xlsxr.sheet.Sheet.iter_batches", counting_iter_batches):
+            ahead, consumed = asyncio.run(main())
+        self.assertLessEqual(ahead, 10 * 4)
+        self.assertEqual(len(self.expected[0]), consumed)
+
+    def test_early_exit(self):
+        async def main():
+            workbook = await AsyncWorkbook.open(self.filename)
+            result = []
+            async for row in workbook.sheets[0].aiter_rows(batch_size=5):
+                result.append(row)
+                if len(result) == 12:
+                    break
+            result += [row async for row in workbook.sheets[0].aiter_rows(max_row=3)]
+            return result
+
+        self.assertEqual(self.expected[0][:12] + self.expected[0][:3], asyncio.run(main()))
+
+    def test_errors(self):
+        async def main():
+            workbook = await AsyncWorkbook.open(self.filename)
+            return [row async for row in workbook.sheets[0].aiter_rows(names=["No such header"])]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(main())
+        with self.assertRaises(OSError):
+            asyncio.run(AsyncWorkbook.open(self.base_url + "missing.xlsx"))
+        with self.assertRaises(TypeError):
+            asyncio.run(AsyncWorkbook.open(os.path.join(os.path.dirname(__file__), "files", "not-excel.zip")))
+
+    def test_small_pool(self):
+        """ A few threads are enough for many sheets at once """
+        pool = xlsxr.aio.LanePool(2)
+        try:
+            async def main():
+                workbooks = await asyncio.gather(*[
+                    AsyncWorkbook.open(self.base_url + "copy{}.xlsx".format(i), pool=pool) for i in range(self.count)
+                ])
+                async def read(sheet):
+                    return [row async for row in sheet.aiter_rows(batch_size=100, queue_size=1)]
+                return await asyncio.gather(*[read(sheet) for workbook in workbooks for sheet in workbook.sheets])
+            results = asyncio.run(main())
+        finally:
+            pool.shutdown()
+        self.assertEqual(self.expected * self.count, results)
@@ -0,0 +1,123 @@
+""" Unit tests for the xlsxr.arrow module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import datetime, os, tempfile, xlsxr, xlsxr.arrow, xlsxr.columns
+
+from benchmarks.generate import generate
+
+from . import resolve_path
+
+try:
+    import pyarrow, pyarrow.feather, pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestArrow(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.fixtures = {}
+        for kind in ("tall", "strings", "dates", "sparse", "inline",):
+            cls.fixtures[kind] = os.path.join(cls.tmpdir.name, kind + ".xlsx")
+            generate(cls.fixtures[kind], kind, 120, 6)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def expected_rows(self, filename):
+        """ Rows with convert_values, as Arrow would give them back """
+        result = []
+        for row in xlsxr.Workbook(filename=filename, convert_values=True).sheets[0].iter_rows():
+            row = [None if value == '' else value for value in row]
+            result.append(row + [None] * (6 - len(row)))
+        return result
+
+    def test_record_batches(self):
+        for kind, filename in self.fixtures.items():
+            with self.subTest(kind=kind):
+                sheet = xlsxr.Workbook(filename=filename).sheets[0]
+                batches = list(xlsxr.arrow.iter_record_batches(sheet, batch_size=50))
+                self.assertEqual({50}, {batch.num_rows for batch in batches[:-1]})
+                self.assertEqual(1, len({batch.schema for batch in batches}))
+                rows = [list(row.values()) for batch in batches for row in batch.to_pylist()]
+                self.assertEqual(self.expected_rows(filename), rows)
+
+    def test_types(self):
+        sheet = xlsxr.Workbook(filename=self.fixtures["dates"]).sheets[0]
+        schema = next(xlsxr.arrow.iter_record_batches(sheet)).schema
+        self.assertEqual(pyarrow.date32(), schema.field("A").type)
+        self.assertEqual(pyarrow.int64(), schema.field("B").type)
+        sheet = xlsxr.Workbook(filename=self.fixtures["tall"]).sheets[0]
+        self.assertTrue(pyarrow.types.is_dictionary(next(xlsxr.arrow.iter_record_batches(sheet)).schema.field("A").type))
+
+    def test_shared_string_indices(self):
+        workbook = xlsxr.Workbook(filename=self.fixtures["strings"])
+        batch = next(xlsxr.arrow.iter_record_batches(workbook.sheets[0], compact=False))
+        array = batch.column(0)
+        self.assertEqual(len(workbook.shared_strings), len(array.dictionary))
+        self.assertEqual([workbook.shared_strings[i] for i in array.indices.to_pylist()], array.to_pylist())
+
+    def test_compact_dictionaries(self):
+        sheet = xlsxr.Workbook(filename=self.fixtures["strings"]).sheets[0]
+        batches = list(xlsxr.arrow.iter_record_batches(sheet, batch_size=50))
+        for before, after in zip(batches, batches[1:]):
+            previous = before.column(0).dictionary.to_pylist()
+            self.assertEqual(previous, after.column(0).dictionary.to_pylist()[:len(previous)])
+        self.assertEqual(len(set(batches[0].column(0).to_pylist())), len(batches[0].column(0).dictionary))
+
+    def test_header(self):
+        sheet = xlsxr.Workbook(filename=resolve_path("simple.xlsx")).sheets[0]
+        batch = next(xlsxr.arrow.iter_record_batches(sheet, header=True))
+        self.assertEqual(['Qué?', 'B', 'C', 'Quién?', 'Para quién?', 'F', 'Dónde?', 'H', 'Cuándo?'], batch.schema.names)
+        self.assertEqual(7, batch.num_rows)
+
+    def test_type_change(self):
+        sheet = xlsxr.Workbook(filename=resolve_path("simple.xlsx")).sheets[0]
+        schema = pyarrow.schema([(name, pyarrow.float64()) for name in "ABCDEFGHI"])
+        with self.assertRaises(ValueError):
+            list(xlsxr.arrow.iter_record_batches(sheet, schema=schema))
+
+    def test_int_columns(self):
+        """ Columns of whole numbers are int64, not float64 """
+        column = xlsxr.columns.Column("A", 0)
+        for index, value in enumerate((1.0, 2.0, 3.0,)):
+            column._append(index, "float", value)
+        column._finish(3)
+        self.assertEqual("int", column.kind)
+        array = xlsxr.arrow.column_to_arrow(column, None)
+        self.assertEqual(pyarrow.int64(), array.type)
+        self.assertEqual([1, 2, 3], array.to_pylist())
+
+    def test_early_dates(self):
+        """ Serial numbers before 1900-03-01 allow for the imaginary 1900-02-29, as in Column.to_list() """
+        for kind in ("date", "datetime",):
+            with self.subTest(kind=kind):
+                column = xlsxr.columns.Column("A", 0)
+                for index, serial in enumerate((1.0, 59.25, 60.0, 61.75, 36526.5)):
+                    column._append(index, kind, serial)
+                column._finish(5)
+                self.assertEqual(column.to_list(), xlsxr.arrow.column_to_arrow(column, None).to_pylist())
+
+    def test_write_parquet(self):
+        filename = os.path.join(self.tmpdir.name, "dates.parquet")
+        sheet = xlsxr.Workbook(filename=self.fixtures["dates"]).sheets[0]
+        self.assertEqual(120, xlsxr.arrow.write_parquet(sheet, filename, batch_size=50))
+        table = pyarrow.parquet.read_table(filename)
+        self.assertEqual(self.expected_rows(self.fixtures["dates"]), [list(row.values()) for row in table.to_pylist()])
+        self.assertEqual(datetime.date, type(table.column("A")[0].as_py()))
+
+    def test_write_feather(self):
+        filename = os.path.join(self.tmpdir.name, "strings.feather")
+        sheet = xlsxr.Workbook(filename=self.fixtures["strings"]).sheets[0]
+        self.assertEqual(120, xlsxr.arrow.write_feather(sheet, filename, batch_size=50))
+        table = pyarrow.feather.read_table(filename)
+        self.assertEqual(self.expected_rows(self.fixtures["strings"]), [list(row.values()) for row in table.to_pylist()])
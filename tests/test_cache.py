@@ -0,0 +1,171 @@
+""" Unit tests for the xlsxr.cache module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import concurrent.futures, datetime, os, shutil, tempfile, time, xlsxr, xlsxr.cache
+
+from unittest import mock
+from benchmarks.generate import generate
+
+from . import resolve_path
+
+def read_cached(filename, cache_dir):
+    """ Open a workbook through the cache and return its rows (for worker processes) """
+    workbook = xlsxr.Workbook(filename=filename, cache_dir=cache_dir)
+    return [sheet.rows for sheet in workbook.sheets]
+
+
+class TestCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filename = os.path.join(cls.tmpdir.name, "merges.xlsx")
+        generate(cls.filename, "merges", 200, 10, sheets=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(dir=self.tmpdir.name)
+
+    def assertSameWorkbook(self, expected, workbook):
+        self.assertEqual(list(expected.shared_strings), list(workbook.shared_strings))
+        self.assertEqual(expected.styles.cell_formats, workbook.styles.cell_formats)
+        self.assertEqual(expected.date1904, workbook.date1904)
+        self.assertEqual(
+            [(sheet.name, sheet.filename, sheet.rows, sheet.merges, sheet.cols,) for sheet in expected.sheets],
+            [(sheet.name, sheet.filename, sheet.rows, sheet.merges, sheet.cols,) for sheet in workbook.sheets],
+        )
+
+    def test_hit(self):
+        for options in ({}, {"convert_values": True, "fill_merged": True}, {"display_values": True, "sparse_rows": True},):
+            with self.subTest(**options):
+                expected = xlsxr.Workbook(filename=self.filename, **options)
+                self.assertSameWorkbook(expected, xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir, **options))
+                self.assertSameWorkbook(expected, xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir, **options))
+
+    def test_no_parsing(self):
+        """ A hit skips parsing the workbook, relations, shared strings, styles, and sheets """
+        rows = [sheet.rows for sheet in xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir, convert_values=True).sheets]
+        with mock.patch("xml.dom.pulldom.parse", side_effect=AssertionError), \
+             mock.patch("xml.sax.parse", side_effect=AssertionError), \
+             mock.patch("xlsxr.workbook.Workbook.parse_shared_strings", side_effect=AssertionError), \
+             mock.patch("xlsxr.sheet.Sheet._Sheet__parse_rows", side_effect=AssertionError):
+            workbook = xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir, convert_values=True)
+            self.assertEqual(rows, [sheet.rows for sheet in workbook.sheets])
+        self.assertIsInstance(workbook.shared_strings._buffer, memoryview) # mapped, not read
+
+    def test_options(self):
+        """ Options that change the values have their own row entries """
+        self.assertEqual(
+            xlsxr.Workbook(filename=self.filename, convert_values=True).sheets[0].rows,
+            xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir, convert_values=True).sheets[0].rows,
+        )
+        strings = xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir).sheets[0].rows
+        self.assertEqual(xlsxr.Workbook(filename=self.filename).sheets[0].rows, strings)
+
+    def test_value_kinds(self):
+        """ Every kind of cell value comes back from a row entry with its type """
+        rows = [
+            ["text", "", 42, -2 ** 63, 2 ** 70, -0.5, True, False, datetime.date(1900, 1, 1), datetime.datetime(2020, 3, 21, 12, 30, 0, 123000)],
+            [],
+            ["Qué?", 1.0],
+        ]
+        workbook = xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir)
+        sheet = workbook.sheets[0]
+        sheet._raw_rows, sheet._raw_merges, sheet._raw_cols = rows, ["A1:B2"], []
+        workbook.cache.save_rows(sheet)
+        sheet = xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir).sheets[0]
+        with mock.patch("xlsxr.sheet.Sheet._Sheet__parse_rows", side_effect=AssertionError):
+            self.assertEqual(rows, sheet.rows)
+        self.assertEqual([[type(value) for value in row] for row in rows], [[type(value) for value in row] for row in sheet.rows])
+        self.assertEqual(["A1:B2"], sheet.merges)
+
+    def test_unsupported_value(self):
+        """ Rows with a value of another type aren't cached """
+        workbook = xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir)
+        sheet = workbook.sheets[0]
+        sheet._raw_rows, sheet._raw_merges, sheet._raw_cols = [[object()]], [], []
+        workbook.cache.save_rows(sheet)
+        self.assertFalse(workbook.cache.load_rows(sheet))
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "POSIX only")
+    def test_unsafe_directory(self):
+        os.chmod(self.cache_dir, 0o777)
+        with self.assertRaises(PermissionError):
+            xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir)
+        os.chmod(self.cache_dir, 0o700)
+        xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir)
+
+    def test_changed_file(self):
+        filename = os.path.join(self.cache_dir, "copy.xlsx")
+        shutil.copyfile(resolve_path("simple.xlsx"), filename)
+        self.assertEqual(
+            xlsxr.Workbook(filename=resolve_path("simple.xlsx")).sheets[0].rows,
+            xlsxr.Workbook(filename=filename, cache_dir=self.cache_dir).sheets[0].rows,
+        )
+        shutil.copyfile(self.filename, filename)
+        self.assertEqual(
+            xlsxr.Workbook(filename=self.filename).sheets[0].rows,
+            xlsxr.Workbook(filename=filename, cache_dir=self.cache_dir).sheets[0].rows,
+        )
+
+    def test_stream(self):
+        expected = xlsxr.Workbook(filename=self.filename)
+        for i in range(2):
+            with open(self.filename, "rb") as input:
+                self.assertSameWorkbook(expected, xlsxr.Workbook(stream=input, cache_dir=self.cache_dir))
+
+    def test_bad_entry(self):
+        """ A corrupt entry is ignored and replaced """
+        expected = xlsxr.Workbook(filename=self.filename).sheets[0].rows
+        xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir).sheets[0].rows
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), "r+b") as output:
+                output.write(b'garbage')
+        with self.assertLogs("xlsxr.cache", "WARNING"):
+            self.assertEqual(expected, xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir).sheets[0].rows)
+        self.assertEqual(expected, xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir).sheets[0].rows)
+
+    def test_eviction(self):
+        workbook = xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir)
+        for sheet in workbook.sheets:
+            sheet.rows
+        paths = {name: os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)}
+        self.assertEqual(3, len(paths))
+        for i, path in enumerate(sorted(paths.values())):
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i,))
+        workbook_entry = workbook.cache_key + xlsxr.cache.WORKBOOK_SUFFIX
+        xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir) # a hit makes the workbook entry most recent
+
+        sizes = sorted(os.path.getsize(path) for name, path in paths.items() if name != workbook_entry)
+        cache = xlsxr.cache.WorkbookCache(self.cache_dir, max_size=os.path.getsize(paths[workbook_entry]) + sizes[-1])
+        cache.evict()
+        remaining = os.listdir(self.cache_dir)
+        self.assertEqual(2, len(remaining))
+        self.assertIn(workbook_entry, remaining)
+
+        cache.max_size = 0
+        cache.evict()
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_concurrent(self):
+        """ Several processes can fill and read the same cache at once """
+        expected = [sheet.rows for sheet in xlsxr.Workbook(filename=self.filename).sheets]
+        with concurrent.futures.ProcessPoolExecutor(4) as executor:
+            for result in executor.map(read_cached, [self.filename] * 8, [self.cache_dir] * 8):
+                self.assertEqual(expected, result)
+        self.assertEqual(3, len(os.listdir(self.cache_dir))) # no temporary files left
+
+    def test_parallel(self):
+        """ A cached workbook can be pickled for worker processes """
+        xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir)
+        workbook = xlsxr.Workbook(filename=self.filename, cache_dir=self.cache_dir)
+        self.assertEqual(xlsxr.Workbook(filename=self.filename).read_sheets(parallel=1), workbook.read_sheets(parallel=2))
@@ -0,0 +1,160 @@
+""" Unit tests for the xlsxr.cli module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import contextlib, csv, io, json, os, subprocess, sys, tempfile, xlsxr, xlsxr.cli
+
+from benchmarks.generate import generate
+
+from . import resolve_path
+
+try:
+    import pyarrow, pyarrow.feather, pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+class TestCLI(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filename = os.path.join(cls.tmpdir.name, "tabs.xlsx")
+        generate(cls.filename, "tabs", 30, 4, sheets=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def expected(self, filename, index=0, **options):
+        return list(xlsxr.Workbook(filename=filename).sheets[index].iter_rows(**options))
+
+    def run_main(self, *argv):
+        """ Run the command line with standard output captured, and return (status, output) """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = xlsxr.cli.main(list(argv))
+        return status, output.getvalue()
+
+    def read_csv(self, filename, **options):
+        with open(filename, "r", encoding="utf-8", newline='') as input:
+            return list(csv.reader(input, **options))
+
+    def test_csv_stdout(self):
+        status, output = self.run_main("convert", resolve_path("simple.xlsx"))
+        self.assertEqual(0, status)
+        self.assertEqual(self.expected(resolve_path("simple.xlsx")), list(csv.reader(io.StringIO(output))))
+
+    def test_output_file(self):
+        for format, extension in (("csv", ".csv",), ("tsv", ".tsv",), ("jsonl", ".jsonl",),):
+            with self.subTest(format=format):
+                filename = os.path.join(self.output_dir.name, "out" + extension)
+                self.assertEqual(0, xlsxr.cli.main(["convert", self.filename, "-o", filename]))
+                if format == "jsonl":
+                    with open(filename, "r", encoding="utf-8") as input:
+                        rows = [json.loads(line) for line in input]
+                else:
+                    rows = self.read_csv(filename, dialect="excel-tab" if format == "tsv" else "excel")
+                self.assertEqual(self.expected(self.filename), rows)
+
+    def test_jsonl_values(self):
+        status, output = self.run_main("convert", "-f", "jsonl", "--convert-values", "-n", "2", self.filename)
+        expected = list(xlsxr.Workbook(filename=self.filename, convert_values=True).sheets[0].iter_rows(limit=2))
+        self.assertEqual(expected, [json.loads(line) for line in output.splitlines()])
+
+    def test_sheet_selection(self):
+        for sheet in ("Sheet2", "2",):
+            with self.subTest(sheet=sheet):
+                status, output = self.run_main("convert", "-s", sheet, self.filename)
+                self.assertEqual(self.expected(self.filename, 1), list(csv.reader(io.StringIO(output))))
+
+    def test_projection(self):
+        status, output = self.run_main("convert", "-c", "D,B", "--min-row", "5", "--max-row", "12", self.filename)
+        self.assertEqual(
+            self.expected(self.filename, columns=["D", "B"], min_row=5, max_row=12),
+            list(csv.reader(io.StringIO(output))),
+        )
+
+    def test_projection_names(self):
+        filename = resolve_path("simple.xlsx")
+        status, output = self.run_main("convert", "--names", "Quién?,Qué?", filename)
+        self.assertEqual(self.expected(filename, names=["Quién?", "Qué?"]), list(csv.reader(io.StringIO(output))))
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            status, output = self.run_main("convert", "--columns", "Qué?", filename)
+        self.assertEqual(1, status)
+        self.assertIn("Qué?", errors.getvalue())
+
+    def test_all_sheets(self):
+        for workers in ("1", "2",):
+            with self.subTest(workers=workers):
+                status, output = self.run_main("convert", "-a", "-d", self.output_dir.name, "-f", "tsv", "-w", workers, self.filename)
+                self.assertEqual(0, status)
+                for index in range(3):
+                    filename = os.path.join(self.output_dir.name, "tabs.Sheet{}.tsv".format(index + 1))
+                    self.assertEqual(self.expected(self.filename, index), self.read_csv(filename, dialect="excel-tab"))
+
+    def test_several_inputs(self):
+        status, output = self.run_main("convert", "-d", self.output_dir.name, self.filename, resolve_path("simple.xlsx"))
+        self.assertEqual(["simple.csv", "tabs.csv"], sorted(os.listdir(self.output_dir.name)))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_formats(self):
+        filename = os.path.join(self.output_dir.name, "out.parquet")
+        self.assertEqual(0, xlsxr.cli.main(["convert", "-s", "2", "-o", filename, self.filename]))
+        table = pyarrow.parquet.read_table(filename)
+        self.assertEqual(self.expected(self.filename, 1)[0], table.schema.names)
+        self.assertEqual(29, table.num_rows)
+        status, output = self.run_main("convert", "-a", "-f", "feather", "--no-header", "-d", self.output_dir.name, self.filename)
+        self.assertEqual(0, status)
+        table = pyarrow.feather.read_table(os.path.join(self.output_dir.name, "tabs.Sheet3.feather"))
+        self.assertEqual(["A", "B", "C", "D"], table.schema.names)
+        self.assertEqual(30, table.num_rows)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_format_errors(self):
+        """ Parquet and Feather need a file, and always hold the whole sheet """
+        for argv in (["-f", "parquet"], ["-f", "feather", "-d", self.output_dir.name, "-n", "5"],):
+            with self.subTest(argv=argv):
+                with contextlib.redirect_stderr(io.StringIO()) as errors:
+                    status, output = self.run_main("convert", *argv, self.filename)
+                self.assertEqual(1, status)
+                self.assertIn(argv[1], errors.getvalue())
+
+    def test_bad_input(self):
+        """ A bad input is reported, and the others are still converted """
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            status, output = self.run_main("convert", "-d", self.output_dir.name, resolve_path("not-excel.zip"), self.filename)
+        self.assertEqual(1, status)
+        self.assertIn("not-excel.zip", errors.getvalue())
+        self.assertEqual(["tabs.csv"], os.listdir(self.output_dir.name))
+
+    def test_list(self):
+        status, output = self.run_main("list", self.filename, resolve_path("simple.xlsx"))
+        self.assertEqual(0, status)
+        workbook = xlsxr.Workbook(filename=self.filename)
+        expected = [
+            [self.filename, str(n), sheet.name, "visible", sheet.dimension, str(sheet.size)]
+            for n, sheet in enumerate(workbook.sheets, 1)
+        ]
+        expected.append([resolve_path("simple.xlsx"), "1", "input-valid", "visible", "A1:I8", str(xlsxr.Workbook(filename=resolve_path("simple.xlsx")).sheets[0].size)])
+        self.assertEqual(expected, list(csv.reader(io.StringIO(output), delimiter="\t")))
+
+    def test_stdin(self):
+        """ A workbook piped to standard input """
+        with open(self.filename, "rb") as input:
+            data = input.read()
+        result = subprocess.run(
+            [sys.executable, "-m", "xlsxr", "convert", "-s", "3"],
+            input=data, stdout=subprocess.PIPE, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        self.assertEqual(self.expected(self.filename, 2), list(csv.reader(io.StringIO(result.stdout.decode("utf-8")))))
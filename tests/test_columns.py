@@ -0,0 +1,130 @@
+""" Unit tests for the xlsxr.columns module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import datetime, os, re, tempfile, xlsxr, zipfile
+
+from benchmarks.generate import generate
+
+from . import resolve_path
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class TestColumns(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.fixtures = {}
+        for kind in ("tall", "dates", "sparse", "inline",):
+            cls.fixtures[kind] = os.path.join(cls.tmpdir.name, kind + ".xlsx")
+            generate(cls.fixtures[kind], kind, 50, 12)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def expected_columns(self, filename):
+        """ Transpose the rows with convert_values, using None for missing cells """
+        rows = list(xlsxr.Workbook(filename=filename, convert_values=True).sheets[0].iter_rows())
+        width = max(len(row) for row in rows)
+        return [[row[i] if i < len(row) and row[i] != '' else None for row in rows] for i in range(width)]
+
+    def test_parity(self):
+        for kind, filename in self.fixtures.items():
+            with self.subTest(kind=kind):
+                columns = xlsxr.Workbook(filename=filename).sheets[0].to_columns()
+                self.assertEqual(self.expected_columns(filename), [column.to_list() for column in columns])
+
+    def test_kinds(self):
+        columns = xlsxr.Workbook(filename=self.fixtures["tall"]).sheets[0].to_columns()
+        self.assertEqual(["string", "int", "float"], [column.kind for column in columns[:3]])
+        self.assertEqual('q', columns[1].values.typecode)
+        columns = xlsxr.Workbook(filename=self.fixtures["dates"]).sheets[0].to_columns()
+        self.assertEqual("date", columns[0].kind)
+
+    def test_shared_string_codes(self):
+        workbook = xlsxr.Workbook(filename=self.fixtures["tall"])
+        column = workbook.sheets[0].to_columns()[0]
+        self.assertEqual([workbook.shared_strings[code] for code in column.values], column.to_list())
+
+    def test_validity(self):
+        sheet = xlsxr.Workbook(filename=self.fixtures["sparse"]).sheets[0]
+        length = len(list(sheet.iter_rows()))
+        for column in sheet.to_columns():
+            self.assertEqual(length, len(column))
+            for value, valid in zip(column.to_list(), column.valid):
+                self.assertEqual(valid == 0, value is None)
+
+    def test_header(self):
+        columns = xlsxr.Workbook(filename=resolve_path("simple.xlsx")).sheets[0].to_columns(header=True)
+        self.assertEqual(['Qué?', 'B', 'C', 'Quién?', 'Para quién?', 'F', 'Dónde?', 'H', 'Cuándo?'], [column.name for column in columns])
+        self.assertEqual(['Registro', None, '001', '002', '003', None, '004'], columns[0].to_list())
+        self.assertEqual("object", columns[4].kind)
+        self.assertEqual(['Hombres', '#targeted+f', 100, None, 250, None, 80], columns[4].to_list())
+        self.assertEqual(datetime.date(2015, 3, 1), columns[8].to_list()[2])
+
+    def test_no_dtype_inference(self):
+        columns = xlsxr.Workbook(filename=self.fixtures["tall"]).sheets[0].to_columns(dtype_inference=False)
+        self.assertEqual({"string"}, {column.kind for column in columns})
+        rows = list(xlsxr.Workbook(filename=self.fixtures["tall"]).sheets[0].iter_rows())
+        self.assertEqual([row[1] for row in rows], columns[1].to_list())
+
+    def make_early_dates(self, name, format_code):
+        """ Copy the dates fixture with serial numbers around Excel's imaginary 1900-02-29 in column A """
+        filename = os.path.join(self.tmpdir.name, name)
+        serials = iter(["1", "59.25", "60", "61.75"] * 13)
+        with zipfile.ZipFile(self.fixtures["dates"]) as input, zipfile.ZipFile(filename, "w") as output:
+            for info in input.infolist():
+                data = input.read(info.filename)
+                if info.filename == "xl/styles.xml":
+                    data = data.replace(rb'formatCode="yyyy\-mm\-dd"', format_code.encode("utf-8"))
+                elif info.filename == "xl/worksheets/sheet1.xml":
+                    data = re.sub(rb'(<c r="A\d+"[^>]*><v>)[^<]*', lambda m: m.group(1) + next(serials).encode("utf-8"), data)
+                output.writestr(info, data)
+        return filename
+
+    def test_early_dates(self):
+        """ Serial numbers before 1900-03-01 allow for the imaginary 1900-02-29, as in the row API """
+        cases = (
+            ("date", r'formatCode="yyyy\-mm\-dd"', [
+                datetime.date(1900, 1, 1), datetime.date(1900, 2, 28), datetime.date(1900, 2, 28), datetime.date(1900, 3, 1),
+            ]),
+            ("datetime", r'formatCode="yyyy\-mm\-dd hh:mm"', [
+                datetime.datetime(1900, 1, 1), datetime.datetime(1900, 2, 28, 6), datetime.datetime(1900, 2, 28), datetime.datetime(1900, 3, 1, 18),
+            ]),
+        )
+        for kind, format_code, first_values in cases:
+            with self.subTest(kind=kind):
+                filename = self.make_early_dates(kind + ".xlsx", format_code)
+                column = xlsxr.Workbook(filename=filename).sheets[0].to_columns()[0]
+                self.assertEqual(kind, column.kind)
+                expected = self.expected_columns(filename)[0]
+                self.assertEqual(first_values, expected[:4])
+                self.assertEqual(expected, column.to_list())
+                if numpy is not None:
+                    self.assertEqual(expected, column.to_numpy().tolist())
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_to_numpy(self):
+        arrays = xlsxr.Workbook(filename=self.fixtures["dates"]).sheets[0].to_numpy()
+        self.assertEqual(numpy.dtype('datetime64[D]'), arrays["A"].dtype)
+        self.assertEqual(numpy.dtype('int64'), arrays["B"].dtype)
+        expected = self.expected_columns(self.fixtures["dates"])
+        self.assertEqual(expected[0], arrays["A"].tolist())
+        self.assertEqual(expected[1], arrays["B"].tolist())
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_to_numpy_masked(self):
+        arrays = xlsxr.Workbook(filename=self.fixtures["sparse"]).sheets[0].to_numpy()
+        expected = self.expected_columns(self.fixtures["sparse"])
+        for i, array in enumerate(arrays.values()):
+            self.assertEqual(expected[i], array.tolist())
@@ -0,0 +1,143 @@
+""" Unit tests for the xlsxr.engines module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import glob, os, tempfile, xlsxr, xlsxr.engines
+
+from benchmarks.generate import KINDS, generate
+
+from . import resolve_path
+from . import test_sheet
+
+class TestEngines(unittest.TestCase):
+
+    def open_workbook(self, engine, **kwargs):
+        return xlsxr.Workbook(filename=resolve_path("simple.xlsx"), engine=engine, **kwargs)
+
+    def test_default_engine(self):
+        workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"))
+        fastest = [name for name in xlsxr.engines.PREFERRED_ENGINES if xlsxr.engines.is_available(name)][0]
+        self.assertEqual(fastest, workbook.engine)
+
+    def test_auto_engine(self):
+        workbook = self.open_workbook("auto")
+        self.assertIn(workbook.engine, xlsxr.engines.PREFERRED_ENGINES)
+        self.assertTrue(xlsxr.engines.is_available(workbook.engine))
+
+    def test_lxml_fallback(self):
+        workbook = self.open_workbook("lxml")
+        if xlsxr.engines.lxml is None:
+            self.assertEqual("expat", workbook.engine)
+        else:
+            self.assertEqual("lxml", workbook.engine)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            self.open_workbook("no-such-engine")
+
+    def test_rows(self):
+        for engine in xlsxr.engines.available_engines():
+            with self.subTest(engine=engine):
+                self.assertEqual(test_sheet.TestSheet.EXPECTED_ROWS, self.open_workbook(engine).sheets[0].rows)
+
+    def test_rows_converted(self):
+        for engine in xlsxr.engines.available_engines():
+            with self.subTest(engine=engine):
+                sheet = self.open_workbook(engine, convert_values=True).sheets[0]
+                self.assertEqual(test_sheet.TestSheet.EXPECTED_ROWS_CONVERTED, sheet.rows)
+
+    def test_cols(self):
+        for engine in xlsxr.engines.available_engines():
+            with self.subTest(engine=engine):
+                self.assertEqual(test_sheet.TestSheet.EXPECTED_COLS, self.open_workbook(engine).sheets[0].cols)
+
+    def test_merges(self):
+        for engine in xlsxr.engines.available_engines():
+            with self.subTest(engine=engine):
+                self.assertEqual(test_sheet.TestSheet.EXPECTED_MERGES, self.open_workbook(engine).sheets[0].merges)
+
+    def test_shared_strings(self):
+        expected = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), engine="sax").shared_strings
+        for engine in xlsxr.engines.available_engines():
+            with self.subTest(engine=engine):
+                self.assertEqual(expected, self.open_workbook(engine).shared_strings)
+
+
+class TestEngineParity(unittest.TestCase):
+    """ Run every fixture through every available engine, and compare with the SAX engine """
+
+    OPTIONS = [
+        {},
+        {"convert_values": True},
+        {"fill_merged": True},
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.fixtures = sorted(glob.glob(resolve_path("*.xlsx")))
+        for kind in KINDS:
+            filename = os.path.join(cls.tmpdir.name, kind + ".xlsx")
+            generate(filename, kind, 30, 12)
+            cls.fixtures.append(filename)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def read(self, filename, engine, options):
+        workbook = xlsxr.Workbook(filename=filename, engine=engine, **options)
+        return [(sheet.rows, sheet.cols, sheet.merges,) for sheet in workbook.sheets]
+
+    def test_parity(self):
+        for filename in self.fixtures:
+            for options in self.OPTIONS:
+                expected = self.read(filename, "sax", options)
+                for engine in xlsxr.engines.available_engines():
+                    with self.subTest(fixture=os.path.basename(filename), engine=engine, options=options):
+                        self.assertEqual(expected, self.read(filename, engine, options))
+
+    def test_projection_parity(self):
+        columns = [5, 0, 11, 2, 5]
+        for filename in self.fixtures:
+            for options in self.OPTIONS:
+                for engine in xlsxr.engines.available_engines():
+                    with self.subTest(fixture=os.path.basename(filename), engine=engine, options=options):
+                        workbook = xlsxr.Workbook(filename=filename, engine=engine, **options)
+                        for sheet in workbook.sheets:
+                            expected = [[row[i] if i < len(row) else '' for i in columns] for row in sheet.iter_rows()]
+                            self.assertEqual(expected, list(sheet.iter_rows(columns=columns)))
+
+    def test_range_parity(self):
+        for filename in self.fixtures:
+            for options in self.OPTIONS:
+                for engine in xlsxr.engines.available_engines():
+                    with self.subTest(fixture=os.path.basename(filename), engine=engine, options=options):
+                        workbook = xlsxr.Workbook(filename=filename, engine=engine, **options)
+                        for sheet in workbook.sheets:
+                            rows = list(sheet.iter_rows())
+                            self.assertEqual(rows[4:11], list(sheet.iter_rows(min_row=5, max_row=11)))
+                            self.assertEqual(rows[2:5], list(sheet.iter_rows(min_row=3, limit=3)))
+
+    def test_positional_parity(self):
+        """ Generated sheets write out every cell, so counting cells gives the same rows as the references """
+        columns = [5, 0, 11, 2]
+        for kind in ("tall", "wide", "strings", "inline", "dates",):
+            filename = os.path.join(self.tmpdir.name, kind + ".xlsx")
+            expected = xlsxr.Workbook(filename=filename).sheets[0]
+            for engine in xlsxr.engines.available_engines():
+                with self.subTest(kind=kind, engine=engine):
+                    sheet = xlsxr.Workbook(filename=filename, engine=engine, positional_cells=True).sheets[0]
+                    self.assertEqual(expected.rows, sheet.rows)
+                    self.assertEqual(list(expected.iter_rows(columns=columns)), list(sheet.iter_rows(columns=columns)))
+            with self.subTest(kind=kind, columns=True):
+                sheet = xlsxr.Workbook(filename=filename, positional_cells=True).sheets[0]
+                self.assertEqual(
+                    [column.to_list() for column in expected.to_columns()],
+                    [column.to_list() for column in sheet.to_columns()],
+                )
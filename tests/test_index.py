@@ -0,0 +1,129 @@
+""" Unit tests for the xlsxr.index module and random access to rows
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import os, pickle, shutil, tempfile, xlsxr, xlsxr.index, xlsxr.inflate, zipfile
+
+from benchmarks.generate import generate
+
+class TestRowIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filename = os.path.join(cls.tmpdir.name, "tall.xlsx")
+        generate(cls.filename, "tall", 3000, 6)
+        cls.sparse_filename = os.path.join(cls.tmpdir.name, "sparse.xlsx")
+        generate(cls.sparse_filename, "sparse", 400, 20)
+        cls.merges_filename = os.path.join(cls.tmpdir.name, "merges.xlsx")
+        generate(cls.merges_filename, "merges", 60, 8, sheets=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        # small checkpoints, so that lookups use several
+        self.checkpoint_interval = xlsxr.inflate.CHECKPOINT_INTERVAL
+        xlsxr.inflate.CHECKPOINT_INTERVAL = 16 * 1024
+
+    def tearDown(self):
+        xlsxr.inflate.CHECKPOINT_INTERVAL = self.checkpoint_interval
+        for name in os.listdir(self.tmpdir.name):
+            if name.endswith(".xlsxr-index"):
+                os.remove(os.path.join(self.tmpdir.name, name))
+
+    def assertRowParity(self, filename, **options):
+        expected = xlsxr.Workbook(filename=filename, **options).sheets[0].rows
+        sheet = xlsxr.Workbook(filename=filename, **options).sheets[0]
+        for row_num in list(range(len(expected), 0, -97)) + [1, 2, len(expected)]:
+            with self.subTest(row_num=row_num):
+                self.assertEqual(expected[row_num - 1], sheet.row(row_num))
+
+    def test_row_parity(self):
+        self.assertRowParity(self.filename)
+        self.assertRowParity(self.filename, convert_values=True)
+
+    def test_sparse_parity(self):
+        """ Missing rows and cells """
+        self.assertRowParity(self.sparse_filename)
+
+    def test_fill_merged(self):
+        self.assertRowParity(self.merges_filename, fill_merged=True)
+
+    def test_stored(self):
+        """ A workbook with no compression """
+        filename = os.path.join(self.tmpdir.name, "stored.xlsx")
+        with zipfile.ZipFile(self.filename) as input, zipfile.ZipFile(filename, "w", zipfile.ZIP_STORED) as output:
+            for info in input.infolist():
+                output.writestr(info.filename, input.read(info.filename))
+        self.assertRowParity(filename)
+
+    def test_cell(self):
+        rows = xlsxr.Workbook(filename=self.filename).sheets[0].rows
+        sheet = xlsxr.Workbook(filename=self.filename).sheets[0]
+        self.assertEqual(rows[2499][3], sheet.cell("D2500"))
+        self.assertEqual(rows[0][0], sheet.cell("$A$1"))
+        self.assertEqual('', sheet.cell("Z10"))
+        self.assertEqual('', sheet.cell("A999999"))
+
+    def test_out_of_range(self):
+        sheet = xlsxr.Workbook(filename=self.filename).sheets[0]
+        for row_num in (0, 3001,):
+            with self.subTest(row_num=row_num):
+                with self.assertRaises(IndexError):
+                    sheet.row(row_num)
+
+    def test_index(self):
+        sheet = xlsxr.Workbook(filename=self.filename).sheets[0]
+        index = sheet.build_index()
+        self.assertEqual(3000, len(index))
+        self.assertEqual(3000, index.max_row)
+        self.assertIsNone(index.find(3001))
+        start, end = index.find(2)
+        self.assertTrue(index.read(sheet.workbook.archive, start, end).startswith(b'<row r="2"'))
+
+    def test_sidecar(self):
+        sheet = xlsxr.Workbook(filename=self.filename).sheets[0]
+        sheet.build_index()
+        self.assertTrue(os.path.exists(sheet.index_path))
+
+        # a new workbook loads the saved index, with no checkpoints
+        index = xlsxr.index.RowIndex.load(sheet.index_path)
+        workbook = xlsxr.Workbook(filename=self.filename)
+        self.assertTrue(index.matches(workbook.archive.getinfo(workbook.sheets[0].filename)))
+        self.assertEqual(sheet.row(2999), workbook.sheets[0].row(2999))
+        self.assertEqual(list(sheet._row_index.offsets), list(workbook.sheets[0]._row_index.offsets))
+
+    def test_stale_sidecar(self):
+        """ An index saved for another member is ignored and rebuilt """
+        workbook = xlsxr.Workbook(filename=self.merges_filename)
+        first, second = workbook.sheets
+        first.build_index()
+        shutil.copyfile(first.index_path, second.index_path)
+        self.assertEqual(second.rows[10], second.row(11))
+        self.assertTrue(xlsxr.index.RowIndex.load(second.index_path).matches(workbook.archive.getinfo(second.filename)))
+
+    def test_bad_sidecar(self):
+        sheet = xlsxr.Workbook(filename=self.filename).sheets[0]
+        with open(sheet.index_path, "wb") as output:
+            output.write(b"not an index")
+        self.assertEqual(sheet.rows[4], sheet.row(5))
+
+    def test_in_memory(self):
+        """ A workbook opened from a stream has no sidecar """
+        with open(self.filename, "rb") as input:
+            sheet = xlsxr.Workbook(stream=input).sheets[0]
+            self.assertIsNone(sheet.index_path)
+            self.assertEqual(sheet.rows[100], sheet.row(101))
+
+    def test_pickle(self):
+        sheet = xlsxr.Workbook(filename=self.filename).sheets[0]
+        sheet.build_index()
+        copy = pickle.loads(pickle.dumps(sheet.workbook)).sheets[0]
+        self.assertIsNone(copy._row_index)
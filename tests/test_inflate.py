@@ -0,0 +1,181 @@
+""" Unit tests for the xlsxr.inflate module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import io, os, random, tempfile, threading, xlsxr, xlsxr.inflate, zipfile
+
+from benchmarks.generate import generate
+
+MEMBER = "xl/worksheets/sheet1.xml"
+
+class TestSeekableZipFile(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filename = os.path.join(cls.tmpdir.name, "tall.xlsx")
+        generate(cls.filename, "tall", 2000, 6)
+        with zipfile.ZipFile(cls.filename) as archive:
+            cls.data = archive.read(MEMBER)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def open_archive(self, file=None):
+        return xlsxr.inflate.SeekableZipFile(file or self.filename, checkpoint_interval=16 * 1024)
+
+    def test_sequential(self):
+        with self.open_archive() as archive:
+            with archive.open(MEMBER) as stream:
+                self.assertIsInstance(stream, xlsxr.inflate.SeekableMember)
+                self.assertEqual(self.data, stream.read())
+                self.assertEqual(b'', stream.read())
+            with archive.open(MEMBER) as stream:
+                self.assertEqual(self.data, b''.join(iter(lambda: stream.read(1000), b'')))
+            positions = archive.checkpoints(archive.getinfo(MEMBER)).positions
+            self.assertGreater(len(positions), 2)
+            for start, end in zip(positions, positions[1:]):
+                self.assertTrue(16 * 1024 <= end - start < 16 * 1024 + xlsxr.inflate.READ_SIZE)
+
+    def test_seek(self):
+        positions = random.Random(17).sample(range(len(self.data)), 200)
+        with open(self.filename, "rb") as input:
+            # mapped from a filename, and read from a byte stream
+            for archive in (self.open_archive(), self.open_archive(io.BytesIO(input.read())),):
+                with archive, archive.open(MEMBER) as stream:
+                    for pos in positions + sorted(positions) + sorted(positions, reverse=True):
+                        with self.subTest(mapped=archive.map is not None, pos=pos):
+                            self.assertEqual(pos, stream.seek(pos))
+                            self.assertEqual(self.data[pos:pos + 500], stream.read(500))
+                            self.assertEqual(min(pos + 500, len(self.data)), stream.tell())
+
+    def test_whence(self):
+        with self.open_archive() as archive:
+            with archive.open(MEMBER) as stream:
+                stream.seek(-10, io.SEEK_END)
+                self.assertEqual(self.data[-10:], stream.read())
+                stream.seek(100)
+                stream.seek(-50, io.SEEK_CUR)
+                self.assertEqual(self.data[50:60], stream.read(10))
+                self.assertEqual(len(self.data), stream.seek(len(self.data) + 100))
+                with self.assertRaises(ValueError):
+                    stream.seek(-1)
+
+    def test_shared_checkpoints(self):
+        """ A later stream on the same member resumes from the checkpoints of an earlier one """
+        with self.open_archive() as archive:
+            with archive.open(MEMBER) as stream:
+                stream.read()
+            checkpoints = len(archive.checkpoints(archive.getinfo(MEMBER)))
+            with archive.open(MEMBER) as stream:
+                stream.seek(len(self.data) - 100)
+                self.assertEqual(self.data[-100:], stream.read())
+            self.assertEqual(checkpoints, len(archive.checkpoints(archive.getinfo(MEMBER))))
+
+    def test_threads(self):
+        """ A lookup from another thread in the middle of adding a checkpoint waits for it to finish """
+        errors = []
+        found = []
+        threads = []
+
+        def find(position):
+            try:
+                found.append(checkpoints.find(position)[0])
+            except Exception as e:
+                errors.append(e)
+
+        class Positions(list):
+            """ Look up each new position from another thread, between the two appends in add() """
+            def append(self, position):
+                super().append(position)
+                thread = threading.Thread(target=find, args=(position,))
+                thread.start()
+                thread.join(0.05)
+                threads.append(thread)
+
+        with self.open_archive() as archive:
+            checkpoints = archive.checkpoints(archive.getinfo(MEMBER))
+            checkpoints.positions = Positions(checkpoints.positions)
+            with archive.open(MEMBER) as stream:
+                self.assertEqual(self.data, stream.read())
+            for thread in threads:
+                thread.join()
+            self.assertEqual([], errors)
+            self.assertEqual(checkpoints.positions[1:], sorted(found))
+
+    def test_stored(self):
+        filename = os.path.join(self.tmpdir.name, "stored.xlsx")
+        with zipfile.ZipFile(self.filename) as input, zipfile.ZipFile(filename, "w", zipfile.ZIP_STORED) as output:
+            for info in input.infolist():
+                output.writestr(info.filename, input.read(info.filename))
+        with self.open_archive(filename) as archive:
+            with archive.open(MEMBER) as stream:
+                stream.seek(5000)
+                self.assertEqual(self.data[5000:6000], stream.read(1000))
+                stream.seek(10)
+                self.assertEqual(self.data[10:], stream.read())
+            with archive.getbuffer(MEMBER) as view:
+                self.assertEqual(self.data, view)
+                self.assertTrue(view.readonly)
+        with self.open_archive() as archive:
+            with self.assertRaises(ValueError):
+                archive.getbuffer(MEMBER) # compressed
+
+    def test_other_methods(self):
+        """ Other compression methods open as ordinary zipfile streams """
+        filename = os.path.join(self.tmpdir.name, "bzip2.xlsx")
+        with zipfile.ZipFile(self.filename) as input, zipfile.ZipFile(filename, "w", zipfile.ZIP_BZIP2) as output:
+            for info in input.infolist():
+                output.writestr(info.filename, input.read(info.filename))
+        with self.open_archive(filename) as archive:
+            with archive.open(MEMBER) as stream:
+                self.assertNotIsInstance(stream, xlsxr.inflate.SeekableMember)
+                self.assertEqual(self.data, stream.read())
+        self.assertEqual(2000, len(xlsxr.Workbook(filename=filename).sheets[0].rows))
+
+    def test_bad_crc(self):
+        filename = os.path.join(self.tmpdir.name, "bad.xlsx")
+        with zipfile.ZipFile(self.filename) as input, zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as output:
+            for info in input.infolist():
+                output.writestr(info.filename, input.read(info.filename))
+        with zipfile.ZipFile(filename) as archive:
+            crc = archive.getinfo(MEMBER).CRC
+        with open(filename, "r+b") as output:
+            contents = output.read().replace(crc.to_bytes(4, "little"), (crc ^ 1).to_bytes(4, "little"))
+            output.seek(0)
+            output.write(contents)
+        with self.open_archive(filename) as archive:
+            with archive.open(MEMBER) as stream:
+                with self.assertRaises(zipfile.BadZipFile):
+                    stream.read()
+
+    def test_map(self):
+        with self.open_archive() as archive:
+            self.assertIsNotNone(archive.map)
+            self.assertEqual(self.filename, archive.filename)
+            stream = archive.open(MEMBER)
+            stream.read(100)
+        self.assertIsNone(archive.map) # closed, even with a member still open
+        stream.close()
+        with open(self.filename, "rb") as input:
+            with self.open_archive(input) as archive:
+                self.assertIsNone(archive.map)
+                self.assertEqual(self.data, archive.read(MEMBER))
+
+    def test_closed(self):
+        with self.open_archive() as archive:
+            stream = archive.open(MEMBER)
+            stream.close()
+            with self.assertRaises(ValueError):
+                stream.read(10)
+
+    def test_workbook(self):
+        workbook = xlsxr.Workbook(filename=self.filename)
+        self.assertIsInstance(workbook.archive, xlsxr.inflate.SeekableZipFile)
+        self.assertEqual(2000, len(workbook.sheets[0].rows))
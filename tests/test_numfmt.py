@@ -0,0 +1,244 @@
+""" Unit tests for the xlsxr.numfmt module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import datetime, os, pickle, tempfile, xlsxr, xlsxr.engines, zipfile
+
+from benchmarks.generate import generate
+from xlsxr.numfmt import compile_format, format_general, from_excel, get_format_code
+
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><numFmts count="2"><numFmt numFmtId="164" formatCode="#,##0.00;[Red]\\(#,##0.00\\)"/><numFmt numFmtId="165" formatCode="0;-0;&quot;zero&quot;;&quot;Name: &quot;@"/></numFmts><cellXfs count="6"><xf numFmtId="0"/><xf numFmtId="14"/><xf numFmtId="22"/><xf numFmtId="164"/><xf numFmtId="165"/><xf numFmtId="20"/></cellXfs></styleSheet>"""
+
+SHEET = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData><row r="1"><c r="A1" s="1"><v>43831</v></c><c r="B1" s="2"><v>43831.75</v></c><c r="C1" s="3"><v>-1234.5</v></c><c r="D1" s="4" t="inlineStr"><is><t>Bob</t></is></c><c r="E1" s="4"><v>0</v></c><c r="F1" s="5"><v>0.5</v></c><c r="G1"><v>0.1</v></c><c r="H1" t="b"><v>1</v></c></row></sheetData></worksheet>"""
+
+WORKBOOK_PR = '<workbookPr date1904="1"/>'
+
+class TestNumberFormat(unittest.TestCase):
+
+    def assertFormats(self, cases):
+        for code, value, expected in cases:
+            with self.subTest(code=code, value=value):
+                self.assertEqual(expected, compile_format(code).format(value))
+
+    def test_general(self):
+        self.assertFormats((
+            ('General', 0, '0'),
+            ('General', 1234.5, '1234.5'),
+            ('General', -2.5, '-2.5'),
+            ('General', 1 / 3, '0.333333333'),
+            ('General', 0.1 + 0.2, '0.3'),
+            ('General', 1e10, '10000000000'),
+            ('General', 123456789012, '1.23457E+11'),
+            ('General', 0.00001, '1E-05'),
+            ('"Total: "General', 5, 'Total: 5'),
+        ))
+        self.assertEqual('12345678901', format_general(12345678901.2))
+
+    def test_numbers(self):
+        self.assertFormats((
+            ('0', 2.5, '3'),
+            ('0.00', 2.675, '2.68'), # rounded from 15 digits, half away from zero
+            ('0.00', -0.001, '-0.00'), # the sign stays when a negative rounds to zero
+            ('0', -0.4, '-0'),
+            ('0;-0', -0.4, '-0'),
+            ('0;0', -0.4, '0'),
+            ('#', -0.4, '-'),
+            ('00000', 123, '00123'),
+            ('#.##', 1, '1.'),
+            ('0.0#', 1.5, '1.5'),
+            ('0.0#', 1.555, '1.56'),
+            ('0.000', 1e20, '100000000000000000000.000'),
+            ('000-0000', 5551234, '555-1234'),
+            ('???.??', 1.5, '  1.5 '),
+        ))
+
+    def test_thousands(self):
+        self.assertFormats((
+            ('#,##0', 1234567, '1,234,567'),
+            ('#,##0', 999, '999'),
+            ('#,##0.00', -1234.5, '-1,234.50'),
+            ('#,##0,', 1234567, '1,235'),
+            ('0.0,,', 1234567, '1.2'),
+            ('0,000', 5, '0,005'),
+        ))
+
+    def test_percent_and_scientific(self):
+        self.assertFormats((
+            ('0%', 0.256, '26%'),
+            ('0.00%', 0.12345, '12.35%'),
+            ('0.00E+00', 12345, '1.23E+04'),
+            ('0.00E+00', 0.00012, '1.20E-04'),
+            ('0.00E+00', 9.999, '1.00E+01'),
+            ('##0.0E+0', 12345, '12.3E+3'),
+        ))
+
+    def test_fractions(self):
+        self.assertFormats((
+            ('# ?/?', 1.5, '1 1/2'),
+            ('# ?/?', 2, '2    '),
+            ('# ??/??', 3.14159, '3 14/99'),
+            ('?/8', 0.375, '3/8'),
+            ('# ?/4', 2.74, '2 3/4'),
+        ))
+
+    def test_sections(self):
+        accounting = get_format_code('41')
+        self.assertFormats((
+            ('"$"#,##0.00_);[Red]("$"#,##0.00)', 1234.5, '$1,234.50 '),
+            ('"$"#,##0.00_);[Red]("$"#,##0.00)', -1234.5, '($1,234.50)'),
+            ('0;-0;"zero"', 0, 'zero'),
+            ('0;;', 0, ''),
+            (accounting, 0, ' - '),
+            (accounting, -1234, ' (1,234)'),
+            ('[$€-407]#,##0.00', 5, '€5.00'),
+        ))
+
+    def test_conditions(self):
+        code = '[>=100]"big";[<0]"negative";"small"'
+        self.assertFormats(((code, 150, 'big'), (code, -1, 'negative'), (code, 5, 'small'),))
+        self.assertFormats((('[<=9999999]###-####;(###) ###-####', 5551234, '555-1234'),))
+
+    def test_colors(self):
+        number_format = compile_format('0.00;[Red]-0.00;[Color10]0')
+        self.assertIsNone(number_format.color(1))
+        self.assertEqual('Red', number_format.color(-1))
+        self.assertEqual('Color10', number_format.color(0))
+
+    def test_text(self):
+        self.assertEqual('Name: Bob', compile_format('0;-0;0;"Name: "@').format_text('Bob'))
+        self.assertEqual('Bob', compile_format('@').format_text('Bob'))
+        self.assertEqual('5', compile_format('@').format(5))
+        self.assertIsNone(compile_format('@').text_section)
+
+    def test_dates(self):
+        self.assertFormats((
+            ('m/d/yyyy', 43831, '1/1/2020'),
+            ('yyyy-mm-dd', 43831.75, '2020-01-01'),
+            ('yyyy-mm-dd hh:mm:ss', 43831.75, '2020-01-01 18:00:00'),
+            ('dddd, mmmm d, yyyy', 43831, 'Wednesday, January 1, 2020'),
+            ('d-mmm-yy', 43831, '1-Jan-20'),
+            ('mmmmm', 43831, 'J'),
+            ('yyyy-mm-dd', 1, '1900-01-01'),
+            ('yyyy-mm-dd', 60, '1900-02-29'), # Excel's imaginary leap day
+            ('yyyy-mm-dd', 61, '1900-03-01'),
+            ('ddd mmm', 60, 'Wed Feb'),
+        ))
+
+    def test_times(self):
+        self.assertFormats((
+            ('h:mm AM/PM', 0.75, '6:00 PM'),
+            ('h:mm AM/PM', 0, '12:00 AM'),
+            ('h:mm a/p', 0.25, '6:00 a'),
+            ('hh:mm:ss', 0.99999999, '00:00:00'), # rounds up to the next day
+            ('mm:ss.0', 0.5 / 86400, '00:00.5'),
+            ('[h]:mm:ss', 1.5, '36:00:00'),
+            ('[mm]:ss', 0.5 / 24, '30:00'),
+        ))
+
+    def test_date_flags(self):
+        for code, has_date, has_time in (
+                ('m/d/yyyy', True, False),
+                ('mmm-yy', True, False),
+                ('m/d/yyyy h:mm', True, True),
+                ('h:mm', False, True),
+                ('[h]:mm:ss', False, True),
+                ('General', False, False),
+                ('[Red]0.00', False, False), # colour names are not dates
+                ('"day "0', False, False), # nor are literals
+        ):
+            with self.subTest(code=code):
+                number_format = compile_format(code)
+                self.assertEqual((has_date, has_time,), (number_format.has_date, number_format.has_time,))
+
+    def test_1904(self):
+        self.assertEqual('1904-01-02', compile_format('yyyy-mm-dd').format(1, date1904=True))
+        self.assertEqual(datetime.datetime(1904, 1, 1, 12), from_excel(0.5, date1904=True))
+
+    def test_from_excel(self):
+        self.assertEqual(datetime.datetime(2020, 1, 1, 18), from_excel(43831.75))
+        self.assertEqual(datetime.datetime(1900, 1, 1), from_excel(1))
+        self.assertEqual(datetime.datetime(1900, 3, 1), from_excel(61))
+        self.assertEqual(datetime.datetime(2020, 1, 1, 0, 0, 0, 1000), from_excel(43831 + 0.001 / 86400))
+
+    def test_builtin_codes(self):
+        self.assertEqual('m/d/yyyy', get_format_code('14'))
+        self.assertEqual('0.0', get_format_code('164', {'164': '0.0'}))
+        self.assertEqual('General', get_format_code(None))
+        self.assertEqual('General', get_format_code('163'))
+
+    def test_compiled_once(self):
+        self.assertIs(compile_format('0.00'), compile_format('0.00'))
+        self.assertIs(compile_format('0.00'), pickle.loads(pickle.dumps(compile_format('0.00'))))
+
+
+class TestDisplayValues(unittest.TestCase):
+    """ Number formats in a workbook: built-in formats, cells without a t attribute, and the 1904 date system """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        generate(os.path.join(cls.tmpdir.name, "base.xlsx"), "dates", 1, 1)
+        cls.filename = cls.make_workbook("formats.xlsx", False)
+        cls.filename_1904 = cls.make_workbook("formats1904.xlsx", True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    @classmethod
+    def make_workbook(cls, name, date1904):
+        """ Copy the generated workbook, with our own styles and sheet """
+        filename = os.path.join(cls.tmpdir.name, name)
+        with zipfile.ZipFile(os.path.join(cls.tmpdir.name, "base.xlsx")) as input, zipfile.ZipFile(filename, "w") as output:
+            for info in input.infolist():
+                data = input.read(info.filename)
+                if info.filename == "xl/styles.xml":
+                    data = STYLES.encode("utf-8")
+                elif info.filename == "xl/worksheets/sheet1.xml":
+                    data = SHEET.encode("utf-8")
+                elif info.filename == "xl/workbook.xml" and date1904:
+                    data = data.replace(b"<sheets>", WORKBOOK_PR.encode("utf-8") + b"<sheets>")
+                output.writestr(info, data)
+        return filename
+
+    def test_date1904_flag(self):
+        self.assertFalse(xlsxr.Workbook(filename=self.filename).date1904)
+        self.assertTrue(xlsxr.Workbook(filename=self.filename_1904).date1904)
+
+    def test_strings(self):
+        row = xlsxr.Workbook(filename=self.filename).sheets[0].rows[0]
+        self.assertEqual(['2020-01-01', '2020-01-01T18:00:00', '-1234.5', 'Bob', '0', '0.5', '0.1', '1'], row)
+
+    def test_convert_values(self):
+        row = xlsxr.Workbook(filename=self.filename, convert_values=True).sheets[0].rows[0]
+        self.assertEqual(
+            [datetime.date(2020, 1, 1), datetime.datetime(2020, 1, 1, 18), -1234.5, 'Bob', 0, 0.5, 0.1, True],
+            row
+        )
+
+    def test_display_values(self):
+        for engine in xlsxr.engines.available_engines():
+            with self.subTest(engine=engine):
+                workbook = xlsxr.Workbook(filename=self.filename, display_values=True, engine=engine)
+                self.assertEqual(
+                    ['1/1/2020', '1/1/2020 18:00', '(1,234.50)', 'Name: Bob', 'zero', '12:00', '0.1', 'TRUE'],
+                    workbook.sheets[0].rows[0]
+                )
+
+    def test_1904_values(self):
+        row = xlsxr.Workbook(filename=self.filename_1904, convert_values=True).sheets[0].rows[0]
+        self.assertEqual([datetime.date(2024, 1, 2), datetime.datetime(2024, 1, 2, 18)], row[:2])
+        row = xlsxr.Workbook(filename=self.filename_1904, display_values=True).sheets[0].rows[0]
+        self.assertEqual(['1/2/2024', '1/2/2024 18:00'], row[:2])
+
+    def test_1904_columns(self):
+        columns = xlsxr.Workbook(filename=self.filename_1904).sheets[0].to_columns()
+        self.assertEqual([datetime.date(2024, 1, 2)], columns[0].to_list())
+        self.assertEqual([datetime.datetime(2024, 1, 2, 18)], columns[1].to_list())
@@ -0,0 +1,117 @@
+""" Unit tests for the xlsxr.parallel module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import os, pickle, re, tempfile, xlsxr, zipfile
+
+from benchmarks.generate import generate
+
+from . import resolve_path
+
+class TestParallel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filename = os.path.join(cls.tmpdir.name, "tabs.xlsx")
+        generate(cls.filename, "merges", 40, 8, sheets=5)
+        cls.sparse_filename = os.path.join(cls.tmpdir.name, "sparse.xlsx")
+        generate(cls.sparse_filename, "sparse", 300, 30)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def expected(self, **options):
+        workbook = xlsxr.Workbook(filename=self.filename, **options)
+        return [sheet.rows for sheet in workbook.sheets]
+
+    def test_pickle_workbook(self):
+        for options in ({}, {"lazy_shared_strings": True},):
+            with self.subTest(options=options):
+                workbook = xlsxr.Workbook(filename=self.filename, **options)
+                workbook.sheets[0].rows
+                copy = pickle.loads(pickle.dumps(workbook))
+                self.assertIsNone(copy.sheets[0]._raw_rows)
+                self.assertEqual(list(workbook.shared_strings), list(copy.shared_strings))
+                self.assertEqual([sheet.rows for sheet in workbook.sheets], [sheet.rows for sheet in copy.sheets])
+
+    def test_pickle_stream_workbook(self):
+        with open(self.filename, "rb") as input:
+            workbook = xlsxr.Workbook(stream=input)
+            with self.assertRaises(TypeError):
+                pickle.dumps(workbook)
+
+    def test_read_sheets(self):
+        for options in ({}, {"convert_values": True}, {"fill_merged": True}, {"lazy_shared_strings": True},):
+            with self.subTest(options=options):
+                workbook = xlsxr.Workbook(filename=self.filename, **options)
+                self.assertEqual(self.expected(**options), workbook.read_sheets(parallel=2))
+                self.assertEqual(self.expected(**options)[4], workbook.sheets[4].rows)
+
+    def test_read_sheets_merges(self):
+        workbook = xlsxr.Workbook(filename=self.filename)
+        workbook.read_sheets(parallel=2)
+        self.assertEqual(xlsxr.Workbook(filename=self.filename).sheets[2].merges, workbook.sheets[2].merges)
+
+    def test_iter_all_sheets_unordered(self):
+        workbook = xlsxr.Workbook(filename=self.filename)
+        results = {sheet.name: rows for sheet, rows in workbook.iter_all_sheets(parallel=3, ordered=False)}
+        self.assertEqual(dict(zip([sheet.name for sheet in workbook.sheets], self.expected())), results)
+
+    def test_read_sheets_from_stream(self):
+        with open(self.filename, "rb") as input:
+            workbook = xlsxr.Workbook(stream=input)
+            self.assertEqual(self.expected(), workbook.read_sheets(parallel=2))
+
+    def test_read_sheets_serial(self):
+        workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"))
+        self.assertEqual([workbook.sheets[0].rows], workbook.read_sheets(parallel=1))
+
+    def test_iter_rows_parallel(self):
+        for filename in (self.filename, self.sparse_filename,):
+            for options in ({}, {"fill_merged": True},):
+                for engine in xlsxr.engines.available_engines():
+                    with self.subTest(filename=os.path.basename(filename), options=options, engine=engine):
+                        sheet = xlsxr.Workbook(filename=filename, engine=engine, **options).sheets[0]
+                        expected = list(sheet.iter_rows())
+                        self.assertEqual(expected, list(sheet.iter_rows_parallel(parallel=2, split_size=1000)))
+                        self.assertEqual(xlsxr.Workbook(filename=filename).sheets[0].merges, sheet.merges)
+
+    def test_iter_rows_parallel_some_row_numbers(self):
+        """ Rows without numbers after the first are numbered from their place in the sheet, not in their piece """
+        original = os.path.join(self.tmpdir.name, "sparse-large.xlsx")
+        generate(original, "sparse", 3000, 30) # several reads of CHUNK_SIZE, so several pieces
+        filename = os.path.join(self.tmpdir.name, "some-row-numbers.xlsx")
+        with zipfile.ZipFile(original) as input, zipfile.ZipFile(filename, "w") as output:
+            for info in input.infolist():
+                data = input.read(info)
+                if info.filename.startswith("xl/worksheets/"):
+                    # drop the numbers of rows that follow the row before them
+                    data = re.sub(rb'(<row r="(\d+)"[^>]*>.*?</row>)<row r="(\d+)"', lambda m: m.group(1) + b'<row' if int(m.group(3)) == int(m.group(2)) + 1 else m.group(0), data)
+                output.writestr(info, data)
+        with zipfile.ZipFile(filename) as input:
+            self.assertIn(b'<row>', input.read("xl/worksheets/sheet1.xml"))
+        sheet = xlsxr.Workbook(filename=filename).sheets[0]
+        expected = xlsxr.Workbook(filename=original).sheets[0].rows
+        self.assertEqual(expected, list(sheet.iter_rows()))
+        for split_size in (1000, 50000,):
+            with self.subTest(split_size=split_size):
+                self.assertEqual(expected, list(sheet.iter_rows_parallel(parallel=2, split_size=split_size)))
+
+    def test_iter_rows_parallel_without_row_numbers(self):
+        filename = os.path.join(self.tmpdir.name, "no-row-numbers.xlsx")
+        with zipfile.ZipFile(self.sparse_filename) as input, zipfile.ZipFile(filename, "w") as output:
+            for info in input.infolist():
+                data = input.read(info)
+                if info.filename.startswith("xl/worksheets/"):
+                    data = re.sub(rb'<row r="\d+"', b'<row', data)
+                output.writestr(info, data)
+        sheet = xlsxr.Workbook(filename=filename).sheets[0]
+        with self.assertLogs("xlsxr.parallel", "WARNING"):
+            self.assertEqual(list(sheet.iter_rows()), list(sheet.iter_rows_parallel(parallel=2, split_size=1000)))
@@ -0,0 +1,163 @@
+""" Unit tests for the xlsxr.rows module and the sparse_rows option
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import gc, os, pickle, shutil, tempfile, tracemalloc, xlsxr, xlsxr.engines, zipfile
+
+from array import array
+from benchmarks.generate import generate
+from xlsxr.rows import EMPTY_ROW, MergeIndex, Row, make_rows
+from xlsxr.util import col_letters, parse_cell_range
+
+from . import resolve_path
+
+class TestRow(unittest.TestCase):
+
+    def setUp(self):
+        self.row = Row(array('H', [1, 4]), ('a', 'b'), ((6, 7, 'm'),))
+        self.expected = ['', 'a', '', '', 'b', '', 'm', 'm']
+
+    def test_list_behaviour(self):
+        row, expected = self.row, self.expected
+        self.assertEqual(len(expected), len(row))
+        self.assertEqual(expected, row)
+        self.assertEqual(row, expected)
+        self.assertNotEqual(expected[:-1], row)
+        self.assertEqual(expected, list(row))
+        self.assertEqual(expected, row.to_list())
+        self.assertEqual(expected[2:5], row[2:5])
+        self.assertEqual(expected + ['x'], row + ['x'])
+        self.assertEqual(['x'] + expected, ['x'] + row)
+        self.assertEqual(repr(expected), repr(row))
+        self.assertEqual(4, row.index('b'))
+        self.assertEqual(2, row.count('m'))
+        self.assertIn('a', row)
+        for i in range(-len(expected), len(expected)):
+            with self.subTest(i=i):
+                self.assertEqual(expected[i], row[i])
+
+    def test_index_error(self):
+        for i in (8, -9):
+            with self.subTest(i=i):
+                with self.assertRaises(IndexError):
+                    self.row[i]
+
+    def test_dense(self):
+        """ A row with no empty cells keeps no column numbers """
+        row = Row.from_dict({0: 'a', 1: 'b'})
+        self.assertIsNone(row.cols)
+        self.assertEqual(['a', 'b'], row)
+        self.assertIsNotNone(Row.from_dict({1: 'b'}).cols)
+        self.assertIs(EMPTY_ROW, Row.from_dict({}))
+        self.assertEqual([], EMPTY_ROW)
+
+    def test_pickle(self):
+        self.assertEqual(self.expected, pickle.loads(pickle.dumps(self.row)))
+
+    def test_merge_index(self):
+        merges = MergeIndex([parse_cell_range(ref) for ref in ("A1:C10", "B3:B4", "A20:A20",)])
+        self.assertEqual([((0, 0), (9, 2),), ((2, 1), (3, 1),)], merges.covering(3))
+        self.assertEqual([((0, 0), (9, 2),)], merges.covering(9))
+        self.assertEqual([], merges.covering(10))
+        self.assertEqual([((19, 0), (19, 0),)], merges.covering(19))
+
+    def test_make_rows(self):
+        """ Rows covered by the same merges share their spans and empty row """
+        merges = [parse_cell_range("B1:D3")]
+        rows = list(make_rows([{1: 'x'}, {}, {}, {0: 'y'}], merges))
+        self.assertEqual([['', 'x', 'x', 'x'], ['', 'x', 'x', 'x'], ['', 'x', 'x', 'x'], ['y']], rows)
+        self.assertIs(rows[1], rows[2])
+        self.assertIs(rows[0].spans, rows[1].spans)
+
+
+class TestSparseRows(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.files = {}
+        for kind, rows, cols in (("sparse", 300, 40,), ("merges", 60, 12,), ("tall", 200, 6,),):
+            cls.files[kind] = os.path.join(cls.tmpdir.name, kind + ".xlsx")
+            generate(cls.files[kind], kind, rows, cols)
+        cls.files["simple"] = os.path.join(cls.tmpdir.name, "simple.xlsx") # a copy, for the row index files
+        shutil.copyfile(resolve_path("simple.xlsx"), cls.files["simple"])
+
+        # very sparse, with big merged blocks whose other cells are empty, as Excel writes them
+        cells = []
+        merges = []
+        for row_num in range(1, 2001):
+            if row_num % 100 == 1:
+                cells.append('<row r="{0}"><c r="A{0}" t="inlineStr"><is><t>Section {0}</t></is></c></row>'.format(row_num))
+                merges.append('A{}:{}{}'.format(row_num, col_letters(49), row_num + 94))
+            elif row_num % 100 > 95:
+                cells.append('<row r="{0}"><c r="{1}{0}"><v>{0}</v></c></row>'.format(row_num, col_letters(row_num % 50)))
+        sheet = (
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>{}</sheetData>'
+            '<mergeCells>{}</mergeCells></worksheet>'
+        ).format(''.join(cells), ''.join('<mergeCell ref="{}"/>'.format(ref) for ref in merges))
+        cls.files["banners"] = os.path.join(cls.tmpdir.name, "banners.xlsx")
+        with zipfile.ZipFile(cls.files["tall"]) as input, zipfile.ZipFile(cls.files["banners"], "w", zipfile.ZIP_DEFLATED) as output:
+            for info in input.infolist():
+                data = sheet.encode("utf-8") if info.filename == "xl/worksheets/sheet1.xml" else input.read(info.filename)
+                output.writestr(info.filename, data)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def assertParity(self, read, **options):
+        for kind, filename in sorted(self.files.items()):
+            for engine in xlsxr.engines.available_engines():
+                with self.subTest(kind=kind, engine=engine, **options):
+                    dense = read(xlsxr.Workbook(filename=filename, engine=engine, **options).sheets[0])
+                    sparse = read(xlsxr.Workbook(filename=filename, engine=engine, sparse_rows=True, **options).sheets[0])
+                    self.assertTrue(sparse and all(isinstance(row, Row) for row in sparse))
+                    self.assertEqual(dense, sparse)
+
+    def test_rows(self):
+        self.assertParity(lambda sheet: sheet.rows)
+        self.assertParity(lambda sheet: sheet.rows, fill_merged=True)
+
+    def test_iter_rows(self):
+        self.assertParity(lambda sheet: list(sheet.iter_rows(min_row=5, max_row=70)), fill_merged=True)
+
+    def test_positional(self):
+        self.assertParity(lambda sheet: list(sheet.iter_rows()), positional_cells=True)
+
+    def test_random_access(self):
+        def read(sheet):
+            rows = []
+            for row_num in (1, 2, 3, 12, 13, 52, 60, 97, 101, 150,):
+                try:
+                    rows.append(sheet.row(row_num))
+                except IndexError:
+                    break
+            return rows
+        self.assertParity(read, fill_merged=True)
+
+    def test_projection(self):
+        """ Projections still return lists """
+        rows = list(xlsxr.Workbook(filename=self.files["sparse"], sparse_rows=True).sheets[0].iter_rows(columns=[0, 3]))
+        self.assertTrue(all(isinstance(row, list) and len(row) == 2 for row in rows))
+
+    def test_shared_empty_rows(self):
+        rows = xlsxr.Workbook(filename=self.files["sparse"], sparse_rows=True).sheets[0].rows
+        self.assertIs(rows[6], rows[13]) # rows 7 and 14 are missing
+
+    def test_memory(self):
+        """ Sparse and merged sheets take much less memory """
+        def measure(**options):
+            sheet = xlsxr.Workbook(filename=self.files["banners"], fill_merged=True, **options).sheets[0]
+            gc.collect()
+            tracemalloc.start()
+            try:
+                sheet.rows # kept by the sheet
+                return tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+        self.assertGreater(measure() / measure(sparse_rows=True), 10)
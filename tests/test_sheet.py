@@ -7,7 +7,7 @@
 """
 
 import unittest
-import datetime, xlsxr
+import datetime, io, re, xlsxr, zipfile
 
 from . import resolve_path
 
@@ -95,5 +95,138 @@ class TestSheet(unittest.TestCase):
         EXPECTED_HEADERS = ['Qué?', 'Qué?', 'Qué?', 'Quién?', 'Para quién?', 'Para quién?', 'Dónde?', 'Dónde?', 'Cuándo?']
         workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), fill_merged=True)
         self.assertEqual(EXPECTED_HEADERS, workbook.sheets[0].rows[0])
-        
-        
+
+    def test_iter_rows(self):
+        self.assertEqual(self.EXPECTED_ROWS, list(self.sheet.iter_rows()))
+
+    def test_streaming_rows(self):
+        workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), streaming=True)
+        sheet = workbook.sheets[0]
+        rows = sheet.rows
+        self.assertEqual(self.EXPECTED_ROWS[0], next(rows))
+        self.assertEqual(self.EXPECTED_ROWS[1:], list(rows))
+        self.assertIsNone(sheet._raw_rows)
+
+    def test_streaming_metadata(self):
+        workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), streaming=True)
+        self.assertEqual(self.EXPECTED_COLS, workbook.sheets[0].cols)
+        self.assertEqual(self.EXPECTED_MERGES, workbook.sheets[0].merges)
+        self.assertIsNone(workbook.sheets[0]._raw_rows)
+
+    def test_streaming_fill_merged(self):
+        EXPECTED_HEADERS = ['Qué?', 'Qué?', 'Qué?', 'Quién?', 'Para quién?', 'Para quién?', 'Dónde?', 'Dónde?', 'Cuándo?']
+        workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), fill_merged=True, streaming=True)
+        rows = list(workbook.sheets[0].rows)
+        self.assertEqual(EXPECTED_HEADERS, rows[0])
+        self.assertEqual(self.EXPECTED_ROWS[1:], rows[1:])
+
+    def test_iter_rows_columns(self):
+        expected = [[row[i] if i < len(row) else '' for i in (7, 1, 3, 7,)] for row in self.EXPECTED_ROWS]
+        self.assertEqual(expected, list(self.sheet.iter_rows(columns=['H', 1, 'D', 7])))
+
+    def test_iter_rows_column_headers(self):
+        expected = [[row[i] if i < len(row) else '' for i in (8, 3,)] for row in self.EXPECTED_ROWS]
+        self.assertEqual(expected, list(self.sheet.iter_rows(names=['Cuándo?', 'Quién?'])))
+        with self.assertRaises(ValueError):
+            list(self.sheet.iter_rows(names=['No such header']))
+        with self.assertRaises(ValueError):
+            list(self.sheet.iter_rows(columns=['Quién?'])) # a header name isn't a column
+        with self.assertRaises(ValueError):
+            list(self.sheet.iter_rows(columns=['H'], names=['Quién?']))
+
+    def test_iter_rows_letter_headers(self):
+        """ Header names that look like column letters are still header names """
+        output = io.BytesIO()
+        with zipfile.ZipFile(resolve_path("simple.xlsx")) as input, zipfile.ZipFile(output, "w") as archive:
+            for info in input.infolist():
+                data = input.read(info.filename)
+                if info.filename == "xl/sharedStrings.xml":
+                    data = data.replace('>Qué?<'.encode('utf-8'), b'>ID<').replace('>Quién?<'.encode('utf-8'), b'>AGE<')
+                archive.writestr(info.filename, data)
+        sheet = xlsxr.Workbook(stream=output).sheets[0]
+        expected = [[row[i] if i < len(row) else '' for i in (3, 0,)] for row in self.EXPECTED_ROWS[1:]]
+        self.assertEqual(expected, list(sheet.iter_rows(names=['AGE', 'ID'], min_row=2)))
+        self.assertEqual([['', '']] * 7, list(sheet.iter_rows(columns=['AGE', 'ID'], min_row=2)))
+
+    def test_iter_rows_columns_out_of_range(self):
+        for column in (-1, 16384, 'XFE', 'ZZZ', 'h', 'AAAA', 2.0, None,):
+            with self.subTest(column=column):
+                with self.assertRaises(ValueError):
+                    self.sheet.iter_rows(columns=[column])
+        self.assertEqual([['', '']] * 8, list(self.sheet.iter_rows(columns=['XFD', 16383])))
+
+    def test_iter_rows_columns_fill_merged(self):
+        workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), fill_merged=True)
+        rows = list(workbook.sheets[0].iter_rows(columns=['C', 'F']))
+        self.assertEqual(['Qué?', 'Para quién?'], rows[0])
+        self.assertEqual(['Subsector', 'Mujeres'], rows[1])
+
+    def test_iter_rows_range(self):
+        self.assertEqual(self.EXPECTED_ROWS[3:6], list(self.sheet.iter_rows(min_row=4, max_row=6)))
+        self.assertEqual(self.EXPECTED_ROWS[5:], list(self.sheet.iter_rows(min_row=6)))
+        self.assertEqual(self.EXPECTED_ROWS[:2], list(self.sheet.iter_rows(limit=2)))
+        self.assertEqual(self.EXPECTED_ROWS[6:8], list(self.sheet.iter_rows(min_row=7, limit=5)))
+        self.assertEqual([], list(self.sheet.iter_rows(min_row=20)))
+        self.assertEqual([], list(self.sheet.iter_rows(limit=0)))
+
+    def test_iter_rows_range_stops_early(self):
+        self.assertEqual(self.EXPECTED_ROWS[:1], list(self.sheet.iter_rows(max_row=1)))
+        self.assertIsNone(self.sheet._raw_cols) # never reached the end of the sheet
+
+    def test_iter_rows_range_fill_merged(self):
+        workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), fill_merged=True)
+        rows = list(workbook.sheets[0].rows)
+        for min_row in range(1, 10):
+            self.assertEqual(rows[min_row - 1:min_row + 1], list(workbook.sheets[0].iter_rows(min_row=min_row, limit=2)))
+
+    def test_iter_batches(self):
+        for size in (1, 3, 8, 100,):
+            batches = list(self.sheet.iter_batches(size))
+            self.assertEqual(self.EXPECTED_ROWS, [row for batch in batches for row in batch])
+            self.assertEqual([size] * (len(batches) - 1), [len(batch) for batch in batches[:-1]])
+        with self.assertRaises(ValueError):
+            list(self.sheet.iter_batches(0))
+
+    def test_iter_batches_options(self):
+        for options in ({"columns": ['H', 1, 'D']}, {"names": ['Quién?', 'Dónde?']}, {"min_row": 4, "max_row": 6}, {"min_row": 6}, {"min_row": 2, "limit": 6}, {"limit": 0},):
+            with self.subTest(**options):
+                expected = list(self.sheet.iter_rows(**options))
+                self.assertEqual(expected, [row for batch in self.sheet.iter_batches(3, **options) for row in batch])
+        workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), fill_merged=True)
+        self.assertEqual(workbook.sheets[0].rows, [row for batch in workbook.sheets[0].iter_batches(3) for row in batch])
+
+    def test_iter_batches_columns(self):
+        batches = list(self.sheet.iter_batches(5, layout="columns"))
+        self.assertEqual([9, 9], [len(batch) for batch in batches])
+        self.assertEqual(['Qué?', 'Registro', '', '001', '002'], batches[0][0])
+        self.assertEqual(['Cuándo?', '', '#date+reported', '2015-03-01', ''], batches[0][8])
+        self.assertEqual(['003', '', '004'], batches[1][0])
+        self.assertEqual(['', '', ''], batches[1][8])
+        self.assertEqual([['Colombia', 'Colombia'], ['Cauca', 'Chocó']], list(self.sheet.iter_batches(2, columns=['G', 'H'], min_row=5, layout="columns"))[0])
+        with self.assertRaises(ValueError):
+            list(self.sheet.iter_batches(5, layout="diagonal"))
+
+    def test_dimension(self):
+        self.assertEqual("A1:I8", self.sheet.dimension)
+        self.assertIsNone(self.sheet._raw_rows)
+
+    def test_no_dimension(self):
+        output = io.BytesIO()
+        with zipfile.ZipFile(resolve_path("simple.xlsx")) as input, zipfile.ZipFile(output, "w") as archive:
+            for info in input.infolist():
+                data = input.read(info.filename)
+                if info.filename == self.sheet.filename:
+                    data = re.sub(rb'<dimension[^>]*>', b'', data)
+                archive.writestr(info.filename, data)
+        sheet = xlsxr.Workbook(stream=output).sheets[0]
+        self.assertIsNone(sheet.dimension)
+        self.assertEqual(self.EXPECTED_ROWS, sheet.rows)
+
+    def test_sizes(self):
+        info = self.workbook.archive.getinfo(self.sheet.filename)
+        self.assertEqual(info.file_size, self.sheet.size)
+        self.assertEqual(info.compress_size, self.sheet.compressed_size)
+
+    def test_header(self):
+        self.assertEqual(self.EXPECTED_ROWS[0], self.sheet.header())
+        self.assertIsNone(self.sheet._raw_rows)
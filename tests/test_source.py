@@ -0,0 +1,137 @@
+""" Unit tests for the xlsxr.source module, using a local HTTP server
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import http.server, io, os, random, re, tempfile, threading, xlsxr, xlsxr.source
+
+from benchmarks.generate import generate
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """ Serve files from the server's directory, with range requests unless the path starts with /noranges/ """
+
+    def do_GET(self):
+        path = self.path
+        ranges = not path.startswith("/noranges/")
+        if not ranges:
+            path = path[len("/noranges"):]
+        try:
+            with open(os.path.join(self.server.directory, path.lstrip("/")), "rb") as input:
+                data = input.read()
+        except OSError:
+            self.send_error(404)
+            return
+
+        status = 200
+        start, end = 0, len(data)
+        match = re.match(r'^bytes=(\d*)-(\d*)$', self.headers.get("Range", ""))
+        if ranges and match:
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)) + 1, len(data)) if match.group(2) else len(data)
+            else:
+                start = max(len(data) - int(match.group(2)), 0)
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(end - start))
+        if status == 206:
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end - 1, len(data)))
+        self.end_headers()
+        self.wfile.write(data[start:end])
+        self.server.bytes_sent += end - start
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSource(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.filename = os.path.join(cls.tmpdir.name, "tabs.xlsx")
+        generate(cls.filename, "tall", 5000, 8, sheets=4)
+        cls.size = os.path.getsize(cls.filename)
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        cls.server.directory = cls.tmpdir.name
+        cls.server.bytes_sent = 0
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = "http://127.0.0.1:{}/tabs.xlsx".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        # small blocks, so that the test file is large by comparison
+        self.block_size = xlsxr.source.BLOCK_SIZE
+        xlsxr.source.BLOCK_SIZE = 8 * 1024
+        self.server.bytes_sent = 0
+
+    def tearDown(self):
+        xlsxr.source.BLOCK_SIZE = self.block_size
+
+    def test_one_sheet(self):
+        """ Reading one sheet downloads only a little more than that sheet """
+        expected = xlsxr.Workbook(filename=self.filename).sheets[3].rows
+        workbook = xlsxr.Workbook(url=self.url)
+        self.assertIsInstance(workbook.archive.fp, xlsxr.source.HTTPRangeFile)
+        self.assertEqual(4, len(workbook.sheets))
+        self.assertEqual(expected, workbook.sheets[3].rows)
+        sheet_size = workbook.archive.getinfo(workbook.sheets[3].filename).compress_size
+        self.assertLess(self.server.bytes_sent, sheet_size + self.size // 8)
+
+    def test_random_reads(self):
+        with open(self.filename, "rb") as input:
+            data = input.read()
+        stream = xlsxr.source.open_url(self.url)
+        for pos in random.Random(3).sample(range(len(data)), 100):
+            with self.subTest(pos=pos):
+                stream.seek(pos)
+                self.assertEqual(data[pos:pos + 20000], stream.read(20000))
+        stream.seek(0)
+        self.assertEqual(data, stream.read())
+
+    def test_no_ranges(self):
+        """ A server without range requests falls back to downloading the file """
+        url = self.url.replace("/tabs.xlsx", "/noranges/tabs.xlsx")
+        self.assertNotIsInstance(xlsxr.source.open_url(url), xlsxr.source.HTTPRangeFile)
+        self.assertEqual(5000, len(xlsxr.Workbook(url=url).sheets[0].rows))
+
+    def test_not_found(self):
+        with self.assertRaises(OSError):
+            xlsxr.Workbook(url=self.url.replace("tabs.xlsx", "missing.xlsx"))
+
+    def test_spool(self):
+        with open(self.filename, "rb") as input:
+            data = input.read()
+        spooled = xlsxr.source.spool(io.BytesIO(data), max_size=1024)
+        self.assertEqual(data, spooled.read())
+        spooled = xlsxr.source.spool(iter([data[:100], data[100:]]))
+        self.assertEqual(data, spooled.read())
+
+    def test_non_seekable_stream(self):
+        with open(self.filename, "rb") as input:
+            stream = io.BufferedReader(NonSeekable(input.read()))
+        self.assertEqual(5000, len(xlsxr.Workbook(stream=stream).sheets[1].rows))
+
+
+class NonSeekable(io.RawIOBase):
+    """ A byte stream that can't seek, like a pipe """
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.data.readinto(buffer)
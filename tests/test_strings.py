@@ -0,0 +1,134 @@
+""" Unit tests for the xlsxr.strings module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import io, os, random, tempfile, threading, xlsxr, xlsxr.engines, xlsxr.strings
+
+from benchmarks.generate import generate
+
+from . import resolve_path
+from . import test_sheet
+
+class TestSharedStrings(unittest.TestCase):
+
+    STRINGS = ['Qué?', '', 'Dónde?', 'WASH']
+
+    def setUp(self):
+        self.table = xlsxr.strings.SharedStrings()
+        self.table.extend(self.STRINGS)
+
+    def test_len(self):
+        self.assertEqual(4, len(self.table))
+
+    def test_getitem(self):
+        for i, s in enumerate(self.STRINGS):
+            self.assertEqual(s, self.table[i])
+        self.assertEqual('WASH', self.table[-1])
+        self.assertEqual(['', 'Dónde?'], self.table[1:3])
+
+    def test_index_error(self):
+        with self.assertRaises(IndexError):
+            self.table[4]
+        with self.assertRaises(IndexError):
+            self.table[-5]
+
+    def test_iter(self):
+        self.assertEqual(self.STRINGS, list(self.table))
+
+    def test_contains(self):
+        self.assertTrue('Dónde?' in self.table)
+        self.assertFalse('Cuándo?' in self.table)
+
+    def test_equals(self):
+        self.assertEqual(self.STRINGS, self.table)
+
+    def test_intern(self):
+        table = xlsxr.strings.SharedStrings(intern=True)
+        table.extend(self.STRINGS)
+        self.assertIs(table[2], table[2])
+        self.assertEqual(self.STRINGS, list(table))
+
+
+class TestReadSharedStrings(unittest.TestCase):
+
+    XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="4" uniqueCount="4">
+<si><t>Plain</t></si>
+<si><r><rPr><b/></rPr><t>Rich </t></r><r><t xml:space="preserve">text</t></r></si>
+<si><t>東京</t><rPh sb="0" eb="2"><t>トウキョウ</t></rPh><phoneticPr fontId="1"/></si>
+<si><t/></si>
+</sst>'''.encode('utf-8')
+
+    EXPECTED = ['Plain', 'Rich text', '東京', '']
+
+    def test_engines(self):
+        for name in xlsxr.engines.available_engines():
+            with self.subTest(engine=name):
+                engine = xlsxr.engines.get_engine(name)
+                self.assertEqual(self.EXPECTED, list(engine.read_shared_strings(io.BytesIO(self.XML))))
+
+
+class TestLazySharedStrings(unittest.TestCase):
+
+    def setUp(self):
+        self.workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), lazy_shared_strings=True)
+        self.expected = list(xlsxr.Workbook(filename=resolve_path("simple.xlsx")).shared_strings)
+
+    def test_not_loaded_at_open(self):
+        self.assertIsInstance(self.workbook.shared_strings, xlsxr.strings.LazySharedStrings)
+        self.assertIsNone(self.workbook.shared_strings._offsets)
+
+    def test_lookups(self):
+        strings = self.workbook.shared_strings
+        self.assertEqual(len(self.expected), len(strings))
+        for i in reversed(range(len(self.expected))):
+            self.assertEqual(self.expected[i], strings[i])
+        self.assertEqual(self.expected[-1], strings[-1])
+        with self.assertRaises(IndexError):
+            strings[len(self.expected)]
+
+    def test_cache_size(self):
+        strings = self.workbook.shared_strings
+        strings.cache_size = 5
+        for i in range(len(self.expected)):
+            strings[i]
+        self.assertEqual(5, len(strings._cache))
+
+    def test_iter(self):
+        self.assertEqual(self.expected, list(self.workbook.shared_strings))
+
+    def test_rows(self):
+        self.assertEqual(test_sheet.TestSheet.EXPECTED_ROWS, self.workbook.sheets[0].rows)
+
+    def test_threads(self):
+        """ Lookups from several threads at once share the stream and cache safely """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "strings.xlsx")
+            generate(filename, "strings", 5000, 10)
+            expected = list(xlsxr.Workbook(filename=filename).shared_strings)
+            strings = xlsxr.Workbook(filename=filename, lazy_shared_strings=True).shared_strings
+            strings.cache_size = 256 # mostly misses
+            errors = []
+
+            def lookup(seed):
+                rng = random.Random(seed)
+                try:
+                    for i in range(100):
+                        index = rng.randrange(len(expected))
+                        if strings[index] != expected[index]:
+                            errors.append("wrong string at {}".format(index))
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=lookup, args=(seed,)) for seed in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            strings.close()
+        self.assertEqual([], errors)
@@ -7,7 +7,7 @@
 """
 
 import unittest
-import xlsxr
+import datetime, xlsxr, xlsxr.style
 
 from . import resolve_path
 
@@ -30,6 +30,23 @@ class TestStyles(unittest.TestCase):
     def test_cell_styles(self):
         self.assertEqual(EXPECTED_CELL_STYLES, self.styles.cell_styles)
 
+    def test_number_converters(self):
+        converters = self.styles.number_converters()
+        self.assertEqual(len(self.styles.cell_formats), len(converters))
+        self.assertIs(converters, self.styles.number_converters()) # compiled once
+        self.assertEqual('42064', converters[0]('42064'))
+        self.assertEqual('2015-03-01', converters[4]('42064'))
+
+    def test_number_converters_values(self):
+        converters = self.styles.number_converters(convert_values=True)
+        self.assertEqual(42064, converters[0]('42064'))
+        self.assertEqual(1.5, converters[0]('1.5'))
+        self.assertEqual(datetime.date(2015, 3, 1), converters[4]('42064'))
+
+    def test_number_converter(self):
+        self.assertEqual('2015-03-01T00:00:00', xlsxr.style.number_converter(False, True, True)('42064'))
+        self.assertEqual(datetime.datetime(2015, 3, 1), xlsxr.style.number_converter(True, True, True)('42064'))
+
 
 #
 # Test data
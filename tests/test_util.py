@@ -0,0 +1,50 @@
+""" Unit tests for the xlsxr.util module
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+"""
+
+import unittest
+import itertools, string
+
+from xlsxr.util import MAX_COLS, col_letters, col_number, col_table, parse_cell_ref, parse_cell_range
+
+class TestUtil(unittest.TestCase):
+
+    def all_letters(self):
+        """ Every column's letters from A to XFD, in order, built independently of xlsxr.util """
+        for length in (1, 2, 3,):
+            for letters in itertools.product(string.ascii_uppercase, repeat=length):
+                yield ''.join(letters)
+
+    def test_col_table(self):
+        letters, col_nums = col_table()
+        self.assertEqual(MAX_COLS, len(letters))
+        self.assertEqual(MAX_COLS, len(col_nums))
+        self.assertEqual("XFD", letters[-1])
+        self.assertIs(letters, col_table()[0]) # built once
+
+    def test_parity_to_xfd(self):
+        """ Every column from A to XFD, in every direction """
+        for col_num, letters in zip(range(MAX_COLS), self.all_letters()):
+            self.assertEqual(letters, col_letters(col_num))
+            self.assertEqual(col_num, col_number(letters))
+            self.assertEqual((0, col_num,), parse_cell_ref(letters + "1"))
+            self.assertEqual((1048575, col_num,), parse_cell_ref(letters + "1048576"))
+            self.assertEqual((9, col_num,), parse_cell_ref(letters.lower() + "10"))
+
+    def test_past_xfd(self):
+        self.assertEqual("XFE", col_letters(MAX_COLS))
+        self.assertEqual(MAX_COLS, col_number("XFE"))
+        self.assertEqual((0, MAX_COLS,), parse_cell_ref("XFE1"))
+        self.assertEqual((0, 18277,), parse_cell_ref("ZZZ1"))
+
+    def test_parse_cell_ref(self):
+        self.assertEqual((2, 3,), parse_cell_ref("D3"))
+        self.assertEqual((9, 27,), parse_cell_ref("$AB$10"))
+        self.assertEqual((9, 27,), parse_cell_ref("ab10"))
+
+    def test_parse_cell_range(self):
+        self.assertEqual(((4, 3,), (10, 7,),), parse_cell_range("D5:H11"))
@@ -9,6 +9,8 @@
 import unittest
 import xlsxr
 
+from unittest import mock
+
 from . import resolve_path
 
 class TestWorkbook(unittest.TestCase):
@@ -41,3 +43,15 @@ class TestWorkbook(unittest.TestCase):
     def test_get_sheet(self):
         self.assertIsNotNone(self.workbook.sheets[0])
 
+    def test_metadata_only(self):
+        """ Only the relations and sheet list are parsed when opening """
+        with mock.patch("xlsxr.style.Styles.__init__", side_effect=AssertionError), \
+             mock.patch("xlsxr.workbook.Workbook.parse_shared_strings", side_effect=AssertionError):
+            workbook = xlsxr.Workbook(filename=resolve_path("simple.xlsx"), metadata_only=True)
+            self.assertEqual(["input-valid"], [sheet.name for sheet in workbook.sheets])
+            self.assertEqual("A1:I8", workbook.sheets[0].dimension)
+        self.assertIsNone(workbook._shared_strings)
+        self.assertIsNone(workbook._styles)
+        self.assertEqual(self.workbook.sheets[0].rows, workbook.sheets[0].rows)
+        self.assertEqual(list(self.workbook.shared_strings), list(workbook.shared_strings))
+        self.assertEqual(self.workbook.styles.cell_formats, workbook.styles.cell_formats)
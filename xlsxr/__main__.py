@@ -0,0 +1,5 @@
+""" Run the xlsxr command line with python3 -m xlsxr (see xlsxr.cli) """
+
+import sys, xlsxr.cli
+
+sys.exit(xlsxr.cli.main())
@@ -0,0 +1,249 @@
+""" Asynchronous reading of workbooks, for asyncio applications
+
+Reading a workbook blocks: HTTP range requests for a remote workbook
+(see xlsxr.source), file reads, decompression, and XML parsing.
+AsyncWorkbook and AsyncSheet run all of that in an executor instead
+of in the event loop's thread, so an asyncio service can read many
+workbooks at once and stay responsive.
+
+    async with await AsyncWorkbook.open("https://example.org/data.xlsx") as workbook:
+        async for row in workbook.sheets[0].aiter_rows():
+            ...
+
+The blocking work runs in a LanePool: a fixed number of threads,
+each with its own queue of work (a "lane"). aiter_rows() parses a
+batch of rows at a time in one lane, and keeps up to QUEUE_SIZE parsed
+batches ahead of the consumer in a queue. When the queue is full,
+parsing pauses until the consumer catches up, so a slow consumer
+doesn't make rows pile up in memory. No thread ever waits for room in
+a queue, so any number of sheets can be read at once with a few
+threads, taking turns one batch at a time.
+
+Each iteration stays in the same lane from start to finish, because
+parsers can't move between threads: lxml in particular crashes if a
+parser is used or freed in a thread other than the one that created
+it. So the pool isn't a general concurrent.futures.Executor, which
+may run each task in a different thread.
+
+By default, the work runs in a shared pool of MAX_WORKERS threads
+(see get_pool). Threads keep the event loop free while waiting for the
+network or disk, but parsing holds the GIL, so a service that is short
+of CPU for parsing needs more processes, not more threads.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import asyncio, concurrent.futures, functools, itertools, logging, os, re, threading, xlsxr.workbook
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+""" Number of threads in the shared default pool """
+
+BATCH_SIZE = 1000
+""" Default number of rows to parse at a time """
+
+QUEUE_SIZE = 4
+""" Default number of parsed batches to keep ahead of the consumer """
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ Return the shared default LanePool (of MAX_WORKERS threads), creating it on first use """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LanePool(MAX_WORKERS)
+        return _pool
+
+
+class LanePool:
+    """ A fixed set of threads, each running its own queue of work in order """
+
+    def __init__(self, size):
+        """ Set up the pool (the threads start on first use)
+
+        @param size: the number of threads
+
+        """
+        self.lanes = [concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="xlsxr-aio") for i in range(size)]
+        """ One single-thread concurrent.futures.ThreadPoolExecutor for each lane """
+        self.__next_lane = itertools.count()
+
+    def lane(self):
+        """ Return the next lane, in turn, for a sequence of work that must stay in one thread """
+        return self.lanes[next(self.__next_lane) % len(self.lanes)]
+
+    async def run(self, function, *args, lane=None):
+        """ Run a blocking function in a lane (default: the next one), and return its result """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.lane() if lane is None else lane, function, *args)
+
+    def shutdown(self, wait=True):
+        """ Stop the threads once their work is done (see concurrent.futures.Executor.shutdown) """
+        for lane in self.lanes:
+            lane.shutdown(wait)
+
+
+class AsyncWorkbook:
+    """ An Excel XLSX workbook for asyncio, wrapping an xlsxr.workbook.Workbook
+
+    Use AsyncWorkbook.open() rather than creating one directly.
+
+    """
+
+    def __init__(self, workbook, pool=None):
+        """ Wrap an open workbook
+
+        @param workbook: the xlsxr.workbook.Workbook
+        @param pool: the LanePool for blocking work (default: see get_pool)
+
+        """
+        self.workbook = workbook
+        self.pool = get_pool() if pool is None else pool
+        self.sheets = [AsyncSheet(self, sheet) for sheet in workbook.sheets]
+        """ List of AsyncSheet objects, in workbook order """
+
+    @classmethod
+    async def open(cls, source, pool=None, **options):
+        """ Open a workbook without blocking the event loop
+
+        Parameters:
+          source: a path (str or os.PathLike), an http or https URL, or a seekable byte stream
+          pool(LanePool): the threads for blocking work (default: see get_pool)
+          options: other keyword options for xlsxr.workbook.Workbook
+
+        Return:
+          An AsyncWorkbook
+
+        @raises TypeError: if the source isn't an XLSX workbook
+        @raises OSError: if the source can't be read
+
+        """
+        if isinstance(source, (str, os.PathLike,)):
+            source = os.fspath(source)
+            key = "url" if re.match(r'^https?:', source) else "filename"
+        else:
+            key = "stream"
+        options[key] = source
+        pool = get_pool() if pool is None else pool
+        workbook = await pool.run(functools.partial(xlsxr.workbook.Workbook, **options))
+        return cls(workbook, pool)
+
+    async def run(self, function, *args):
+        """ Run a blocking function in the workbook's pool, and return its result """
+        return await self.pool.run(function, *args)
+
+    def get_sheet(self, name):
+        """ Return the sheet with a name, or None """
+        for sheet in self.sheets:
+            if sheet.name == name:
+                return sheet
+        return None
+
+    async def close(self):
+        """ Close the workbook's archive """
+        await self.run(self.workbook.archive.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncSheet:
+    """ A sheet in an AsyncWorkbook, wrapping an xlsxr.sheet.Sheet """
+
+    def __init__(self, workbook, sheet):
+        """ Wrap a sheet
+
+        @param workbook: the parent AsyncWorkbook
+        @param sheet: the xlsxr.sheet.Sheet
+
+        """
+        self.workbook = workbook
+        self.sheet = sheet
+
+    @property
+    def name(self):
+        """ The name of the sheet """
+        return self.sheet.name
+
+    async def aiter_rows(self, columns=None, min_row=None, max_row=None, limit=None, batch_size=None, queue_size=None, names=None):
+        """ Iterate asynchronously over the rows, parsing them in batches in one of the pool's lanes
+
+        Rows are the same as from xlsxr.sheet.Sheet.iter_rows, which
+        takes the same columns, min_row, max_row, limit, and names. Each batch
+        comes from xlsxr.sheet.Sheet.iter_batches.
+
+        Parameters:
+          batch_size(int): the number of rows to parse at a time (default BATCH_SIZE)
+          queue_size(int): the most parsed batches to keep ahead of the consumer (default QUEUE_SIZE)
+
+        @raises ValueError: if the projection is bad (see xlsxr.sheet.Sheet.iter_rows)
+
+        """
+        batch_size = BATCH_SIZE if batch_size is None else batch_size
+        queue = asyncio.Queue(QUEUE_SIZE if queue_size is None else queue_size)
+        pool = self.workbook.pool
+        lane = pool.lane()
+        batches = None
+
+        def next_batch():
+            """ Parse the next batch of rows (runs in the lane) """
+            nonlocal batches
+            if batches is None:
+                batches = self.sheet.iter_batches(batch_size, columns, min_row, max_row, limit, names=names)
+            return next(batches, [])
+
+        def close():
+            """ Stop parsing early, in the lane that was parsing (after any batch still in progress) """
+            if batches is not None:
+                batches.close()
+
+        async def produce():
+            """ Keep the queue filled, ending with an empty batch or an exception """
+            try:
+                while True:
+                    batch = await pool.run(next_batch, lane=lane)
+                    await queue.put(batch) # waits while the queue is full
+                    if not batch:
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await queue.put(e)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                batch = await queue.get()
+                if isinstance(batch, Exception):
+                    raise batch
+                if not batch:
+                    break
+                for row in batch:
+                    yield row
+        finally:
+            if not producer.done(): # the consumer stopped early
+                producer.cancel()
+                lane.submit(close)
+
+    async def row(self, row_num):
+        """ Return a single row, by its 1-based number (see xlsxr.sheet.Sheet.row) """
+        return await self.workbook.run(self.sheet.row, row_num)
+
+    async def cell(self, ref):
+        """ Return the value of a single cell, e.g. "D2500" (see xlsxr.sheet.Sheet.cell) """
+        return await self.workbook.run(self.sheet.cell, ref)
+
+    async def header(self):
+        """ Return the first row of the sheet (see xlsxr.sheet.Sheet.header) """
+        return await self.workbook.run(self.sheet.header)
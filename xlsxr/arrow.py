@@ -0,0 +1,263 @@
+""" Apache Arrow, Parquet, and Feather output for Excel XLSX sheets
+
+Builds pyarrow.RecordBatch objects straight from the columnar reader
+(see xlsxr.columns), a fixed number of rows at a time, so that a
+sheet can be written to Parquet or Feather with bounded memory and
+without a Python object for each cell.
+
+Arrow types for each kind of column:
+
+Kind | Arrow type
+-- | --
+"int" | int64 (numbers that are all whole, with no fraction)
+"float" | float64
+"bool" | bool
+"date" | date32
+"datetime" | timestamp[ms]
+"string" | dictionary<int32, large_string>, with the workbook's shared strings as the dictionary
+"object" | large_string (each value as str)
+None | null
+
+String columns that are all shared strings are dictionary arrays
+whose dictionary is built directly on the buffers of the workbook's
+shared-string table, and whose indices are the shared-string indices.
+By default, each column's dictionary is then compacted to the
+strings it uses: the dictionary for each batch extends the one for
+the batch before, so Feather files can store it as a delta and no
+string is written more than once per column. Columns with inline
+strings are plain large_string arrays.
+
+The schema comes from the first batch (with empty columns as
+large_string) unless one is given, and later batches are cast to it.
+A column that is "int" in the first batch but has fractions later
+can't be cast, so pass a schema with float64 for columns like that.
+
+Requires pyarrow (pip install xlsxr[arrow]).
+
+From the command line, use xlsxr convert --format parquet (or
+feather); see xlsxr.cli.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import logging, xlsxr.columns, xlsxr.strings
+
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 64 * 1024
+""" Default number of rows in each record batch """
+
+EPOCH_SERIAL = 25569
+""" Excel serial day number for 1970-01-01 """
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("xlsxr.arrow requires pyarrow")
+
+def shared_string_dictionary(workbook):
+    """ Return the workbook's shared strings as an Arrow large_string array
+
+    Reuses the buffers of an xlsxr.strings.SharedStrings table without
+    copying; lazily-loaded shared strings are read in full.
+
+    """
+    _require_pyarrow()
+    strings = workbook.shared_strings
+    if isinstance(strings, xlsxr.strings.SharedStrings):
+        offsets, buffer = strings.buffers()
+        return pyarrow.LargeStringArray.from_buffers(len(strings), pyarrow.py_buffer(offsets), pyarrow.py_buffer(buffer))
+    return pyarrow.array(list(strings), type=pyarrow.large_string())
+
+def column_to_arrow(column, dictionary):
+    """ Convert an xlsxr.columns.Column to an Arrow array
+
+    Parameters:
+      column(xlsxr.columns.Column): the column
+      dictionary(pyarrow.Array): the shared strings (see shared_string_dictionary)
+
+    """
+    _require_pyarrow()
+    compute = pyarrow.compute
+    kind = column.kind
+    length = len(column)
+
+    def from_buffer(arrow_type, values):
+        return pyarrow.Array.from_buffers(arrow_type, length, [None, pyarrow.py_buffer(values)])
+
+    def early_serials(serials):
+        # a day later before Excel's imaginary 1900-02-29 (see xlsxr.numfmt.from_excel)
+        early = compute.less(compute.floor(serials), 60)
+        return compute.add(serials, early.cast(pyarrow.float64()))
+
+    def with_nulls(array):
+        if 0 not in column.valid:
+            return array
+        valid = from_buffer(pyarrow.uint8(), column.valid).cast(pyarrow.bool_())
+        return compute.if_else(valid, array, pyarrow.scalar(None, array.type))
+
+    if kind is None:
+        return pyarrow.nulls(length)
+    elif kind == "float":
+        return with_nulls(from_buffer(pyarrow.float64(), column.values))
+    elif kind == "int":
+        return with_nulls(from_buffer(pyarrow.int64(), column.values))
+    elif kind == "bool":
+        return with_nulls(from_buffer(pyarrow.int8(), column.values).cast(pyarrow.bool_()))
+    elif kind == "date":
+        days = compute.subtract(early_serials(compute.floor(from_buffer(pyarrow.float64(), column.values))), EPOCH_SERIAL)
+        return with_nulls(days.cast(pyarrow.int32()).cast(pyarrow.date32()))
+    elif kind == "datetime":
+        days = compute.subtract(early_serials(from_buffer(pyarrow.float64(), column.values)), EPOCH_SERIAL)
+        ms = compute.round(compute.multiply(days, 86400000))
+        return with_nulls(ms.cast(pyarrow.int64()).cast(pyarrow.timestamp('ms')))
+    elif kind == "string" and not column.dictionary.extra:
+        indices = with_nulls(from_buffer(pyarrow.int64(), column.values).cast(pyarrow.int32()))
+        return pyarrow.DictionaryArray.from_arrays(indices, dictionary)
+    else:
+        return pyarrow.array(
+            [None if value is None else str(value) for value in column.to_list()],
+            type=pyarrow.large_string(),
+        )
+
+def compact_dictionary(array, codes=None):
+    """ Re-encode a dictionary array to use only the strings it needs
+
+    Parameters:
+      array(pyarrow.DictionaryArray): the array, with a large dictionary (e.g. all the shared strings)
+      codes(pyarrow.Array): the original indices kept for earlier batches, or None
+
+    Return:
+      A tuple of the new array, whose dictionary starts with the
+      strings for codes (in the same order), and the new codes
+
+    """
+    compute = pyarrow.compute
+    indices = array.indices.cast(pyarrow.int64())
+    new_codes = compute.unique(indices.drop_null())
+    if codes is None:
+        codes = new_codes
+    else:
+        new_codes = new_codes.filter(compute.invert(compute.is_in(new_codes, value_set=codes)))
+        codes = pyarrow.concat_arrays([codes, new_codes])
+    indices = compute.index_in(indices, value_set=codes).cast(pyarrow.int32())
+    return pyarrow.DictionaryArray.from_arrays(indices, array.dictionary.take(codes)), codes
+
+def iter_record_batches(sheet, batch_size=BATCH_SIZE, header=False, schema=None, compact=True):
+    """ Read a sheet as a sequence of Arrow record batches
+
+    Parameters:
+      sheet(xlsxr.sheet.Sheet): the sheet to read
+      batch_size(int): the number of rows in each batch
+      header(bool): if True, name the fields from the first row (otherwise, the column letters)
+      schema(pyarrow.Schema): optional schema for every batch (default: from the first batch)
+      compact(bool): if True (default), compact the dictionaries of shared-string columns
+        (see compact_dictionary); if False, every one has all of the shared strings
+
+    Return:
+      An iterator over pyarrow.RecordBatch objects, all with the same schema
+
+    @raises ValueError: if a later batch can't be cast to the schema
+
+    """
+    _require_pyarrow()
+    dictionary = shared_string_dictionary(sheet.workbook)
+    first_row = 2 if header else 1
+    codes = {} # shared-string indices in each compacted dictionary, by column number
+
+    for batch_num, columns in enumerate(xlsxr.columns.iter_column_batches(sheet, batch_size, header)):
+        arrays = [column_to_arrow(column, dictionary) for column in columns]
+        if compact:
+            for i, array in enumerate(arrays):
+                if isinstance(array, pyarrow.DictionaryArray):
+                    arrays[i], codes[i] = compact_dictionary(array, codes.get(i))
+
+        if schema is None:
+            schema = pyarrow.schema([
+                (name, pyarrow.large_string() if array.type == pyarrow.null() else array.type)
+                for name, array in zip(xlsxr.columns.unique_names(columns), arrays)
+            ])
+
+        row_num = first_row + batch_num * batch_size
+        if len(arrays) > len(schema):
+            raise ValueError("Sheet {} has more columns from row {} than the schema".format(sheet.name, row_num))
+        arrays += [pyarrow.nulls(len(columns[0]) if columns else 0)] * (len(schema) - len(arrays))
+
+        for i, field in enumerate(schema):
+            if arrays[i].type != field.type:
+                try:
+                    arrays[i] = arrays[i].cast(field.type)
+                except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError):
+                    raise ValueError("Column {} in sheet {} changes from {} to {} in the batch from row {}; try passing a schema".format(
+                        field.name, sheet.name, field.type, arrays[i].type, row_num,
+                    ))
+
+        yield pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _peek_schema(batches):
+    """ Return the schema of the first batch, and an iterator over all of the batches """
+    first = next(batches)
+    def all_batches():
+        yield first
+        yield from batches
+    return first.schema, all_batches()
+
+def write_parquet(sheet, filename, batch_size=BATCH_SIZE, header=False, schema=None, compact=True, **options):
+    """ Write a sheet to a Parquet file, one batch at a time
+
+    Each batch becomes a row group. Other keyword options go to
+    pyarrow.parquet.ParquetWriter (e.g. compression="zstd").
+
+    Return:
+      The number of rows written
+
+    """
+    _require_pyarrow()
+    import pyarrow.parquet
+
+    schema, batches = _peek_schema(iter_record_batches(sheet, batch_size, header, schema, compact))
+    count = 0
+    with pyarrow.parquet.ParquetWriter(filename, schema, **options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+def write_feather(sheet, filename, batch_size=BATCH_SIZE, header=False, schema=None, compact=True, **options):
+    """ Write a sheet to a Feather (Arrow IPC) file, one batch at a time
+
+    Dictionaries are written as deltas. Other keyword options go to
+    pyarrow.ipc.IpcWriteOptions (e.g. compression="lz4").
+
+    Return:
+      The number of rows written
+
+    """
+    _require_pyarrow()
+    import pyarrow.ipc
+
+    schema, batches = _peek_schema(iter_record_batches(sheet, batch_size, header, schema, compact))
+    options.setdefault("emit_dictionary_deltas", True)
+    count = 0
+    with pyarrow.ipc.new_file(filename, schema, options=pyarrow.ipc.IpcWriteOptions(**options)) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+WRITERS = {
+    "parquet": write_parquet,
+    "feather": write_feather,
+}
+""" Writer functions by format name """
+
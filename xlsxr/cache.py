@@ -0,0 +1,444 @@
+""" Persistent on-disk cache of parsed workbooks and sheets
+
+A workbook opened with cache_dir looks for a cache entry before
+parsing anything. On a hit, the sheet list, relations, styles, and
+shared strings come from the entry, and the workbook XML, relations,
+styles, and shared strings aren't parsed at all; the rows of each
+sheet are cached in a separate entry, so Sheet.rows on a hit skips
+parsing the sheet XML as well. On a miss, the workbook is parsed as
+usual, and the results are saved for next time.
+
+Entries are keyed by a hash of the zip directory (the name, CRC-32,
+and sizes of every archive member), plus the size and modification
+time of the file for a workbook opened with a filename, so a changed
+workbook never matches an old entry. Row entries also include the
+options that affect values (see ROW_OPTIONS).
+
+Entry file layout: MAGIC, a 4-byte little-endian header length, a
+JSON header, padding to a multiple of 8 bytes, then the payload, with
+each of its parts also padded to a multiple of 8 bytes. The
+payload of a workbook entry is the shared-string table in the same
+layout as xlsxr.strings.SharedStrings (an array of 8-byte offsets,
+then the UTF-8 text), which is memory-mapped and used in place rather
+than read, so a hit costs almost nothing however many strings there
+are. The payload of a row entry is a table of the distinct strings in
+the same layout, followed by typed arrays: the end of each row, a
+string index for each cell, the column of each cell (for sparse rows),
+then the position and value of each cell of every other kind (see
+VALUE_KINDS). The merges and column metadata go in the JSON header.
+Nothing in an entry is ever executed, but the cache directory must
+still belong to the current user, and not be writable by anyone else,
+so that other users can't plant wrong values in it.
+
+Several processes can share a cache directory. Entries are written to
+a temporary file and renamed into place, so a reader never sees a
+partial entry, and an entry that is replaced or evicted while mapped
+stays readable until it is unmapped. Each hit updates the entry's
+modification time, and when the cache grows past MAX_SIZE bytes, the
+least-recently-used entries are deleted.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import datetime, hashlib, json, logging, mmap, os, struct, sys, tempfile, time, xlsxr.rows, xlsxr.sheet, xlsxr.strings, xlsxr.style
+
+from array import array
+from xlsxr.util import parse_cell_range
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'XLSXRCA2'
+""" First bytes of a cache entry (the last one is the format version) """
+
+MAX_SIZE = 1024 * 1024 * 1024
+""" Maximum total size of the entries in a cache directory, in bytes """
+
+TEMP_MAX_AGE = 3600
+""" Age in seconds after which a leftover temporary file (from a crashed writer) is deleted """
+
+ROW_OPTIONS = ('convert_values', 'display_values', 'fill_merged', 'positional_cells', 'sparse_rows',)
+""" Workbook options that change the rows, and so are part of the key of a row entry """
+
+WORKBOOK_SUFFIX = ".workbook"
+ROWS_SUFFIX = ".rows"
+TEMP_SUFFIX = ".tmp"
+
+VALUE_KINDS = (
+    ("int", 'q'),
+    ("float", 'd'),
+    ("bool", 'q'),
+    ("date", 'q'),
+    ("datetime", 'q'),
+    ("bigint", 'q'),
+)
+""" The kinds of non-string cell values in a row entry, with the array type code of their values
+
+Dates are stored as proleptic Gregorian ordinals, datetimes as
+microseconds since datetime.min, and integers too large for 8 bytes as
+string indices of their decimal text.
+
+"""
+
+
+class WorkbookCache:
+    """ A directory of cached workbooks and sheets """
+
+    def __init__(self, directory, max_size=None):
+        """ Set up a cache, creating its directory if necessary
+
+        Parameters:
+          directory(str): path to the cache directory
+          max_size(int): the maximum total size of the entries, in bytes (default MAX_SIZE)
+
+        @raises PermissionError: if the directory belongs to another user, or others can write to it
+
+        """
+        self.directory = os.fspath(directory)
+        self.max_size = MAX_SIZE if max_size is None else max_size
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        if hasattr(os, "getuid"):
+            stat = os.stat(self.directory)
+            if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+                raise PermissionError(
+                    "Cache directory {} must belong to the current user, and not be writable by others".format(self.directory)
+                )
+
+    def workbook_key(self, workbook):
+        """ Return the cache key for a workbook's archive contents """
+        parts = sorted(
+            (info.filename, info.CRC, info.compress_size, info.file_size,) for info in workbook.archive.infolist()
+        )
+        if workbook.filename is not None:
+            stat = os.stat(workbook.filename)
+            parts.append((stat.st_size, stat.st_mtime_ns,))
+        return _hash(parts)
+
+    def rows_key(self, sheet):
+        """ Return the cache key for a sheet's rows, with the workbook's options """
+        workbook = sheet.workbook
+        return _hash([workbook.cache_key, sheet.filename, [getattr(workbook, option) for option in ROW_OPTIONS]])
+
+    def load_workbook(self, workbook):
+        """ Restore a workbook's sheets, relations, styles, and shared strings from the cache
+
+        Return:
+          True on a hit, or False if there's no (usable) entry
+
+        """
+        entry = self.__load(workbook.cache_key + WORKBOOK_SUFFIX, workbook.cache_key)
+        if entry is None:
+            return False
+        header, view = entry
+
+        workbook.relations = header["relations"]
+        workbook.date1904 = header["date1904"]
+        workbook.sheets = [xlsxr.sheet.Sheet(workbook, *sheet) for sheet in header["sheets"]]
+        workbook.styles = xlsxr.style.Styles.from_json(workbook, header["styles"])
+        count = header["strings"]
+        offsets = view[:(count + 1) * 8].cast('Q')
+        workbook.shared_strings = xlsxr.strings.SharedStrings.from_buffers(
+            offsets, view[len(offsets) * 8:], intern=workbook.intern_strings
+        )
+        logger.debug("Loaded workbook %s from the cache", workbook.cache_key)
+        return True
+
+    def save_workbook(self, workbook):
+        """ Save a parsed workbook's sheets, relations, styles, and shared strings
+
+        Does nothing if the shared strings are lazy (see xlsxr.strings.LazySharedStrings),
+        since saving them would mean parsing them all.
+
+        """
+        if not isinstance(workbook.shared_strings, xlsxr.strings.SharedStrings):
+            return
+        offsets, buffer = workbook.shared_strings.buffers()
+        header = {
+            "relations": workbook.relations,
+            "date1904": workbook.date1904,
+            "sheets": [
+                [sheet.name, sheet.sheet_id, sheet.state, sheet.relation_id, sheet.filename] for sheet in workbook.sheets
+            ],
+            "styles": workbook.styles.to_json(),
+            "strings": len(offsets) - 1,
+        }
+        self.__save(workbook.cache_key + WORKBOOK_SUFFIX, workbook.cache_key, header, (offsets, buffer,))
+
+    def load_rows(self, sheet):
+        """ Restore a sheet's rows, merges, and cols from the cache
+
+        Return:
+          True on a hit, or False if there's no (usable) entry
+
+        """
+        key = self.rows_key(sheet)
+        entry = self.__load(key + ROWS_SUFFIX, key)
+        if entry is None:
+            return False
+        header, view = entry
+        try:
+            merges = []
+            if header["sparse"] and sheet.workbook.fill_merged:
+                merges = [parse_cell_range(merge) for merge in header["merges"]]
+            sheet._raw_rows = _decode_rows(header, view, merges)
+            sheet._raw_merges = header["merges"]
+            sheet._raw_cols = header["cols"]
+        except (KeyError, TypeError, ValueError, IndexError, OverflowError) as e:
+            logger.warning("Ignoring the bad cache entry for sheet %s: %s", sheet.name, e)
+            return False
+        finally:
+            view.release()
+        logger.debug("Loaded the rows of sheet %s from the cache", sheet.name)
+        return True
+
+    def save_rows(self, sheet):
+        """ Save a sheet's parsed rows, merges, and cols
+
+        Does nothing if a cell has a value of a type that the entry
+        layout doesn't cover (see VALUE_KINDS).
+
+        """
+        key = self.rows_key(sheet)
+        try:
+            header, payload = _encode_rows(sheet._raw_rows)
+        except TypeError as e:
+            logger.debug("Not caching the rows of sheet %s: %s", sheet.name, e)
+            return
+        header.update(sheet=sheet.name, merges=sheet._raw_merges, cols=sheet._raw_cols)
+        self.__save(key + ROWS_SUFFIX, key, header, payload)
+
+    def evict(self):
+        """ Delete least-recently-used entries until the cache is no larger than max_size
+
+        Also deletes temporary files left behind by writers that crashed.
+        Entries deleted by other processes at the same time are skipped.
+
+        """
+        entries = []
+        total = 0
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+                if entry.name.endswith(TEMP_SUFFIX):
+                    if now - stat.st_mtime > TEMP_MAX_AGE:
+                        os.remove(entry.path)
+                elif entry.name.endswith((WORKBOOK_SUFFIX, ROWS_SUFFIX,)):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path,))
+                    total += stat.st_size
+            except OSError:
+                pass # deleted by another process, or still in use (Windows)
+
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                logger.debug("Evicted %s from the cache", path)
+            except OSError:
+                pass
+            total -= size
+
+    def __load(self, name, key):
+        """ Map an entry, check it, and mark it as recently used
+
+        Return:
+          A (header, view) pair, where view is a memoryview of the payload in the
+          mapped file, or None if there is no entry or it can't be used
+
+        """
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as input:
+                map = mmap.mmap(input.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Can't read the cache entry %s: %s", path, e)
+            return None
+
+        try:
+            if map[:len(MAGIC)] != MAGIC:
+                raise ValueError("not a cache entry")
+            size = struct.unpack_from('<I', map, len(MAGIC))[0]
+            start = len(MAGIC) + 4
+            header = json.loads(map[start:start + size].decode('utf-8'))
+            if header.get("key") != key or header.get("byteorder") != sys.byteorder:
+                raise ValueError("wrong key or byte order")
+        except (ValueError, struct.error, UnicodeDecodeError) as e:
+            logger.warning("Ignoring the bad cache entry %s: %s", path, e)
+            map.close()
+            return None
+
+        try:
+            os.utime(path) # for LRU eviction
+        except OSError:
+            pass
+        return header, memoryview(map)[_align(start + size):]
+
+    def __save(self, name, key, header, payload):
+        """ Write an entry to a temporary file, rename it into place, and evict old entries if necessary
+
+        Errors are logged, not raised, since the cache is only an optimisation.
+
+        """
+        header = json.dumps(dict(header, key=key, byteorder=sys.byteorder)).encode('utf-8')
+        start = len(MAGIC) + 4 + len(header)
+        try:
+            fd, temp_path = tempfile.mkstemp(suffix=TEMP_SUFFIX, dir=self.directory)
+            try:
+                with os.fdopen(fd, "wb") as output:
+                    output.write(MAGIC)
+                    output.write(struct.pack('<I', len(header)))
+                    output.write(header)
+                    output.write(b'\0' * (_align(start) - start))
+                    for data in payload:
+                        size = memoryview(data).nbytes
+                        output.write(data)
+                        output.write(b'\0' * (_align(size) - size))
+                os.replace(temp_path, os.path.join(self.directory, name))
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        except OSError as e:
+            logger.warning("Can't save %s to the cache: %s", name, e)
+            return
+        logger.debug("Saved %s to the cache", name)
+        self.evict()
+
+
+def _encode_rows(rows):
+    """ Lay out rows as typed arrays for a row entry (see the module documentation)
+
+    Return:
+      A (header, payload) pair, where header is a dict of counts, and
+      payload is a list of arrays and other bytes-like objects
+
+    @raises TypeError: if a value has a type outside VALUE_KINDS
+
+    """
+    sparse = any(isinstance(row, xlsxr.rows.Row) for row in rows)
+    string_indices = {'': 0}
+    ends = array('Q', [0])
+    indices = array('I')
+    cols = array('H')
+    kinds = {kind: (array('Q'), array(typecode),) for kind, typecode in VALUE_KINDS}
+    datetime_min = datetime.datetime.min
+
+    def add_string(s):
+        index = string_indices.get(s)
+        if index is None:
+            index = string_indices[s] = len(string_indices)
+        return index
+
+    for row in rows:
+        if sparse:
+            cols.extend(range(len(row.values)) if row.cols is None else row.cols)
+            row = row.values
+        for value in row:
+            value_type = type(value)
+            if value_type is str:
+                indices.append(add_string(value))
+                continue
+            if value_type is bool:
+                kind = "bool"
+            elif value_type is int:
+                kind = "int" if -2 ** 63 <= value < 2 ** 63 else "bigint"
+                if kind == "bigint":
+                    value = add_string(str(value))
+            elif value_type is float:
+                kind = "float"
+            elif value_type is datetime.datetime and value.tzinfo is None:
+                kind = "datetime"
+                value = (value - datetime_min) // datetime.timedelta(microseconds=1)
+            elif value_type is datetime.date:
+                kind = "date"
+                value = value.toordinal()
+            else:
+                raise TypeError("can't store a {} value".format(value_type.__name__))
+            positions, values = kinds[kind]
+            positions.append(len(indices))
+            values.append(value)
+            indices.append(0)
+        ends.append(len(indices))
+
+    strings = xlsxr.strings.SharedStrings()
+    strings.extend(string_indices)
+    offsets, buffer = strings.buffers()
+    header = {
+        "sparse": sparse,
+        "rows": len(ends) - 1,
+        "strings": len(offsets) - 1,
+        "text": len(buffer),
+        "kinds": {kind: len(kinds[kind][0]) for kind, typecode in VALUE_KINDS},
+    }
+    payload = [offsets, buffer, ends, indices]
+    if sparse:
+        payload.append(cols)
+    for kind, typecode in VALUE_KINDS:
+        payload.extend(kinds[kind])
+    return header, payload
+
+def _decode_rows(header, view, merges=()):
+    """ Rebuild the rows of a row entry from the mapped payload (see _encode_rows)
+
+    Parameters:
+      header(dict): the entry's header
+      view(memoryview): the payload
+      merges: for sparse rows, the merges to attach, parsed with xlsxr.util.parse_cell_range
+
+    """
+    pos = 0
+
+    def take(count, typecode):
+        """ Return the next array of count items in the payload, as a memoryview """
+        nonlocal pos
+        size = count * array(typecode).itemsize
+        data = view[pos:pos + size].cast(typecode)
+        if len(data) != count:
+            raise ValueError("truncated entry")
+        pos += _align(size)
+        return data
+
+    count = header["strings"]
+    offsets = take(count + 1, 'Q')
+    strings = list(xlsxr.strings.SharedStrings.from_buffers(offsets, take(header["text"], 'B')))
+    ends = take(header["rows"] + 1, 'Q')
+    indices = take(ends[-1], 'I')
+    values = list(map(strings.__getitem__, indices))
+    cols = take(len(indices), 'H') if header["sparse"] else None
+
+    datetime_min = datetime.datetime.min
+    converters = {
+        "int": None,
+        "float": None,
+        "bool": bool,
+        "date": datetime.date.fromordinal,
+        "datetime": lambda microseconds: datetime_min + datetime.timedelta(microseconds=microseconds),
+        "bigint": lambda index: int(strings[index]),
+    }
+    for kind, typecode in VALUE_KINDS:
+        count = header["kinds"][kind]
+        positions = take(count, 'Q')
+        kind_values = take(count, typecode)
+        converter = converters[kind]
+        if converter is not None:
+            kind_values = map(converter, kind_values)
+        for position, value in zip(positions, kind_values):
+            values[position] = value
+
+    bounds = zip(ends, ends[1:])
+    if not header["sparse"]:
+        return [values[start:end] for start, end in bounds]
+    return list(xlsxr.rows.make_rows((dict(zip(cols[start:end], values[start:end])) for start, end in bounds), merges))
+
+def _hash(parts):
+    """ Return a hex digest of a JSON-serialisable value """
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+def _align(pos):
+    """ Round a position up to a multiple of 8 """
+    return -(-pos // 8) * 8
@@ -0,0 +1,328 @@
+""" Command-line interface for xlsx-reader
+
+Converts sheets to CSV, TSV, or JSON Lines, streaming the rows from
+the parser straight into a buffered writer, so memory use does not
+depend on the size of the sheet. With pyarrow installed, it also
+writes Parquet and Feather files, a batch of rows at a time (see
+xlsxr.arrow); those need --output FILE or --output-dir DIR, and take
+the field names from the first row unless --no-header is given.
+
+Usage:
+
+    xlsxr convert [options] [INPUT...]
+    xlsxr list [INPUT...]
+    python3 -m xlsxr convert [options] [INPUT...]
+
+Each INPUT is a filename, a URL, or - for standard input (the
+default). With one input and one sheet, the output goes to standard
+output or to --output FILE. With --output-dir DIR (needed for several
+inputs or --all-sheets), each sheet goes to DIR/STEM.EXT, or to
+DIR/STEM.SHEET-NAME.EXT if there is more than one.
+
+The list command prints one tab-separated line for each sheet: the
+input, the 1-based sheet number, the name, the state, the dimension,
+and the uncompressed size of the sheet XML. It parses only the
+workbook's sheet list and the start of each sheet, so it takes a few
+milliseconds for each workbook, whatever its size.
+
+Many files can be converted in a single run, to avoid starting Python
+once for each one; an input that can't be read is reported, and the
+rest are still converted (the exit status is 1).
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import argparse, csv, functools, json, logging, os, re, sys, xlsxr, xlsxr.arrow, xlsxr.parallel, zipfile
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "tsv", "jsonl", "parquet", "feather",)
+""" Output formats """
+
+EXTENSIONS = {
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".tab": "tsv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+}
+""" Output formats by filename extension, for guessing the format from --output """
+
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+""" Size of the buffer for each output file (and standard output) """
+
+
+def write_rows(rows, output, format="csv"):
+    """ Write rows to a text stream as CSV, TSV, or JSON Lines
+
+    In JSON Lines, each row is an array, and dates and datetimes
+    (with convert_values) are ISO 8601 strings.
+
+    Parameters:
+      rows(iterable): the rows, each a list of values
+      output(io.TextIOBase): the stream, opened with newline=''
+      format(str): "csv", "tsv", or "jsonl"
+
+    Return:
+      The number of rows written
+
+    """
+    count = 0
+    if format == "jsonl":
+        encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':',), default=_isoformat).encode
+        write = output.write
+        for count, row in enumerate(rows, 1):
+            write(encode(row))
+            write('\n')
+    elif format in ("csv", "tsv",):
+        if format == "csv":
+            writerow = csv.writer(output).writerow
+        else:
+            writerow = csv.writer(output, dialect="excel-tab", lineterminator='\n').writerow
+        for count, row in enumerate(rows, 1):
+            writerow(row)
+    else:
+        raise ValueError("Unknown output format: {}".format(format))
+    return count
+
+def convert_sheet(sheet, output, format="csv", columns=None, min_row=None, max_row=None, limit=None, names=None, header=True):
+    """ Convert a sheet to CSV, TSV, JSON Lines, Parquet, or Feather
+
+    For CSV, TSV, and JSON Lines, the rows come from Sheet.iter_rows(),
+    so the projection and row range are applied while parsing (see
+    there). Parquet and Feather files are written from the columnar
+    reader by xlsxr.arrow, and always hold the whole sheet.
+
+    Parameters:
+      sheet(xlsxr.sheet.Sheet): the sheet to convert
+      output: a filename, or (not for Parquet or Feather) a text stream opened with newline=''
+      format(str): "csv", "tsv", "jsonl", "parquet", or "feather"
+      columns(list): optional projection by column (see Sheet.iter_rows)
+      min_row(int): optional 1-based number of the first row
+      max_row(int): optional 1-based number of the last row
+      limit(int): optional maximum number of rows
+      names(list): optional projection by header name, instead of columns
+      header(bool): for Parquet and Feather, if True (default), name the fields from the first row
+
+    Return:
+      The number of rows written
+
+    @raises ValueError: for Parquet or Feather with a text stream, a projection, or a row range
+
+    """
+    if format in xlsxr.arrow.WRITERS:
+        if not isinstance(output, str):
+            raise ValueError("{} output needs a filename (--output or --output-dir)".format(format))
+        if (columns, names, min_row, max_row, limit,) != (None,) * 5:
+            raise ValueError("Can't select columns or rows for {} output".format(format))
+        return xlsxr.arrow.WRITERS[format](sheet, output, header=header)
+
+    rows = sheet.iter_rows(columns, min_row, max_row, limit, names)
+    if isinstance(output, str):
+        with open(output, "w", encoding="utf-8", newline='', buffering=OUTPUT_BUFFER_SIZE) as stream:
+            return write_rows(rows, stream, format)
+    return write_rows(rows, output, format)
+
+def open_workbook(input, **options):
+    """ Open a workbook from a filename, a URL, or - for standard input
+
+    A non-seekable standard input (e.g. a pipe) is copied to a
+    temporary file first, kept in memory if it is small (see
+    xlsxr.source.spool).
+
+    Other keyword options go to the Workbook constructor.
+
+    """
+    if input == '-':
+        return xlsxr.Workbook(stream=sys.stdin.buffer, **options)
+    elif re.match(r'^https?:', input):
+        return xlsxr.Workbook(url=input, **options)
+    else:
+        return xlsxr.Workbook(filename=input, **options)
+
+def select_sheets(workbook, sheet=None, all_sheets=False):
+    """ Return a list of the sheets to convert
+
+    Parameters:
+      workbook(xlsxr.workbook.Workbook): the workbook
+      sheet(str): a sheet name or 1-based sheet number (default: the first sheet)
+      all_sheets(bool): if True, return all of the sheets
+
+    @raises ValueError: if there is no such sheet
+
+    """
+    if all_sheets:
+        return list(workbook.sheets)
+    elif sheet is None:
+        if not workbook.sheets:
+            raise ValueError("Workbook has no sheets")
+        return workbook.sheets[:1]
+    for n, candidate in enumerate(workbook.sheets, 1):
+        if sheet in (candidate.name, str(n),):
+            return [candidate]
+    raise ValueError("No sheet {}".format(sheet))
+
+def _isoformat(value):
+    """ Encode dates and datetimes for JSON """
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError("Can't write a {} as JSON".format(type(value).__name__))
+
+def _stem(input):
+    """ Return the base name for the output files of an input """
+    if input == '-':
+        return "stdin"
+    name = os.path.basename(input.split('?')[0].rstrip('/')) if re.match(r'^https?:', input) else os.path.basename(input)
+    return os.path.splitext(name)[0] or "workbook"
+
+def _convert_to_dir(output_dir, stem, single, options, sheet):
+    """ Convert a sheet to a file in output_dir (runs in a worker process with --workers), and return (filename, count) """
+    name = stem if single else "{}.{}".format(stem, sheet.name)
+    filename = os.path.join(output_dir, "{}.{}".format(name, options["format"]))
+    return filename, convert_sheet(sheet, filename, **options)
+
+def _open_stdout():
+    """ Return standard output as a large-buffered UTF-8 text stream (not closing the real one) """
+    sys.stdout.flush()
+    try:
+        fileno = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        return sys.stdout # e.g. replaced by a StringIO
+    return open(fileno, "w", encoding="utf-8", newline='', buffering=OUTPUT_BUFFER_SIZE, closefd=False)
+
+def convert(args):
+    """ Run the convert command with parsed arguments, and return the exit status """
+    inputs = args.inputs or ['-']
+    format = args.format
+    if format is None:
+        extension = os.path.splitext(args.output)[1].lower() if args.output else ''
+        format = EXTENSIONS.get(extension, "csv")
+    options = {
+        "format": format,
+        "columns": args.columns.split(',') if args.columns else None,
+        "names": args.names.split(',') if args.names else None,
+        "min_row": args.min_row,
+        "max_row": args.max_row,
+        "limit": args.limit,
+        "header": not args.no_header,
+    }
+
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    status = 0
+    for input in inputs:
+        try:
+            workbook = open_workbook(
+                input,
+                convert_values=args.convert_values,
+                display_values=args.display_values,
+                fill_merged=args.fill_merged,
+                streaming=True,
+                engine=args.engine,
+                positional_cells=args.positional_cells,
+            )
+            sheets = select_sheets(workbook, args.sheet, args.all_sheets)
+
+            if args.output_dir is None:
+                if args.output is None or args.output == '-':
+                    output = _open_stdout()
+                    try:
+                        convert_sheet(sheets[0], output, **options)
+                    finally:
+                        if output is not sys.stdout:
+                            output.close()
+                else:
+                    convert_sheet(sheets[0], args.output, **options)
+            else:
+                function = functools.partial(_convert_to_dir, args.output_dir, _stem(input), len(sheets) == 1, options)
+                for sheet, (filename, count) in xlsxr.parallel.map_sheets(workbook, function, args.workers, sheets=sheets):
+                    logger.info("%s [%s] -> %s (%d rows)", input, sheet.name, filename, count)
+        except (ImportError, OSError, TypeError, ValueError, zipfile.BadZipFile) as e:
+            if isinstance(e, BrokenPipeError):
+                raise
+            print("xlsxr: {}: {}".format(input, e), file=sys.stderr)
+            status = 1
+    return status
+
+def list_sheets(args):
+    """ Run the list command with parsed arguments, and return the exit status """
+    output = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+    status = 0
+    for input in args.inputs or ['-']:
+        try:
+            workbook = open_workbook(input, metadata_only=True)
+            for n, sheet in enumerate(workbook.sheets, 1):
+                output.writerow([input, n, sheet.name, sheet.state or "visible", sheet.dimension or "", sheet.size])
+        except (OSError, TypeError, ValueError, zipfile.BadZipFile) as e:
+            if isinstance(e, BrokenPipeError):
+                raise
+            print("xlsxr: {}: {}".format(input, e), file=sys.stderr)
+            status = 1
+    return status
+
+def main(argv=None):
+    """ Run the xlsxr command line, and return the exit status """
+    parser = argparse.ArgumentParser(prog="xlsxr", description="Read very large Excel XLSX files efficiently")
+    parser.add_argument("--verbose", "-v", action="store_true", help="report each sheet converted")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    command = commands.add_parser(
+        "convert",
+        help="convert sheets to CSV, TSV, JSON Lines, Parquet, or Feather",
+        description="Convert Excel XLSX sheets to CSV, TSV, or JSON Lines, streaming the rows, or (with pyarrow) to Parquet or Feather",
+    )
+    command.add_argument("inputs", nargs="*", metavar="INPUT", help="Excel XLSX files or URLs, or - for standard input (the default)")
+    command.add_argument("--format", "-f", choices=FORMATS, default=None, help="output format (default: from the --output extension, or csv)")
+    destination = command.add_mutually_exclusive_group()
+    destination.add_argument("--output", "-o", default=None, help="output file for a single sheet (default: standard output)")
+    destination.add_argument("--output-dir", "-d", default=None, help="directory for one output file per sheet (STEM.EXT or STEM.SHEET.EXT)")
+    selection = command.add_mutually_exclusive_group()
+    selection.add_argument("--sheet", "-s", default=None, help="sheet name or 1-based number (default: the first sheet)")
+    selection.add_argument("--all-sheets", "-a", action="store_true", help="convert every sheet (needs --output-dir)")
+    projection = command.add_mutually_exclusive_group()
+    projection.add_argument("--columns", "-c", default=None, help="comma-separated columns to output, as letters (e.g. A,AF)")
+    projection.add_argument("--names", default=None, help="comma-separated header names (from the first row) of the columns to output")
+    command.add_argument("--min-row", type=int, default=None, help="1-based number of the first row to output")
+    command.add_argument("--max-row", type=int, default=None, help="1-based number of the last row to output")
+    command.add_argument("--limit", "-n", type=int, default=None, help="maximum number of rows to output for each sheet")
+    command.add_argument("--no-header", action="store_true", help="for parquet and feather, the first row is data, and the fields are named by column letter")
+    command.add_argument("--workers", "-w", type=int, default=1, help="convert the sheets of each workbook in up to this many worker processes (default 1)")
+    command.add_argument("--convert-values", action="store_true", help="convert numbers and dates to values (e.g. JSON numbers instead of strings)")
+    command.add_argument("--display-values", action="store_true", help="output numbers and dates as Excel displays them, using their number formats")
+    command.add_argument("--fill-merged", action="store_true", help="repeat the value of each merged area in all of its cells")
+    command.add_argument("--positional-cells", action="store_true", help="ignore cell references and number cells by position (only for sheets with no gaps between cells)")
+    command.add_argument("--engine", default=None, help="parser engine to use (default: auto)")
+    command.set_defaults(run=convert)
+
+    command = commands.add_parser(
+        "list",
+        help="list the sheets in workbooks",
+        description="List the number, name, state, dimension, and XML size of each sheet, without reading the rows",
+    )
+    command.add_argument("inputs", nargs="*", metavar="INPUT", help="Excel XLSX files or URLs, or - for standard input (the default)")
+    command.set_defaults(run=list_sheets)
+
+    args = parser.parse_args(argv)
+    if args.command == "convert" and args.output_dir is None and (len(args.inputs) > 1 or args.all_sheets):
+        parser.error("--output-dir is required with several inputs or --all-sheets")
+    logging.basicConfig(format="%(message)s", level=logging.INFO if args.verbose else logging.WARNING)
+
+    try:
+        return args.run(args)
+    except BrokenPipeError:
+        # the reader went away (e.g. | head); don't complain again when Python flushes stdout at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
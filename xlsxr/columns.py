@@ -0,0 +1,375 @@
+""" Columnar output for Excel XLSX sheets
+
+Reads a sheet straight into one typed buffer per column, instead of
+building a list of Python values for every row. Each Column has a
+kind, a buffer of values, and a validity mask (a bytearray with 1
+for each row that has a value, and 0 for each missing cell):
+
+Kind | Values
+-- | --
+None | no values at all (every cell is missing)
+"bool" | array('b') of 0 and 1
+"int" | array('q')
+"float" | array('d')
+"date", "datetime" | array('d') of Excel serial day numbers (1900 date system, even for 1904 workbooks)
+"string" | array('q') of codes into the column's dictionary
+"object" | list of Python values, for columns with mixed kinds
+
+The values for missing cells are 0 (or None in an object column).
+The codes for shared strings are their indices in the workbook's
+shared-string table, so they are never decoded while reading.
+
+NumPy is optional, and needed only for Column.to_numpy() (it is
+imported on first use, because it is slow to import).
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import logging, xlsxr.engines, xlsxr.numfmt
+
+from array import array
+from datetime import datetime
+
+from xlsxr.util import col_letters, parse_cell_ref
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1899, 12, 30)
+""" The date for serial day number 0, for serial numbers from 61 (1900-03-01) on
+
+Earlier serial numbers are a day later, to allow for Excel's imaginary
+1900-02-29 (see xlsxr.numfmt.from_excel).
+
+"""
+
+DAYS_1904 = 1462
+""" Days from the 1900 date system to the 1904 one (added to the serial numbers of 1904 workbooks) """
+
+TYPECODES = {
+    "bool": 'b',
+    "float": 'd',
+    "date": 'd',
+    "datetime": 'd',
+    "string": 'q',
+}
+""" Array type codes for the values of each kind of column while reading """
+
+
+class StringDictionary:
+    """ The strings for the codes in a string column
+
+    Codes below the length of the shared-string table are shared-string
+    indices, and the rest are the column's own (e.g. inline) strings.
+    Behaves like a read-only list of str.
+
+    """
+
+    def __init__(self, shared_strings):
+        self.shared_strings = shared_strings
+        self.extra = []
+        self._shared_count = len(shared_strings)
+        self._codes = {}
+
+    def add(self, s):
+        """ Return the code for one of the column's own strings, adding it if necessary """
+        code = self._codes.get(s)
+        if code is None:
+            code = self._codes[s] = self._shared_count + len(self.extra)
+            self.extra.append(s)
+        return code
+
+    def __len__(self):
+        return self._shared_count + len(self.extra)
+
+    def __getitem__(self, code):
+        if code < self._shared_count:
+            return self.shared_strings[code]
+        return self.extra[code - self._shared_count]
+
+    def __iter__(self):
+        yield from self.shared_strings
+        yield from self.extra
+
+
+class Column:
+    """ One column of a sheet, as a typed buffer plus a validity mask """
+
+    def __init__(self, name, col_num):
+        """ Set up an empty column
+
+        @param name: the column name (from the header row, or the column letters)
+        @param col_num: the 0-based column number in the sheet
+
+        """
+        self.name = name
+        self.col_num = col_num
+        self.kind = None
+        """ The kind of values in the column (see the module documentation) """
+        self.values = array('b')
+        """ The values, one for each row """
+        self.valid = bytearray()
+        """ 1 for each row with a value, 0 for each missing cell """
+        self.dictionary = None
+        """ For a string column, the strings for the codes in values """
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __repr__(self):
+        return "<Column {}: {} x {}>".format(self.name, len(self), self.kind)
+
+    def python_value(self, kind, value):
+        """ Convert a raw value of the given kind to a Python value """
+        if kind == "float":
+            return int(value) if value.is_integer() else value
+        elif kind == "int":
+            return value
+        elif kind == "date":
+            return xlsxr.numfmt.date_from_excel(value)
+        elif kind == "datetime":
+            return xlsxr.numfmt.from_excel(value)
+        elif kind == "bool":
+            return bool(value)
+        elif kind == "string":
+            return self.dictionary[value]
+        else:
+            return value
+
+    def to_list(self):
+        """ Return the values as a list of Python values, with None for missing cells """
+        kind = self.kind
+        return [self.python_value(kind, value) if valid else None for value, valid in zip(self.values, self.valid)]
+
+    def to_numpy(self):
+        """ Return the values as a NumPy masked array, with missing cells masked
+
+        Numbers become int64, float64, or bool arrays, dates become
+        datetime64[D] (or datetime64[ms] with times), and strings
+        become object arrays of str, decoding each distinct string once.
+
+        @raises ImportError: if NumPy is not installed
+
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("Column.to_numpy() requires NumPy")
+
+        kind = self.kind
+        mask = numpy.frombuffer(bytes(self.valid), dtype=numpy.uint8) == 0
+        if kind == "int":
+            data = numpy.frombuffer(self.values, dtype=numpy.int64)
+        elif kind == "float":
+            data = numpy.frombuffer(self.values, dtype=numpy.float64)
+        elif kind == "bool":
+            data = numpy.frombuffer(self.values, dtype=numpy.int8).astype(bool)
+        elif kind == "date":
+            days = numpy.floor(numpy.frombuffer(self.values, dtype=numpy.float64))
+            days += days < 60 # before Excel's imaginary 1900-02-29
+            data = numpy.datetime64(EPOCH.date(), 'D') + days.astype('timedelta64[D]')
+        elif kind == "datetime":
+            serials = numpy.frombuffer(self.values, dtype=numpy.float64)
+            days = numpy.floor(serials)
+            milliseconds = numpy.round((serials - days) * 86400000)
+            days += days < 60 # before Excel's imaginary 1900-02-29
+            data = numpy.datetime64(EPOCH, 'ms') + (days * 86400000 + milliseconds).astype('timedelta64[ms]')
+        elif kind == "string":
+            codes, inverse = numpy.unique(numpy.frombuffer(self.values, dtype=numpy.int64), return_inverse=True)
+            strings = numpy.empty(len(codes), dtype=object)
+            strings[:] = [self.dictionary[code] for code in codes.tolist()]
+            data = strings[inverse.reshape(-1)] if len(codes) else numpy.empty(0, dtype=object)
+        else:
+            data = numpy.empty(len(self.values), dtype=object)
+            data[:] = self.values
+        return numpy.ma.MaskedArray(data, mask=mask)
+
+    def _append(self, index, kind, value):
+        """ Add a raw value of the given kind for the 0-based row index """
+        if kind != self.kind:
+            if self.kind is None:
+                self.values = array(TYPECODES[kind])
+                self.values.frombytes(bytes(self.values.itemsize * len(self.valid)))
+                self.kind = kind
+            elif {kind, self.kind} == {"date", "datetime"}:
+                self.kind = "datetime"
+            else:
+                if self.kind != "object":
+                    self.values = self.to_list()
+                    self.kind = "object"
+                value = self.python_value(kind, value)
+
+        self._append_missing(index)
+        self.values.append(value)
+        self.valid.append(1)
+
+    def _finish(self, length):
+        """ Pad the column to its full length, and settle its final kind """
+        self._append_missing(length)
+        if self.kind != "string":
+            self.dictionary = None
+        if self.kind == "float":
+            values = self.values
+            if all(value.is_integer() and abs(value) < 2 ** 53 for value in values):
+                self.values = array('q', map(int, values))
+                self.kind = "int"
+
+    def _append_missing(self, length):
+        """ Pad the column with missing cells up to length rows """
+        gap = length - len(self.valid)
+        if gap > 0:
+            if self.kind == "object":
+                self.values.extend([None] * gap)
+            else:
+                self.values.frombytes(bytes(self.values.itemsize * gap))
+            self.valid.extend(bytes(gap))
+
+
+def read_columns(sheet, header=False, dtype_inference=True):
+    """ Read a sheet into a list of Column objects
+
+    Uses the expat-based cell reader (see SheetEngine.read_cells) for
+    every engine, and ignores the workbook's convert_values and
+    fill_merged settings.
+
+    Parameters:
+      sheet(xlsxr.sheet.Sheet): the sheet to read
+      header(bool): if True, use the first row for the column names, and start the data at row 2
+      dtype_inference(bool): if True (default), give each column a type from its cells;
+        if False, keep every value as a string (the text of the cell, or the shared string)
+
+    Return:
+      A list of Column objects, one for each column
+
+    """
+    return next(iter_column_batches(sheet, None, header, dtype_inference))
+
+def iter_column_batches(sheet, batch_size=None, header=False, dtype_inference=True):
+    """ Read a sheet into batches of Column objects, batch_size rows at a time
+
+    Each batch is yielded as soon as the parser has passed its last
+    row, so only one batch is in memory at a time. The kind of a
+    column may differ from one batch to the next. Every batch has at
+    least as many columns as the sheet's <dimension> and header say,
+    and as any earlier batch.
+
+    Parameters:
+      sheet(xlsxr.sheet.Sheet): the sheet to read
+      batch_size(int): the number of rows in each batch, or None for a single batch
+      header(bool): if True, use the first row for the column names, and start the data at row 2
+      dtype_inference(bool): see read_columns()
+
+    Return:
+      An iterator over lists of Column objects (at least one list, even for an empty sheet)
+
+    """
+    workbook = sheet.workbook
+    shared_strings = workbook.shared_strings
+    first_row = 2 if header else 1
+    date_offset = DAYS_1904 if workbook.date1904 else 0
+
+    # "date", "datetime", or None for each cell format
+    date_kinds = [
+        ("datetime" if cell_format['has_time'] else "date") if cell_format['has_date'] else None
+        for cell_format in workbook.styles.cell_formats
+    ]
+
+    columns = {}
+    names = {}
+    ready = []
+    batch_start = 0 # index of the first row in the current batch
+    width = _scan_width(sheet)
+
+    def finish_batch(length):
+        """ Move the current columns into the ready list as a batch of length rows """
+        nonlocal columns, width
+        width = max([width, len(names)] + [col_num + 1 for col_num in columns])
+        batch = []
+        for col_num in range(width):
+            column = columns.get(col_num) or Column(None, col_num)
+            column.name = names.get(col_num) or col_letters(col_num)
+            column._finish(length)
+            batch.append(column)
+        ready.append(batch)
+        columns = {}
+
+    def add_cell(row_num, col_num, datatype, style, text):
+        nonlocal batch_start
+        index = row_num - first_row
+        if index < 0:
+            if row_num == 1 and header:
+                names[col_num] = shared_strings[int(text)] if datatype == 's' else text
+            return
+
+        if batch_size is not None:
+            while index >= batch_start + batch_size:
+                finish_batch(batch_size)
+                batch_start += batch_size
+            index -= batch_start
+
+        column = columns.get(col_num)
+        if column is None:
+            column = columns[col_num] = Column(None, col_num)
+
+        if not dtype_inference:
+            kind = "string"
+            value = int(text) if datatype == 's' else None
+        elif datatype is None or datatype == 'n':
+            value = float(text)
+            kind = (date_kinds[style] if style is not None else None) or "float"
+            if date_offset and kind != "float":
+                value += date_offset
+        elif datatype == 's':
+            kind = "string"
+            value = int(text)
+        elif datatype == 'b':
+            kind = "bool"
+            value = 1 if text == '1' else 0
+        else: # inline strings, formula strings, errors, and ISO dates
+            kind = "string"
+            value = None
+
+        if kind == "string":
+            if column.dictionary is None:
+                column.dictionary = StringDictionary(shared_strings)
+            if value is None:
+                value = column.dictionary.add(text)
+        column._append(index, kind, value)
+
+    last_row = 0
+    with workbook.archive.open(sheet.filename, "r") as stream:
+        for last_row in xlsxr.engines.SheetEngine.read_cells(stream, add_cell, workbook.positional_cells):
+            yield from ready
+            ready.clear()
+
+    # the rest of the rows, including any empty ones at the end
+    length = max(last_row - first_row + 1 - batch_start, 0)
+    while batch_size is not None and length > batch_size:
+        finish_batch(batch_size)
+        length -= batch_size
+    if length > 0 or batch_start == 0:
+        finish_batch(length)
+    logger.debug("Read %d columns x %d rows from sheet %s", width, max(last_row - first_row + 1, 0), sheet.name)
+    yield from ready
+
+def unique_names(columns):
+    """ Return the column names, adding the column letters to any repeated names, e.g. "Total (F)" """
+    names = []
+    seen = set()
+    for column in columns:
+        name = column.name
+        if name in seen:
+            name = "{} ({})".format(name, col_letters(column.col_num))
+        seen.add(name)
+        names.append(name)
+    return names
+
+def _scan_width(sheet):
+    """ Return the number of columns in the sheet's <dimension>, or 0 if it's missing """
+    if sheet.dimension is None:
+        return 0
+    end = sheet.dimension.split(':')[-1]
+    return parse_cell_ref(end)[1] + 1
@@ -0,0 +1,802 @@
+""" Parser engines for Excel XLSX sheet and shared-string XML
+
+Every engine accepts the sheet XML incrementally through feed() and
+close(), and accumulates completed rows in its rows list as
+(row_num, row) pairs, where row_num is 1-based. If the engine was
+given a column projection, each row is instead a dict of values by
+0-based column number, holding only the projected columns, and all
+other cells are skipped without building a value. With the
+workbook's sparse_rows option, rows are dicts of all of the non-empty
+cells (see xlsxr.rows). Rows before an optional first row number are
+skipped the same way, and are not reported at all. When the document
+is closed, the engine saves the cols and merges in the parent sheet.
+
+Column numbers come from the cells' r attributes, looked up in the
+shared table of column letters (see xlsxr.util.col_table), unless
+the workbook has positional_cells set: then the r attributes are
+ignored, and the cells in each row are simply counted.
+
+Engines also provide a reader for the workbook's shared strings.
+Whatever the engine, the shared strings are read with expat (which
+measured faster than lxml.etree.iterparse for large tables) and the
+styles with xml.sax, so the engine choice affects only the sheets.
+
+Available engines:
+
+- "sax": xml.sax ContentHandler callbacks (the original engine)
+- "expat": xml.parsers.expat directly, with a dispatch table by element name
+- "lxml": lxml.etree pull parsing, if lxml is installed
+
+The default, "auto", uses expat, the fastest engine in
+benchmarks/engines.py: in repeated runs it read 1.3-2.4x as many rows
+per second as sax, against 1.1-2.1x for lxml, on wide and tall sheets.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import logging, xlsxr.style, xml.parsers.expat, xml.sax
+
+from xlsxr.util import DIGITS, col_table, get_attr, parse_cell_ref, to_int, to_bool
+
+try:
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+""" Number of bytes to read from an archive stream for each incremental parse """
+
+
+class SheetEngine:
+    """ Base class for sheet parser engines
+
+    Holds the accumulators and the logic for turning a cell's type,
+    style, and text into a value. Subclasses translate XML events
+    into rows.
+
+    """
+
+    name = None
+    """ The name used to select the engine in the Workbook constructor """
+
+    def __init__(self, sheet, columns=None, min_row=None):
+        """ Set up an engine for a single pass through a sheet
+
+        @param sheet: the xlsxr.sheet.Sheet being parsed
+        @param columns: optional collection of 0-based column numbers to keep (all if None)
+        @param min_row: optional 1-based number of the first row to keep (default 1)
+
+        """
+        self.sheet = sheet
+        self.workbook = sheet.workbook
+
+        self.columns = None if columns is None else frozenset(columns)
+        """ Set of column numbers to keep, or None to keep all """
+
+        self.dense = columns is None and not sheet.workbook.sparse_rows
+        """ True to build each row as a list padded with '' for empty cells, or False for a dict of values by column number """
+
+        self.min_row = 1 if min_row is None else min_row
+        """ 1-based number of the first row to keep """
+
+        self.rows = []
+        """ Completed (row_num, row) pairs not yet collected by the caller """
+
+        workbook = self.workbook
+        self.shared_strings = workbook.shared_strings
+        """ The workbook's shared-string table (looked up once, since it may be loaded on demand) """
+
+        self.number_converters = workbook.styles.number_converters(workbook.convert_values, workbook.date1904, workbook.display_values)
+        """ Functions to convert the text of number cells, by style (see xlsxr.style.Styles.number_converters) """
+
+        if workbook.display_values:
+            self.default_number_converter = xlsxr.style.display_converter('General')
+        else:
+            self.default_number_converter = xlsxr.style.number_converter(workbook.convert_values, False, False)
+        """ Function to convert the text of number cells with no style """
+
+        self.text_formatters = workbook.styles.text_formatters() if workbook.display_values else None
+        """ With display_values, functions to render strings by style (or None for each style that leaves them alone) """
+
+        self.cols = []
+        self.merges = []
+
+    def feed(self, data):
+        """ Parse the next chunk of the sheet XML
+
+        Parameters:
+          data(bytes): the next chunk of raw XML
+
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """ Finish parsing, and save the cols and merges in the parent sheet """
+        self.sheet._raw_cols = self.cols
+        self.sheet._raw_merges = self.merges
+
+    @staticmethod
+    def read_shared_strings(stream):
+        """ Read the shared strings from xl/sharedStrings.xml
+
+        The text of rich-text runs (<r>) is joined, and phonetic
+        hints (<rPh>) are skipped. This default implementation uses
+        expat, with character data captured only inside <t>.
+
+        Parameters:
+          stream: a file-like object (from the archive)
+
+        Return:
+          An iterator over the shared strings, in order
+
+        """
+
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+        parser.buffer_size = CHUNK_SIZE
+        strings = []
+        chunks = []
+        in_rPh = False
+
+        def start_element(name, attributes):
+            nonlocal in_rPh
+            if name == 't':
+                if not in_rPh:
+                    parser.CharacterDataHandler = chunks.append
+            elif name == 'rPh':
+                in_rPh = True
+
+        def end_element(name):
+            nonlocal in_rPh
+            if name == 't':
+                parser.CharacterDataHandler = None
+            elif name == 'si':
+                strings.append(chunks[0] if len(chunks) == 1 else ''.join(chunks))
+                chunks.clear()
+            elif name == 'rPh':
+                in_rPh = False
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+
+        while True:
+            data = stream.read(CHUNK_SIZE)
+            parser.Parse(data, not data)
+            yield from strings
+            strings.clear()
+            if not data:
+                break
+
+    @staticmethod
+    def read_cells(stream, add_cell, positional=False):
+        """ Read the raw cells from a sheet's XML, without building rows or values
+
+        Used for columnar output (see xlsxr.columns) whatever the engine,
+        like read_shared_strings. Cells with no text are skipped. The
+        cells are passed to add_cell as they are parsed, and the reader
+        yields after each chunk, so that the caller can use the rows
+        completed so far.
+
+        Parameters:
+          stream: a file-like object (from the archive)
+          add_cell: a function taking the 1-based row number, 0-based
+            column number, datatype (t attribute), style (s attribute, as an int),
+            and text of each cell
+          positional: if True, ignore the cell references and count the cells in each row
+
+        Return:
+          An iterator over the 1-based number of the last row started
+          after each chunk (0 if none yet). All earlier rows are complete,
+          and after the last chunk, so is this one.
+
+        """
+
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+        parser.buffer_size = CHUNK_SIZE
+        parser.ordered_attributes = True
+        col_nums = col_table()[1]
+        chunks = []
+
+        # Parse state
+        row_num = 0
+        col_num = -1
+        datatype = None
+        style = None
+        in_c = False
+
+        def start_element(name, attributes):
+            nonlocal row_num, col_num, datatype, style, in_c
+            if name == 'c':
+                ref = datatype = style = None
+                for i in range(0, len(attributes), 2):
+                    key = attributes[i]
+                    if key == 'r':
+                        ref = attributes[i + 1]
+                    elif key == 't':
+                        datatype = attributes[i + 1]
+                    elif key == 's':
+                        style = int(attributes[i + 1])
+                if ref is None or positional:
+                    col_num += 1
+                else:
+                    col_num = col_nums.get(ref.rstrip(DIGITS))
+                    if col_num is None:
+                        col_num = parse_cell_ref(ref)[1]
+                in_c = True
+            elif name == 'v' or name == 't':
+                if in_c:
+                    parser.CharacterDataHandler = chunks.append
+            elif name == 'row':
+                for i in range(0, len(attributes), 2):
+                    if attributes[i] == 'r':
+                        row_num = int(attributes[i + 1])
+                        break
+                else:
+                    # The row number is optional, so count if it's missing
+                    row_num += 1
+                col_num = -1
+
+        def end_element(name):
+            nonlocal in_c
+            if name == 'c':
+                in_c = False
+                if chunks:
+                    add_cell(row_num, col_num, datatype, style, chunks[0] if len(chunks) == 1 else ''.join(chunks))
+                    chunks.clear()
+            elif name == 'v' or name == 't':
+                parser.CharacterDataHandler = None
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+
+        while True:
+            data = stream.read(CHUNK_SIZE)
+            parser.Parse(data, not data)
+            yield row_num
+            if not data:
+                break
+
+    def make_col(self, collapsed, hidden, min, max, style):
+        """ Construct the metadata for a <col> element from its raw attribute values """
+        return {
+            "collapsed": to_bool(collapsed),
+            "hidden": to_bool(hidden),
+            "min": to_int(min),
+            "max": to_int(max),
+            "style": style,
+        }
+
+    def make_value(self, datatype, style, value):
+        """ Figure out the scalar value to include for a cell
+
+        Numbers go through the converter precompiled for their style
+        (see number_converters), and shared strings are looked up in
+        the parent workbook.
+
+        Parameters:
+          datatype(str): the value of the t attribute, or None
+          style(int): the value of the s attribute, or None
+          value(str): the text of the cell (never empty)
+
+        """
+
+        if datatype is None or datatype == 'n': # number (the default), or a date or datetime, depending on the style
+            if style is None:
+                return self.default_number_converter(value)
+            return self.number_converters[style](value)
+        elif datatype == 's': # shared string
+            value = self.shared_strings[int(value)]
+        elif datatype == 'b': # boolean
+            if self.workbook.display_values:
+                return 'TRUE' if to_bool(value) else 'FALSE'
+            return to_bool(value) if self.workbook.convert_values else value
+        elif datatype != 'inlineStr' and datatype != 'str':
+            return value # 'd' (ISO date) and 'e' (error) are left as they are
+
+        # strings (shared, inline, and from formulas) can have a text section in their number format
+        if self.text_formatters is not None and style is not None and self.text_formatters[style] is not None:
+            return self.text_formatters[style](value)
+        return value
+
+
+class SAXSheetEngine(SheetEngine):
+    """ Sheet engine using xml.sax ContentHandler callbacks
+
+    TODO: add XML Namespace support
+
+    """
+
+    name = "sax"
+
+    def __init__(self, sheet, columns=None, min_row=None):
+        super().__init__(sheet, columns, min_row)
+        self.__parser = xml.sax.make_parser()
+        self.__parser.setContentHandler(SAXSheetEngine.__SAXHandler(self))
+
+    def feed(self, data):
+        self.__parser.feed(data)
+
+    def close(self):
+        self.__parser.close()
+        super().close()
+
+
+    class __SAXHandler(xml.sax.handler.ContentHandler):
+        """ SAX content handler for parsing a sheet XML file """
+
+        def __init__(self, engine):
+            super().__init__()
+            self.__engine = engine
+            self.__columns = engine.columns
+            self.__dense = engine.dense
+            self.__min_row = engine.min_row
+            self.__positional = engine.workbook.positional_cells
+
+            # Local accumulators for the handler
+            self.__row = None
+            self.__datatype = None
+            self.__style = None
+            self.__chunks = [] # we can reuse this list
+
+            # Very simple parse context
+            self.__in_row = False
+            self.__in_c = False
+            self.__in_v = False
+            self.__in_is = False
+            self.__in_t = False
+
+            # Track the positions
+            self.__col_num = None
+            self.__last_col_num = -1
+            self.__row_num = 0
+
+        def startElement(self, name, attributes):
+
+            if name == 'col':
+                self.__engine.cols.append(self.__engine.make_col(
+                    get_attr(attributes, "collapsed"),
+                    get_attr(attributes, "hidden"),
+                    get_attr(attributes, "min"),
+                    get_attr(attributes, "max"),
+                    get_attr(attributes, "style"),
+                ))
+
+            if name == 'row':
+                self.__row = [] if self.__dense else {}
+                self.__last_col_num = -1
+                self.__col_num = None
+
+                # The row number is optional, so count if it's missing
+                row_num = get_attr(attributes, 'r')
+                self.__row_num = self.__row_num + 1 if row_num is None else int(row_num)
+
+                # skip the cells in rows before the range
+                self.__in_row = self.__row_num >= self.__min_row
+
+            elif name == 'c' and self.__in_row:
+                ref = None if self.__positional else get_attr(attributes, 'r')
+                if ref is None:
+                    self.__col_num = 0 if self.__col_num is None else self.__col_num + 1
+                else:
+                    self.__col_num = parse_cell_ref(ref)[1]
+                if self.__columns is not None and self.__col_num not in self.__columns:
+                    return # skip cells outside the projection
+                self.__in_c = True
+                self.__datatype = get_attr(attributes, 't')
+                self.__style = to_int(get_attr(attributes, 's'))
+
+            elif name == 'v' and self.__in_c:
+                self.__in_v = True
+
+            elif name == 'is' and self.__in_c:
+                self.__in_is = True
+
+            elif name == 't' and self.__in_is:
+                self.__in_t = True
+
+            elif name == 'mergeCell':
+                self.__engine.merges.append(get_attr(attributes, 'ref'))
+
+
+        def endElement(self, name):
+
+            if name == 'row':
+                if self.__in_row:
+                    self.__engine.rows.append((self.__row_num, self.__row,))
+                self.__in_row = False
+
+            elif name == 'c' and self.__in_c:
+                self.__in_c = False
+
+                # Special case: if we haven't seen any text chunks, use ''
+                if len(self.__chunks) == 0:
+                    value = ''
+                else:
+                    # Merge all the text chunks (more efficient than using + each time)
+                    value = self.__engine.make_value(self.__datatype, self.__style, ''.join(self.__chunks))
+                self.__chunks.clear()
+
+                if not self.__dense:
+                    self.__row[self.__col_num] = value
+                    return
+
+                # Are there blank cells preceeding this one?
+                for n in range(self.__last_col_num + 1, self.__col_num):
+                    self.__row.append('')
+                self.__last_col_num = self.__col_num
+                self.__row.append(value)
+
+            elif name == 'v' and self.__in_c:
+                self.__in_v = False
+
+            elif name == 'is' and self.__in_c:
+                self.__in_is = False
+
+            elif name == 't' and self.__in_is:
+                self.__in_t = False
+
+
+        def characters(self, content):
+
+            if self.__in_v or self.__in_t:
+                self.__chunks.append(content)
+
+
+class ExpatSheetEngine(SheetEngine):
+    """ Sheet engine using xml.parsers.expat directly
+
+    Avoids the per-event overhead of xml.sax: text is buffered by
+    expat, attributes arrive as flat [name, value, ...] lists, and
+    elements are dispatched through tables keyed by element name
+    instead of a chain of comparisons. Character data is captured
+    only while inside a <v> or <t> element, by switching the handler
+    on and off.
+
+    The handlers are closures over local parse state, because
+    attribute lookups on self are a measurable part of the
+    per-cell cost.
+
+    TODO: add XML Namespace support
+
+    """
+
+    name = "expat"
+
+    def __init__(self, sheet, columns=None, min_row=None):
+        super().__init__(sheet, columns, min_row)
+
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+        parser.buffer_size = CHUNK_SIZE
+        parser.ordered_attributes = True
+        self.__parser = parser
+
+        make_value = self.make_value
+        number_converters = self.number_converters
+        default_number_converter = self.default_number_converter
+        columns = self.columns
+        dense = self.dense
+        min_row = self.min_row
+        positional = self.workbook.positional_cells
+        cols = self.cols
+        merges = self.merges
+        col_nums = col_table()[1]
+        chunks = []
+
+        # Parse state
+        row = None
+        row_num = 0
+        col_num = -1
+        datatype = None
+        style = None
+        in_c = False
+
+        def start_col(attributes):
+            attributes = dict(zip(attributes[::2], attributes[1::2]))
+            cols.append(self.make_col(
+                attributes.get('collapsed'),
+                attributes.get('hidden'),
+                attributes.get('min'),
+                attributes.get('max'),
+                attributes.get('style'),
+            ))
+
+        def start_row(attributes):
+            nonlocal row, row_num
+            for i in range(0, len(attributes), 2):
+                if attributes[i] == 'r':
+                    row_num = int(attributes[i + 1])
+                    break
+            else:
+                # The row number is optional, so count if it's missing
+                row_num += 1
+            # cells in rows before the range are skipped while row is None
+            if row_num >= min_row:
+                row = [] if dense else {}
+
+        def end_row():
+            nonlocal row, col_num
+            if row is not None:
+                self.rows.append((row_num, row,))
+            row = None
+            col_num = -1
+
+        def start_text(attributes):
+            if in_c:
+                parser.CharacterDataHandler = chunks.append
+
+        def end_text():
+            parser.CharacterDataHandler = None
+
+        def start_mergeCell(attributes):
+            attributes = dict(zip(attributes[::2], attributes[1::2]))
+            merges.append(attributes.get('ref'))
+
+        start_handlers = {
+            'col': start_col,
+            'row': start_row,
+            't': start_text,
+            'mergeCell': start_mergeCell,
+        }.get
+
+        end_handlers = {
+            'row': end_row,
+            't': end_text,
+        }.get
+
+        # <c> and <v> are by far the most common elements, so they
+        # skip the dispatch tables and are handled inline
+
+        def start_element(name, attributes):
+            nonlocal in_c, col_num, datatype, style
+            if name == 'c':
+                if row is None:
+                    return
+                ref = datatype = style = None
+                for i in range(0, len(attributes), 2):
+                    key = attributes[i]
+                    if key == 'r':
+                        ref = attributes[i + 1]
+                    elif key == 't':
+                        datatype = attributes[i + 1]
+                    elif key == 's':
+                        style = int(attributes[i + 1])
+                if ref is None or positional:
+                    col_num = len(row) if dense else col_num + 1
+                else:
+                    col_num = col_nums.get(ref.rstrip(DIGITS))
+                    if col_num is None:
+                        col_num = parse_cell_ref(ref)[1]
+                # skip cells outside the projection
+                in_c = columns is None or col_num in columns
+            elif name == 'v':
+                if in_c:
+                    parser.CharacterDataHandler = chunks.append
+            else:
+                handler = start_handlers(name)
+                if handler is not None:
+                    handler(attributes)
+
+        def end_element(name):
+            nonlocal in_c
+            if name == 'c':
+                if not in_c:
+                    return
+                in_c = False
+
+                if chunks:
+                    value = chunks[0] if len(chunks) == 1 else ''.join(chunks)
+                    chunks.clear()
+                    # numbers are the most common cells, so they skip make_value
+                    if datatype is None or datatype == 'n':
+                        value = (default_number_converter if style is None else number_converters[style])(value)
+                    else:
+                        value = make_value(datatype, style, value)
+                else:
+                    value = ''
+
+                if not dense:
+                    row[col_num] = value
+                    return
+
+                # Are there blank cells preceeding this one?
+                if col_num > len(row):
+                    row.extend([''] * (col_num - len(row)))
+                row.append(value)
+            elif name == 'v':
+                parser.CharacterDataHandler = None
+            else:
+                handler = end_handlers(name)
+                if handler is not None:
+                    handler()
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+
+    def feed(self, data):
+        self.__parser.Parse(data, False)
+
+    def close(self):
+        parser = self.__parser
+        parser.Parse(b'', True)
+        # the handlers are closures over the parser, so break the cycle to free its buffer now, not at the next collection
+        parser.StartElementHandler = parser.EndElementHandler = parser.CharacterDataHandler = None
+        super().close()
+
+
+class LxmlSheetEngine(SheetEngine):
+    """ Sheet engine using lxml.etree pull parsing (the incremental form of iterparse)
+
+    Only the end events for <row>, <col>, and <mergeCell> are
+    reported, so the rest of the document costs no Python callbacks
+    at all; the cells are read from each row's children in one go.
+    Each element is cleared, and earlier siblings removed, as soon as
+    it has been used, so the tree never grows beyond a single row.
+
+    Unlike the other engines, this one is namespace-aware.
+
+    Requires lxml.
+
+    """
+
+    name = "lxml"
+
+    def __init__(self, sheet, columns=None, min_row=None):
+        super().__init__(sheet, columns, min_row)
+        self.__parser = lxml.etree.XMLPullParser(
+            events=('end',),
+            tag=('{*}row', '{*}col', '{*}mergeCell',),
+            huge_tree=True,
+        )
+        self.__ns = None
+        self.__col_nums = col_table()[1]
+        self.__positional = self.workbook.positional_cells
+        self.__row_num = 0
+
+    def feed(self, data):
+        self.__parser.feed(data)
+        self.__read_events()
+
+    def close(self):
+        self.__parser.close()
+        self.__read_events()
+        super().close()
+
+    def __read_events(self):
+        for event, elem in self.__parser.read_events():
+            if self.__ns is None:
+                tag = elem.tag
+                self.__ns = tag[:tag.index('}') + 1] if tag[0] == '{' else ''
+            name = elem.tag[len(self.__ns):]
+            if name == 'row':
+                self.__read_row(elem)
+            elif name == 'col':
+                self.cols.append(self.make_col(
+                    elem.get('collapsed'),
+                    elem.get('hidden'),
+                    elem.get('min'),
+                    elem.get('max'),
+                    elem.get('style'),
+                ))
+            elif name == 'mergeCell':
+                self.merges.append(elem.get('ref'))
+
+            # release the memory for this element and anything before it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    def __read_row(self, elem):
+        ns = self.__ns
+        c_tag = ns + 'c'
+        v_tag = ns + 'v'
+        is_tag = ns + 'is'
+        t_tag = ns + 't'
+        col_nums = self.__col_nums
+        positional = self.__positional
+        columns = self.columns
+        read_value = self.__read_value
+
+        # The row number is optional, so count if it's missing
+        row_num = elem.get('r')
+        self.__row_num = self.__row_num + 1 if row_num is None else int(row_num)
+        if self.__row_num < self.min_row:
+            return
+
+        dense = self.dense
+        row = [] if dense else {}
+        col_num = -1
+        for c in elem:
+            if c.tag != c_tag:
+                continue
+
+            ref = None if positional else c.get('r')
+            if ref is None:
+                col_num = len(row) if dense else col_num + 1
+            else:
+                col_num = col_nums.get(ref.rstrip(DIGITS))
+                if col_num is None:
+                    col_num = parse_cell_ref(ref)[1]
+
+            if not dense:
+                # skip cells outside the projection
+                if columns is None or col_num in columns:
+                    row[col_num] = read_value(c, v_tag, is_tag, t_tag)
+                continue
+
+            # Are there blank cells preceeding this one?
+            if col_num > len(row):
+                row.extend([''] * (col_num - len(row)))
+            row.append(read_value(c, v_tag, is_tag, t_tag))
+
+        self.rows.append((self.__row_num, row,))
+
+    def __read_value(self, c, v_tag, is_tag, t_tag):
+        """ Read the value of a single <c> element """
+        text = None
+        for child in c:
+            if child.tag == v_tag:
+                text = child.text
+            elif child.tag == is_tag:
+                text = ''.join(t.text or '' for t in child.iter(t_tag))
+        if not text:
+            return ''
+        style = c.get('s')
+        return self.make_value(c.get('t'), None if style is None else int(style), text)
+
+
+ENGINES = {
+    SAXSheetEngine.name: SAXSheetEngine,
+    ExpatSheetEngine.name: ExpatSheetEngine,
+    LxmlSheetEngine.name: LxmlSheetEngine,
+}
+""" Registry of sheet engines by name """
+
+AUTO_ENGINE = "auto"
+""" Pseudo-engine name for the fastest engine available """
+
+PREFERRED_ENGINES = (ExpatSheetEngine.name, LxmlSheetEngine.name,)
+""" Engines to try for "auto", fastest first (measured with benchmarks/engines.py) """
+
+def is_available(name):
+    """ Test whether an engine's optional dependencies are installed """
+    if name == LxmlSheetEngine.name:
+        return lxml is not None
+    return name in ENGINES
+
+def available_engines():
+    """ Return a list of the names of engines that can run here """
+    return [name for name in ENGINES if is_available(name)]
+
+def get_engine(name):
+    """ Look up a sheet engine class by name
+
+    If the engine requires a package that is not installed, falls
+    back to the fastest engine that is available (expat), logging a
+    warning.
+
+    Parameters:
+      name(str): the engine name, or None or "auto" for the fastest available
+
+    Return:
+      A subclass of SheetEngine
+
+    @raises ValueError: if there is no engine with that name
+
+    """
+    if name is None or name == AUTO_ENGINE:
+        name = next(name for name in PREFERRED_ENGINES if is_available(name))
+    elif name not in ENGINES:
+        raise ValueError("Unknown sheet parser engine: {}".format(name))
+    elif not is_available(name):
+        fallback = next(name for name in PREFERRED_ENGINES if is_available(name))
+        logger.warning("Engine %s is not available; falling back to %s", name, fallback)
+        name = fallback
+    return ENGINES[name]
@@ -0,0 +1,222 @@
+""" Random access to the rows of a sheet through a row offset index
+
+A RowIndex records where each <row> element starts in the
+decompressed XML of a sheet, so that Sheet.row() and Sheet.cell() can
+decompress and parse a single row instead of the whole sheet. It is
+built in one pass (see Sheet.build_index), and saved in a sidecar file
+next to the workbook, keyed by the CRC and sizes of the sheet's
+archive member, so that it is rebuilt automatically if the sheet
+changes.
+
+Reading a row seeks in the sheet's archive member, so it is fast only
+if the workbook archive is an xlsxr.inflate.SeekableZipFile, which
+resumes decompressing from the nearest checkpoint before the row
+instead of from the start of the sheet. Building the index reads the
+whole member once, so it also leaves a full set of checkpoints. A
+process that loads a saved index gets checkpoints during its first
+lookups instead, since they can't be saved.
+
+Index file layout: MAGIC, a 4-byte little-endian header length, a
+JSON header, the head of the sheet XML (everything before the first
+row), then the row numbers and row offsets as arrays of 8-byte
+integers.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import bisect, json, logging, os, re, struct, sys, xlsxr.engines, xlsxr.parallel
+
+from array import array
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'XLSXRIX1'
+""" First bytes of an index file (the last one is the format version) """
+
+ROW_START_PATTERN = re.compile(rb'<(?:[\w.-]+:)?row(?=[\s/>])([^>]*)>')
+""" Regular expression for a <row> start tag, capturing its attributes """
+
+ROW_NUM_PATTERN = re.compile(rb'\sr\s*=\s*["\'](\d+)')
+""" Regular expression for the row number in the attributes of a <row> """
+
+SHEET_DATA_END_PATTERN = re.compile(rb'</(?:[\w.-]+:)?sheetData\s*>|<(?:[\w.-]+:)?sheetData\s*/>')
+""" Regular expression for the end of the rows """
+
+MERGE_CELL_PATTERN = re.compile(rb'<(?:[\w.-]+:)?mergeCell\b[^>]*?\sref="([^"]+)"')
+""" Regular expression for a merge """
+
+
+class RowIndex:
+    """ Offsets of the rows in a sheet's decompressed XML """
+
+    def __init__(self, member, crc, compress_size, file_size, head, tail, row_nums, offsets, end, merges):
+        """ Set up an index (use RowIndex.build or RowIndex.load instead)
+
+        @param member: the name of the sheet's archive member
+        @param crc: the CRC-32 of the member, from the zip directory
+        @param compress_size: the compressed size of the member
+        @param file_size: the decompressed size of the member
+        @param head: the XML before the first row (bytes)
+        @param tail: end tags to close the elements enclosing the rows (bytes)
+        @param row_nums: array of the 1-based row numbers, in order
+        @param offsets: array of the offsets of the row start tags, in the decompressed XML
+        @param end: the offset of the end of the last row
+        @param merges: list of the merges in the sheet, e.g. "A1:C3"
+
+        """
+        self.member = member
+        self.crc = crc
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self.head = head
+        self.tail = tail
+        self.row_nums = row_nums
+        self.offsets = offsets
+        self.end = end
+        self.merges = merges
+
+    def __len__(self):
+        return len(self.row_nums)
+
+    @property
+    def max_row(self):
+        """ The 1-based number of the last row in the sheet (0 if it has none) """
+        return self.row_nums[-1] if self.row_nums else 0
+
+    def matches(self, info):
+        """ True if the index is for this version of the archive member (a zipfile.ZipInfo) """
+        return (self.member, self.crc, self.compress_size, self.file_size,) == \
+            (info.filename, info.CRC, info.compress_size, info.file_size,)
+
+    def find(self, row_num):
+        """ Return the (start, end) offsets of a row in the decompressed XML, or None if it has no <row> """
+        i = bisect.bisect_left(self.row_nums, row_num)
+        if i == len(self.row_nums) or self.row_nums[i] != row_num:
+            return None
+        return self.offsets[i], self.offsets[i + 1] if i + 1 < len(self.offsets) else self.end
+
+    def read(self, archive, start, end):
+        """ Return the bytes from start to end of the decompressed XML (see xlsxr.inflate) """
+        with archive.open(self.member, "r") as stream:
+            stream.seek(start)
+            return stream.read(end - start)
+
+    @classmethod
+    def build(cls, archive, member):
+        """ Build the index for a sheet in one pass through its XML
+
+        Parameters:
+          archive(zipfile.ZipFile): the workbook archive
+          member(str): the name of the sheet's archive member
+
+        @raises TypeError: if the sheet has no <worksheet> or <sheetData> element
+
+        """
+        info = archive.getinfo(member)
+        row_nums = array('q')
+        offsets = array('q')
+        merges = []
+        head = None
+        end = None
+        last_row_num = 0
+
+        buffer = b''
+        buffer_start = 0 # offset of buffer[0] in the XML
+        with archive.open(member, "r") as stream:
+            while True:
+                data = stream.read(xlsxr.engines.CHUNK_SIZE)
+                if not data:
+                    break
+                buffer += data
+                pos = 0
+                if end is None:
+                    for match in ROW_START_PATTERN.finditer(buffer):
+                        number = ROW_NUM_PATTERN.search(match.group(1))
+                        last_row_num = int(number.group(1)) if number else last_row_num + 1
+                        row_nums.append(last_row_num)
+                        offsets.append(buffer_start + match.start())
+                        if head is None:
+                            head = buffer[:match.start()]
+                        pos = match.end()
+                    match = SHEET_DATA_END_PATTERN.search(buffer, pos)
+                    if match is not None:
+                        end = buffer_start + match.start()
+                        if head is None:
+                            head = buffer[:match.start()]
+                        pos = match.end()
+                for match in MERGE_CELL_PATTERN.finditer(buffer, pos):
+                    merges.append(match.group(1).decode('utf-8'))
+                    pos = match.end()
+                # keep enough of the tail to catch a tag split across reads
+                keep = max(pos, len(buffer) - 1024)
+                if head is None:
+                    keep = 0 # still in the head of the document
+                buffer_start += keep
+                buffer = buffer[keep:]
+
+        if head is None or end is None:
+            raise TypeError("Sheet {} has no <sheetData> element".format(member))
+        names = [pattern.search(head) for pattern in xlsxr.parallel.CONTAINER_PATTERNS]
+        if None in names:
+            raise TypeError("Sheet {} has no <worksheet> or <sheetData> element".format(member))
+        tail = b''.join(b'</' + match.group(1) + b'>' for match in reversed(names))
+
+        logger.debug("Indexed %d rows in %s", len(row_nums), member)
+        return cls(member, info.CRC, info.compress_size, info.file_size, head, tail, row_nums, offsets, end, merges)
+
+    def save(self, path):
+        """ Save the index to a file """
+        header = json.dumps({
+            "member": self.member,
+            "crc": self.crc,
+            "compress_size": self.compress_size,
+            "file_size": self.file_size,
+            "head_size": len(self.head),
+            "tail": self.tail.decode('utf-8'),
+            "rows": len(self.row_nums),
+            "end": self.end,
+            "merges": self.merges,
+            "byteorder": sys.byteorder,
+        }).encode('utf-8')
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as output:
+            output.write(MAGIC)
+            output.write(struct.pack('<I', len(header)))
+            output.write(header)
+            output.write(self.head)
+            self.row_nums.tofile(output)
+            self.offsets.tofile(output)
+        os.replace(temp_path, path) # so that a reader never sees half an index
+        logger.debug("Saved the index for %s to %s", self.member, path)
+
+    @classmethod
+    def load(cls, path):
+        """ Load an index from a file
+
+        @raises ValueError: if the file is not an index
+        @raises OSError: if the file can't be read
+
+        """
+        with open(path, "rb") as input:
+            if input.read(len(MAGIC)) != MAGIC:
+                raise ValueError("Not an xlsxr index file: {}".format(path))
+            header = json.loads(input.read(struct.unpack('<I', input.read(4))[0]).decode('utf-8'))
+            head = input.read(header["head_size"])
+            row_nums = array('q')
+            offsets = array('q')
+            try:
+                row_nums.fromfile(input, header["rows"])
+                offsets.fromfile(input, header["rows"])
+            except EOFError:
+                raise ValueError("Truncated xlsxr index file: {}".format(path))
+        if header["byteorder"] != sys.byteorder:
+            row_nums.byteswap()
+            offsets.byteswap()
+        return cls(
+            header["member"], header["crc"], header["compress_size"], header["file_size"],
+            head, header["tail"].encode('utf-8'), row_nums, offsets, header["end"], header["merges"],
+        )
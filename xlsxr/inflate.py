@@ -0,0 +1,394 @@
+""" Seekable reading of deflated zip archive members, with decompressor checkpoints
+
+zipfile.ZipExtFile can seek in a deflated member only by decompressing
+it again from the start on every backward seek, so random access to a
+large sheet costs as much as reading the whole sheet. SeekableZipFile
+opens deflated and stored members as SeekableMember streams instead.
+
+While a member is read, every CHECKPOINT_INTERVAL bytes of
+decompressed data, its stream takes a checkpoint: a copy of the zlib
+decompressor (including its 32 KB dictionary window), along with the
+decompressed and compressed positions. The checkpoints belong to the
+archive, so every stream on the same member shares them. A seek (or
+reopening the member to read it again) resumes decompressing from the
+nearest checkpoint before the target, so it never decompresses more
+than CHECKPOINT_INTERVAL bytes of data that it doesn't return.
+
+Each checkpoint holds about 40 KB of decompressor state, or about 20
+MB for 1 GB of sheet XML with the default interval. Python can't save
+zlib state to a file, so the checkpoints last only as long as the
+archive object.
+
+An archive opened from a path is memory-mapped, so members are
+decompressed straight from the mapped file with no read calls and no
+copies of the compressed data, and a stored member's data can be
+used in place (see SeekableZipFile.getbuffer). Processes that map the
+same workbook, such as parallel workers (see xlsxr.parallel), share
+its pages in the operating system's page cache.
+
+Encrypted members and members with other compression methods open as
+ordinary zipfile.ZipExtFile streams.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import bisect, io, logging, mmap, os, struct, threading, zipfile, zlib
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_INTERVAL = 2 * 1024 * 1024
+""" Default number of bytes of decompressed data between checkpoints (0 for none) """
+
+READ_SIZE = 64 * 1024
+""" Number of compressed bytes to read from the archive at a time, and the most data to decompress at a time """
+
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+""" Layout of a zip local file header, ending with the lengths of the filename and extra field """
+
+
+class SeekableZipFile(zipfile.ZipFile):
+    """ A zip archive whose deflated and stored members open as SeekableMember streams
+
+    Otherwise the same as zipfile.ZipFile.
+
+    """
+
+    def __init__(self, file, mode="r", *args, checkpoint_interval=None, **kwargs):
+        """ Open a zip archive
+
+        If file is a path and mode is "r", the file is memory-mapped
+        (see SeekableZipFile.map).
+
+        Parameters:
+          file: path to the archive, or a seekable file-like object (byte stream)
+          mode(str): the mode, as for zipfile.ZipFile
+          checkpoint_interval(int): bytes of decompressed data between checkpoints (default CHECKPOINT_INTERVAL)
+
+        Other arguments are passed to zipfile.ZipFile.
+
+        """
+        self.map = None
+        """ A read-only mmap.mmap of the archive file, or None if it isn't mapped """
+        self.__file = None
+        if mode == "r" and isinstance(file, (str, os.PathLike,)):
+            file = self.__file = open(file, "rb")
+            try:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                # e.g. an empty file, or a file system that can't map files
+                logger.debug("Can't map %s, so reading it instead: %s", file.name, e)
+        try:
+            super().__init__(file, mode, *args, **kwargs)
+        except BaseException:
+            self.close()
+            raise
+        self.checkpoint_interval = CHECKPOINT_INTERVAL if checkpoint_interval is None else checkpoint_interval
+        self.__checkpoints = {}
+
+    def open(self, name, mode="r", pwd=None, **kwargs):
+        """ Open a member, as a SeekableMember if possible, or else as for zipfile.ZipFile """
+        if mode == "r" and self.fp is not None:
+            info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+            if info.compress_type in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED,) and not info.flag_bits & 0x1:
+                return SeekableMember(self, info, self.checkpoints(info))
+        return super().open(name, mode, pwd, **kwargs)
+
+    def checkpoints(self, info):
+        """ Return the Checkpoints for a member (a zipfile.ZipInfo), creating them the first time """
+        checkpoints = self.__checkpoints.get(info.filename)
+        if checkpoints is None:
+            checkpoints = Checkpoints(info, self.__data_offset(info), self.checkpoint_interval)
+            self.__checkpoints[info.filename] = checkpoints
+        return checkpoints
+
+    def getbuffer(self, name):
+        """ Return a stored (uncompressed) member's data as a read-only memoryview of the mapped file, without copying
+
+        Release the view (or let it go) before closing the archive.
+
+        @raises ValueError: if the archive isn't mapped, or the member is compressed or encrypted
+
+        """
+        info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+        if self.map is None:
+            raise ValueError("Archive is not memory-mapped")
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            raise ValueError("Member {} is compressed or encrypted".format(info.filename))
+        offset = self.checkpoints(info).data_offset
+        return memoryview(self.map)[offset:offset + info.file_size]
+
+    def close(self):
+        """ Close the archive, and unmap and close the file if it opened one """
+        super().close()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # a member or buffer is still open, so it will be unmapped when that goes
+                logger.debug("Archive closed while members are still open")
+            self.map = None
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __data_offset(self, info):
+        """ Return the offset of a member's data in the archive, after its local header """
+        if self.map is not None:
+            fields = LOCAL_HEADER.unpack_from(self.map, info.header_offset)
+        else:
+            with self._lock:
+                self.fp.seek(info.header_offset)
+                fields = LOCAL_HEADER.unpack(self.fp.read(LOCAL_HEADER.size))
+        if fields[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile("Bad local file header for {}".format(info.filename))
+        return info.header_offset + LOCAL_HEADER.size + fields[-2] + fields[-1]
+
+
+class Checkpoints:
+    """ Decompressor checkpoints for one archive member, in order of position
+
+    Safe to share between threads (e.g. the lanes of xlsxr.aio, or
+    threads calling Sheet.row() on one workbook): find() and add() take
+    turns under a lock, so a lookup never sees a position without its
+    decompressor.
+
+    """
+
+    def __init__(self, info, data_offset, interval):
+        """ Set up the checkpoints for a member, starting with one at position 0
+
+        Parameters:
+          info(zipfile.ZipInfo): the member
+          data_offset(int): the offset of the member's data in the archive
+          interval(int): bytes of decompressed data between checkpoints (0 for none)
+
+        """
+        self.info = info
+        self.data_offset = data_offset
+        self.interval = interval
+        self.positions = [0]
+        """ The decompressed position of each checkpoint """
+        self.states = [(0, zlib.decompressobj(-zlib.MAX_WBITS) if info.compress_type == zipfile.ZIP_DEFLATED else None,)]
+        """ The compressed position and decompressor for each checkpoint """
+        self.verified = False
+        """ True once the member's CRC has been checked """
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def find(self, position):
+        """ Return (position, compressed position, decompressor) for the last checkpoint at or before a position
+
+        The decompressor is a copy, so the caller can use it.
+
+        """
+        with self._lock:
+            i = bisect.bisect_right(self.positions, position) - 1
+            compressed_position, decompressor = self.states[i]
+            return self.positions[i], compressed_position, decompressor.copy()
+
+    def add(self, position, compressed_position, decompressor):
+        """ Add a copy of the decompressor as a checkpoint, if it's far enough past the last one """
+        if self.interval > 0:
+            with self._lock:
+                if position - self.positions[-1] >= self.interval:
+                    self.positions.append(position)
+                    self.states.append((compressed_position, decompressor.copy(),))
+
+
+class SeekableMember(io.BufferedIOBase):
+    """ A read-only stream over a deflated or stored archive member, with fast seeks
+
+    Use SeekableZipFile.open() rather than creating one directly.
+
+    """
+
+    def __init__(self, archive, info, checkpoints):
+        """ Open a member for reading
+
+        Parameters:
+          archive(SeekableZipFile): the archive
+          info(zipfile.ZipInfo): the member
+          checkpoints(Checkpoints): the member's checkpoints, shared with other streams
+
+        """
+        super().__init__()
+        self.name = info.filename
+        self.__fp = archive.fp
+        self.__lock = archive._lock
+        self.__view = memoryview(archive.map) if archive.map is not None else None
+        self.__info = info
+        self.__checkpoints = checkpoints
+        self.__buffer = b''
+        self.__buffer_start = 0 # decompressed position of buffer[0]
+        self.__offset = 0 # position of the next byte to return, in the buffer
+        self.__decompressor = checkpoints.states[0][1]
+        if self.__decompressor is not None:
+            self.__decompressor = self.__decompressor.copy()
+        self.__compressed_position = 0 # compressed bytes read from the archive
+        self.__unconsumed = b'' # compressed bytes read but not yet decompressed
+        self.__crc = 0
+        self.__crc_position = 0 # decompressed bytes covered by the CRC so far
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self.__check_open()
+        return self.__buffer_start + self.__offset
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """ Move to a new position, resuming from the nearest checkpoint if needed """
+        self.__check_open()
+        if whence == io.SEEK_SET:
+            target = offset
+        elif whence == io.SEEK_CUR:
+            target = self.tell() + offset
+        elif whence == io.SEEK_END:
+            target = self.__info.file_size + offset
+        else:
+            raise ValueError("Invalid whence ({}, should be 0, 1, or 2)".format(whence))
+        if target < 0:
+            raise ValueError("Negative seek position {}".format(target))
+        target = min(target, self.__info.file_size)
+
+        buffer_end = self.__buffer_start + len(self.__buffer)
+        if self.__buffer_start <= target <= buffer_end:
+            self.__offset = target - self.__buffer_start
+            return target
+
+        if self.__decompressor is None:
+            # stored, so go straight there
+            self.__restart(target, target, None)
+            return target
+
+        # resume from a checkpoint if we're going backwards, or if one is closer
+        checkpoint = self.__checkpoints.find(target)
+        if target < buffer_end or checkpoint[0] > buffer_end:
+            self.__restart(*checkpoint)
+        while self.__buffer_start + len(self.__buffer) < target:
+            if not self.__fill():
+                break
+        self.__offset = min(target - self.__buffer_start, len(self.__buffer))
+        return self.tell()
+
+    def read(self, size=-1):
+        """ Read and return up to size bytes (or the rest of the member, if size is negative or None) """
+        self.__check_open()
+        if size is None or size < 0:
+            size = self.__info.file_size
+        result = []
+        while size > 0:
+            if self.__offset >= len(self.__buffer) and not self.__fill():
+                break
+            data = self.__buffer[self.__offset:self.__offset + size]
+            self.__offset += len(data)
+            size -= len(data)
+            result.append(data)
+        return b''.join(result)
+
+    def read1(self, size=-1):
+        """ Read and return up to size bytes, with at most one read from the archive """
+        self.__check_open()
+        if self.__offset >= len(self.__buffer):
+            self.__fill()
+        if size is None or size < 0:
+            size = len(self.__buffer)
+        data = self.__buffer[self.__offset:self.__offset + size]
+        self.__offset += len(data)
+        return data
+
+    def peek(self, size=0):
+        """ Return the buffered bytes at the current position, without moving """
+        self.__check_open()
+        if self.__offset >= len(self.__buffer):
+            self.__fill()
+        return self.__buffer[self.__offset:]
+
+    def close(self):
+        self.__buffer = b''
+        self.__decompressor = None
+        if self.__view is not None:
+            self.__view.release()
+            self.__view = None
+        super().close()
+
+    def __check_open(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+    def __restart(self, position, compressed_position, decompressor):
+        """ Continue decompressing from a new position, with an empty buffer """
+        self.__buffer = b''
+        self.__buffer_start = position
+        self.__offset = 0
+        self.__compressed_position = compressed_position
+        self.__unconsumed = b''
+        if decompressor is not None:
+            self.__decompressor = decompressor
+
+    def __fill(self):
+        """ Replace the buffer with the next piece of data, and return False at the end of the member """
+        info = self.__info
+        checkpoints = self.__checkpoints
+        decompressor = self.__decompressor
+        position = self.__buffer_start + len(self.__buffer)
+        data = b''
+        while not data:
+            remaining = info.compress_size - self.__compressed_position
+            if (remaining <= 0 and not self.__unconsumed) or (decompressor is not None and decompressor.eof):
+                if self.__crc_position == position < info.file_size:
+                    raise zipfile.BadZipFile("Member {} is shorter than its recorded size".format(info.filename))
+                return False
+            if self.__unconsumed:
+                compressed = self.__unconsumed
+            else:
+                size = min(READ_SIZE, remaining)
+                compressed = self.__read_compressed(checkpoints.data_offset + self.__compressed_position, size)
+                if len(compressed) < size:
+                    raise zipfile.BadZipFile("Truncated member {}".format(info.filename))
+                self.__compressed_position += size
+            if decompressor is None:
+                data, self.__unconsumed = bytes(compressed), b''
+            else:
+                # limit the output, so that checkpoints can be close together
+                data = decompressor.decompress(compressed, READ_SIZE)
+                self.__unconsumed = decompressor.unconsumed_tail
+                checkpoints.add(
+                    position + len(data), self.__compressed_position - len(self.__unconsumed), decompressor
+                )
+            if isinstance(compressed, memoryview):
+                compressed.release()
+
+        self.__buffer = data
+        self.__buffer_start = position
+        self.__offset = 0
+        self.__update_crc(position, data)
+        return True
+
+    def __read_compressed(self, offset, size):
+        """ Return size bytes of the archive from offset, as a memoryview of the mapped file if possible """
+        if self.__view is not None:
+            return self.__view[offset:offset + size]
+        with self.__lock:
+            self.__fp.seek(offset)
+            return self.__fp.read(size)
+
+    def __update_crc(self, position, data):
+        """ Extend the CRC with any new data contiguous with what it covers, and check it at the end """
+        end = position + len(data)
+        if position <= self.__crc_position < end:
+            self.__crc = zlib.crc32(data[self.__crc_position - position:], self.__crc)
+            self.__crc_position = end
+            if end == self.__info.file_size and not self.__checkpoints.verified:
+                if self.__crc != self.__info.CRC:
+                    raise zipfile.BadZipFile("Bad CRC-32 for file {!r}".format(self.name))
+                self.__checkpoints.verified = True
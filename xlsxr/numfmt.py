@@ -0,0 +1,808 @@
+""" Excel number formats
+
+Compiles Excel number-format codes, like "#,##0.00;[Red](#,##0.00)"
+or "d-mmm-yy h:mm", into NumberFormat objects that render numbers the
+way Excel displays them. Each code is tokenized and compiled once,
+and compiled formats are cached by code (see compile_format), so
+rendering a cell costs a single call into the compiled section.
+
+Supported: up to four sections (positive; negative; zero; text),
+conditions like [>=100], colours like [Red] or [Color10], literal
+text, padding (_x), General, digit placeholders (0 # ?), decimal
+places, thousands separators and scaling, percentages, scientific
+notation, fractions, dates and times (including AM/PM, fractions of
+a second, and elapsed times like [h]:mm:ss), and currency tags like
+[$€-407]. Fill characters (*x) are ignored, because there is no
+column width to fill. Month and day names are in English.
+
+Serial day numbers follow the workbook's date system: in the 1900
+system, day 1 is 1900-01-01 and day 60 is Excel's imaginary
+1900-02-29; in the 1904 system, day 0 is 1904-01-01.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import decimal, functools, math, re
+
+from datetime import date, datetime, timedelta
+from fractions import Fraction
+
+BUILTIN_FORMATS = {
+    0: 'General',
+    1: '0',
+    2: '0.00',
+    3: '#,##0',
+    4: '#,##0.00',
+    5: '"$"#,##0_);("$"#,##0)',
+    6: '"$"#,##0_);[Red]("$"#,##0)',
+    7: '"$"#,##0.00_);("$"#,##0.00)',
+    8: '"$"#,##0.00_);[Red]("$"#,##0.00)',
+    9: '0%',
+    10: '0.00%',
+    11: '0.00E+00',
+    12: '# ?/?',
+    13: '# ??/??',
+    14: 'm/d/yyyy',
+    15: 'd-mmm-yy',
+    16: 'd-mmm',
+    17: 'mmm-yy',
+    18: 'h:mm AM/PM',
+    19: 'h:mm:ss AM/PM',
+    20: 'h:mm',
+    21: 'h:mm:ss',
+    22: 'm/d/yyyy h:mm',
+    37: '#,##0_);(#,##0)',
+    38: '#,##0_);[Red](#,##0)',
+    39: '#,##0.00_);(#,##0.00)',
+    40: '#,##0.00_);[Red](#,##0.00)',
+    41: '_(* #,##0_);_(* \\(#,##0\\);_(* "-"_);_(@_)',
+    42: '_("$"* #,##0_);_("$"* \\(#,##0\\);_("$"* "-"_);_(@_)',
+    43: '_(* #,##0.00_);_(* \\(#,##0.00\\);_(* "-"??_);_(@_)',
+    44: '_("$"* #,##0.00_);_("$"* \\(#,##0.00\\);_("$"* "-"??_);_(@_)',
+    45: 'mm:ss',
+    46: '[h]:mm:ss',
+    47: 'mm:ss.0',
+    48: '##0.0E+0',
+    49: '@',
+}
+""" Format codes for the built-in numFmtIds, which never appear in styles.xml (en-US versions) """
+
+MONTH_NAMES = (
+    'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December',
+)
+
+DAY_NAMES = ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday',)
+
+COLORS = ('black', 'blue', 'cyan', 'green', 'magenta', 'red', 'white', 'yellow',)
+""" Colour names allowed in square brackets (as well as [ColorN]) """
+
+EPOCH_1900 = datetime(1899, 12, 30)
+""" The date for serial day number 0 in the 1900 date system, counting back from 1900-03-01 """
+
+EPOCH_1904 = datetime(1904, 1, 1)
+""" The date for serial day number 0 in the 1904 date system """
+
+_ORDINAL_1900 = EPOCH_1900.toordinal()
+_ORDINAL_1904 = EPOCH_1904.toordinal()
+
+CONDITION_PATTERN = re.compile(r'(<=|>=|<>|<|>|=)\s*(-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)$')
+""" Regular expression for a condition in square brackets, like [>=100] """
+
+COLOR_PATTERN = re.compile(r'color\s*\d+$', re.IGNORECASE)
+""" Regular expression for a numbered colour in square brackets, like [Color10] """
+
+ELAPSED_PATTERN = re.compile(r'(h+|m+|s+)$', re.IGNORECASE)
+""" Regular expression for an elapsed-time unit in square brackets, like [h] or [mm] """
+
+DATE_KINDS = frozenset(('y', 'm', 'd', 'h', 's', 'ampm', 'elapsed',))
+""" Kinds of token that make a section a date/time section """
+
+_DECIMAL_CONTEXT = decimal.Context(prec=400, rounding=decimal.ROUND_HALF_UP)
+""" Decimal context for rounding the way Excel does (half away from zero), with room for any double """
+
+_QUANTUMS = [decimal.Decimal(1).scaleb(-places) for places in range(31)]
+""" Quantums for rounding to 0-30 decimal places """
+
+_PADDING = {'0': '0', '?': ' ', '#': ''}
+""" What each digit placeholder shows when there's no digit for it """
+
+
+def get_format_code(num_fmt_id, number_formats=None):
+    """ Return the format code for a numFmtId
+
+    Parameters:
+      num_fmt_id(str): the numFmtId attribute (a string of digits), or None
+      number_formats(dict): the workbook's own format codes, by numFmtId
+
+    Return:
+      The custom or built-in format code, or "General" if it's unknown
+
+    """
+    if number_formats and num_fmt_id in number_formats:
+        return number_formats[num_fmt_id]
+    try:
+        return BUILTIN_FORMATS.get(int(num_fmt_id), 'General')
+    except (TypeError, ValueError):
+        return 'General'
+
+@functools.lru_cache(maxsize=None)
+def compile_format(code):
+    """ Return the compiled NumberFormat for a format code, compiling it only once """
+    return NumberFormat(code)
+
+def from_excel(serial, date1904=False):
+    """ Convert an Excel serial day number to a datetime.datetime, to the nearest millisecond
+
+    Serial numbers before 1900-03-01 allow for Excel's imaginary
+    1900-02-29 (which becomes 1900-02-28).
+
+    Parameters:
+      serial(float): the serial day number, with the time as a fraction of a day
+      date1904(bool): if True, use the 1904 date system
+
+    @raises OverflowError: if the date is out of range for Python
+
+    """
+    days = math.floor(serial)
+    milliseconds = round((serial - days) * 86400000)
+    ordinal = (_ORDINAL_1904 if date1904 else _ORDINAL_1900 + (1 if days < 60 else 0)) + days
+    if milliseconds == 0:
+        return datetime.fromordinal(ordinal)
+    return datetime.fromordinal(ordinal) + timedelta(milliseconds=milliseconds)
+
+def date_from_excel(serial, date1904=False):
+    """ Convert an Excel serial day number to a datetime.date, ignoring the time (see from_excel) """
+    days = math.floor(serial)
+    return date.fromordinal((_ORDINAL_1904 if date1904 else _ORDINAL_1900 + (1 if days < 60 else 0)) + days)
+
+def format_general(value):
+    """ Render a number the way Excel's General format does (at most 11 characters, with 5-digit scientific notation) """
+    if value < 0:
+        return '-' + format_general(-value)
+    elif value == 0:
+        return '0'
+    elif value < 1e11 and value == int(value):
+        return str(int(value))
+    exponent = math.floor(math.log10(value))
+    if -5 < exponent < 10:
+        s = '%.*f' % (9 - max(exponent, 0), value)
+    elif exponent == 10:
+        return '%.0f' % value
+    else:
+        mantissa, exponent = ('%.5E' % value).split('E')
+        return mantissa.rstrip('0').rstrip('.') + 'E' + exponent
+    if '.' in s:
+        s = s.rstrip('0').rstrip('.')
+    return s
+
+def _round(value, places):
+    """ Round a non-negative number to a string with a fixed number of decimal places, half away from zero
+
+    Rounds to 15 significant digits first, as Excel does, so that 2.675
+    becomes 2.68 even though the nearest double is a little below it.
+
+    """
+    s = '%.15g' % value
+    if 'e' not in s:
+        point = s.find('.')
+        decimals = 0 if point < 0 else len(s) - point - 1
+        if decimals <= places:
+            # no rounding needed: just pad with zeros
+            if decimals == places:
+                return s
+            return (s if point >= 0 else s + '.') + '0' * (places - decimals)
+        elif decimals > places + 1 or s[-1] != '5':
+            # not a tie, so the double rounds the same way as its 15 digits
+            return '%.*f' % (places, value)
+    return '{:f}'.format(_DECIMAL_CONTEXT.quantize(decimal.Decimal(s), _QUANTUMS[places]))
+
+def _fill_int(items, digits, grouping):
+    """ Fill the integer placeholders and literals of a number section, right to left
+
+    The leftmost placeholder gets all of the extra digits.
+
+    """
+    out = [] # pieces in reverse order
+    left = sum(1 for kind, value in items if kind == 'digit')
+    end = len(digits)
+    written = 0
+    if left == 0:
+        out.append(digits)
+    for kind, value in reversed(items):
+        if kind != 'digit':
+            out.append(value)
+            continue
+        left -= 1
+        if left == 0:
+            chunk, end = digits[:end], 0
+        elif end > 0:
+            chunk, end = digits[end - 1], end - 1
+        else:
+            chunk = ''
+        if not chunk:
+            chunk = _PADDING[value]
+        if grouping and chunk != ' ':
+            for c in reversed(chunk):
+                if written and written % 3 == 0:
+                    out.append(',')
+                out.append(c)
+                written += 1
+        else:
+            out.append(chunk)
+    return ''.join(reversed(out))
+
+def _fill_frac(items, digits):
+    """ Fill the placeholders and literals after the decimal point, left to right, dropping trailing zeros for # and ? """
+    out = []
+    last = len(digits.rstrip('0'))
+    i = 0
+    for kind, value in items:
+        if kind != 'digit':
+            out.append(value)
+            continue
+        out.append(digits[i] if i < last else _PADDING[value])
+        i += 1
+    return ''.join(out)
+
+def _items(tokens):
+    """ Reduce tokens to digit placeholders and literal strings, for filling """
+    items = []
+    for kind, value in tokens:
+        if kind == 'digit':
+            items.append((kind, value))
+        elif kind == 'lit':
+            items.append(('lit', value))
+        elif kind not in ('comma', 'percent', 'general', 'text',):
+            items.append(('lit', value if isinstance(value, str) else ''))
+        elif kind == 'percent':
+            items.append(('lit', '%'))
+    return items
+
+def _tokenize(code):
+    """ Split a format code into sections, each a list of (kind, value) tokens """
+    sections = [[]]
+    tokens = sections[0]
+    i = 0
+    n = len(code)
+    while i < n:
+        c = code[i]
+        if c == ';':
+            tokens = []
+            sections.append(tokens)
+            i += 1
+        elif c == '"':
+            end = code.find('"', i + 1)
+            end = n if end < 0 else end
+            tokens.append(('lit', code[i + 1:end]))
+            i = end + 1
+        elif c == '\\':
+            tokens.append(('lit', code[i + 1:i + 2]))
+            i += 2
+        elif c == '_':
+            tokens.append(('lit', ' ')) # space the width of the next character
+            i += 2
+        elif c == '*':
+            i += 2 # repeat the next character to fill the column
+        elif c == '[':
+            end = code.find(']', i + 1)
+            end = n if end < 0 else end
+            tokens.append(_bracket(code[i + 1:end]))
+            i = end + 1
+        elif code[i:i + 7].lower() == 'general':
+            tokens.append(('general', None))
+            i += 7
+        elif c in '0#?':
+            tokens.append(('digit', c))
+            i += 1
+        elif c in '.,%@/':
+            tokens.append(({'.': 'point', ',': 'comma', '%': 'percent', '@': 'text', '/': 'slash'}[c], c))
+            i += 1
+        elif c in 'Ee' and code[i + 1:i + 2] in ('+', '-',) and i + 1 < n:
+            tokens.append(('exp', code[i + 1]))
+            i += 2
+        elif code[i:i + 5].upper() == 'AM/PM':
+            tokens.append(('ampm', code[i:i + 5]))
+            i += 5
+        elif code[i:i + 3].upper() == 'A/P':
+            tokens.append(('ampm', code[i:i + 3]))
+            i += 3
+        elif c.lower() in 'ymdhs':
+            end = i + 1
+            while end < n and code[end].lower() == c.lower():
+                end += 1
+            tokens.append((c.lower(), end - i))
+            i = end
+        else:
+            tokens.append(('lit', c))
+            i += 1
+    return sections
+
+def _bracket(content):
+    """ Return the token for the contents of square brackets """
+    lower = content.lower()
+    if lower in COLORS or COLOR_PATTERN.match(lower):
+        return ('color', content)
+    elif content.startswith('$'):
+        return ('lit', content[1:].split('-')[0]) # currency symbol and locale, like [$€-407]
+    match = CONDITION_PATTERN.match(content.strip())
+    if match:
+        return ('condition', (match.group(1), float(match.group(2)),))
+    match = ELAPSED_PATTERN.match(content)
+    if match:
+        return ('elapsed', (lower[0], len(content),))
+    return ('lit', '') # other tags, like [DBNum1]
+
+def _test(condition, value):
+    op, operand = condition
+    if op == '<':
+        return value < operand
+    elif op == '<=':
+        return value <= operand
+    elif op == '>':
+        return value > operand
+    elif op == '>=':
+        return value >= operand
+    elif op == '=':
+        return value == operand
+    else:
+        return value != operand
+
+
+class Section:
+    """ One compiled section of a number format
+
+    Call render(value, date1904) to format a number. Negative values
+    get a minus sign, so a number format passes the absolute value
+    to its negative section.
+
+    """
+
+    def __init__(self, tokens):
+        self.color = None
+        """ The colour name, like "Red" or "Color10", or None """
+        self.condition = None
+        """ A tuple of the comparison and number, like (">=", 100.0), or None """
+
+        body = []
+        for kind, value in tokens:
+            if kind == 'color':
+                self.color = value
+            elif kind == 'condition':
+                self.condition = value
+            else:
+                body.append((kind, value))
+
+        kinds = {kind for kind, value in body}
+        self.is_text = 'text' in kinds
+        self.is_date = bool(kinds & DATE_KINDS)
+        self.has_date = False
+        self.has_time = False
+
+        if self.is_date:
+            self.render = self.__compile_date(body)
+        elif 'general' in kinds:
+            self.render = self.__compile_general(body)
+        elif 'exp' in kinds:
+            self.render = self.__compile_scientific(body)
+        elif 'slash' in kinds and 'digit' in kinds:
+            self.render = self.__compile_fraction(body)
+        elif 'digit' in kinds or 'point' in kinds:
+            self.render = self.__compile_number(body)
+        else:
+            text = ''.join(value for kind, value in _items(body) if kind == 'lit')
+            self.render = lambda value, date1904=False: text
+
+        self.__text_items = [(kind, value) for kind, value in body if kind in ('lit', 'text',)]
+
+    def render_text(self, text):
+        """ Format a string in a text section (replacing each @) """
+        return ''.join(text if kind == 'text' else value for kind, value in self.__text_items)
+
+    def __compile_general(self, tokens):
+        before = []
+        after = []
+        for kind, value in tokens:
+            if kind == 'general':
+                before, after = after, before
+            elif kind == 'lit':
+                after.append(value)
+        prefix = ''.join(before)
+        suffix = ''.join(after)
+        if not prefix and not suffix:
+            return lambda value, date1904=False: format_general(value)
+        return lambda value, date1904=False: prefix + format_general(value) + suffix
+
+    def __split_number(self, tokens):
+        """ Split number tokens at the decimal point, and work out the grouping, scaling, and percentages """
+        percent = sum(1 for kind, value in tokens if kind == 'percent')
+        point = next((i for i, (kind, value) in enumerate(tokens) if kind == 'point'), None)
+        int_tokens = tokens if point is None else tokens[:point]
+        frac_tokens = [] if point is None else tokens[point + 1:]
+
+        # commas after the last digit placeholder scale by 1000; commas between placeholders group thousands
+        last_digit = max((i for i, (kind, value) in enumerate(tokens) if kind == 'digit'), default=-1)
+        scale = 0
+        for kind, value in tokens[last_digit + 1:]:
+            if kind == 'comma':
+                scale += 1
+            elif kind != 'point':
+                break
+        digits_seen = False
+        grouping = False
+        for i, (kind, value) in enumerate(int_tokens):
+            if kind == 'digit':
+                digits_seen = True
+            elif kind == 'comma' and digits_seen and any(k == 'digit' for k, v in int_tokens[i + 1:]):
+                grouping = True
+
+        factor = (100 ** percent) / (1000 ** scale)
+        return _items(int_tokens), _items(frac_tokens), point is not None, grouping, factor
+
+    def __compile_number(self, tokens):
+        int_items, frac_items, has_point, grouping, factor = self.__split_number(tokens)
+        places = sum(1 for kind, value in frac_items if kind == 'digit')
+        simple = self.__compile_simple_number(int_items, frac_items, has_point, grouping, factor, places)
+        if simple is not None:
+            return simple
+
+        def render(value, date1904=False):
+            negative = value < 0
+            text = _round(abs(value) * factor, places)
+            if places:
+                int_digits, frac_digits = text.split('.')
+            else:
+                int_digits, frac_digits = text, ''
+            result = _fill_int(int_items, '' if int_digits == '0' else int_digits, grouping)
+            if has_point:
+                result += '.' + _fill_frac(frac_items, frac_digits)
+            if negative:
+                result = '-' + result
+            return result
+
+        return render
+
+    def __compile_simple_number(self, int_items, frac_items, has_point, grouping, factor, places):
+        """ Compile the usual kinds of number section (like "0.00", "#,##0", or "0%") without filling placeholders one at a time
+
+        Return:
+          The render function, or None if the section isn't simple
+          (literals between the placeholders, ?, or # after the point)
+
+        """
+        def split(items):
+            kinds = ''.join('d' if kind == 'digit' else 'l' for kind, value in items)
+            match = re.fullmatch(r'(l*)(d*)(l*)', kinds)
+            if match is None:
+                return None
+            start, end = match.end(1), match.end(2)
+            text = lambda part: ''.join(value for kind, value in part)
+            return text(items[:start]), text(items[start:end]), text(items[end:])
+
+        int_parts = split(int_items)
+        frac_parts = split(frac_items)
+        if int_parts is None or frac_parts is None:
+            return None
+        prefix, int_places, middle = int_parts
+        frac_prefix, frac_places, suffix = frac_parts
+        if not re.fullmatch(r'#*0*', int_places) or set(frac_places) - {'0'} or frac_prefix \
+           or (has_point and middle) or (grouping and len(int_places.lstrip('#')) > 1):
+            return None
+        zeros = len(int_places.lstrip('#'))
+        if not has_point:
+            suffix = middle
+
+        def render(value, date1904=False):
+            text = _round(abs(value) * factor, places)
+            if places:
+                int_digits, frac_digits = text[:-places - 1], text[-places:]
+            else:
+                int_digits = text
+            if int_digits == '0' and zeros == 0:
+                int_digits = ''
+            elif len(int_digits) < zeros:
+                int_digits = int_digits.zfill(zeros)
+            elif grouping and len(int_digits) > 3:
+                int_digits = '{:,}'.format(int(int_digits))
+            result = prefix + int_digits + ('.' + frac_digits if has_point else '') + suffix
+            if value < 0:
+                return '-' + result
+            return result
+
+        return render
+
+    def __compile_scientific(self, tokens):
+        exp = next(i for i, (kind, value) in enumerate(tokens) if kind == 'exp')
+        sign = tokens[exp][1]
+        int_items, frac_items, has_point, grouping, factor = self.__split_number(tokens[:exp])
+        exp_items = _items(tokens[exp + 1:])
+        int_places = [value for kind, value in int_items if kind == 'digit']
+        places = sum(1 for kind, value in frac_items if kind == 'digit')
+        step = len(int_places) if len(int_places) > 1 and '#' in int_places else 1
+        shift = 0 if step > 1 else max(len(int_places) - 1, 0)
+
+        def render(value, date1904=False):
+            negative = value < 0
+            value = abs(value) * factor
+            exponent = 0
+            if value:
+                exponent = math.floor(math.log10(value))
+                exponent = exponent - exponent % step if step > 1 else exponent - shift
+            text = _round(value / 10 ** exponent, places)
+            if value and float(text) >= 10 ** max(step, shift + 1):
+                # rounding carried into another digit
+                exponent += step
+                text = _round(value / 10 ** exponent, places)
+            int_digits, frac_digits = text.split('.') if places else (text, '')
+            result = _fill_int(int_items, '' if int_digits == '0' else int_digits, False)
+            if has_point:
+                result += '.' + _fill_frac(frac_items, frac_digits)
+            result += 'E' + ('-' if exponent < 0 else '+' if sign == '+' else '')
+            result += _fill_int(exp_items, str(abs(exponent)) if exponent else '', False)
+            return '-' + result if negative else result
+
+        return render
+
+    def __compile_fraction(self, tokens):
+        slash = next(i for i, (kind, value) in enumerate(tokens) if kind == 'slash')
+        start = slash
+        while start > 0 and tokens[start - 1][0] == 'digit':
+            start -= 1
+        numerator = [value for kind, value in tokens[start:slash]]
+        before = tokens[:start]
+        after = tokens[slash + 1:]
+
+        # the denominator is either placeholders or a fixed number
+        end = 0
+        while end < len(after) and (after[end][0] == 'digit' or (after[end][0] == 'lit' and after[end][1].isdigit())):
+            end += 1
+        denominator = ''.join(value for kind, value in after[:end])
+        suffix = ''.join(value for kind, value in _items(after[end:]) if kind == 'lit')
+        fixed = int(denominator) if denominator.isdigit() else None
+        den_places = len(denominator)
+
+        int_items = _items(before)
+        has_int = any(kind == 'digit' for kind, value in int_items)
+        # literals between the integer and the numerator (usually a space) are part of the fraction
+        split = max((i for i, (kind, value) in enumerate(int_items) if kind == 'digit'), default=-1) + 1
+        int_items, middle = int_items[:split], ''.join(value for kind, value in int_items[split:])
+        width = len(middle) + len(numerator) + 1 + den_places
+
+        def pad(digits, places, left):
+            out = digits
+            for place in places[len(digits):]:
+                out = _PADDING[place] + out if left else out + _PADDING[place]
+            return out
+
+        def render(value, date1904=False):
+            negative = value < 0
+            value = abs(value)
+            whole = math.floor(value) if has_int else 0
+            rest = value - whole
+            if fixed is not None:
+                num, den = round(rest * fixed), fixed
+            else:
+                fraction = Fraction(rest).limit_denominator(10 ** den_places - 1)
+                num, den = fraction.numerator, fraction.denominator
+            if has_int and num == den:
+                whole, num = whole + 1, 0
+
+            if has_int and num == 0:
+                result = _fill_int(int_items, str(whole), False) + ' ' * width
+            else:
+                result = _fill_int(int_items, str(whole) if whole else '', False) if has_int else ''
+                result += middle + pad(str(num), numerator, True) + '/'
+                result += str(den) if fixed is not None else pad(str(den), ['?'] * den_places, False)
+            result += suffix
+            return '-' + result if negative and (whole or num) else result
+
+        return render
+
+    def __compile_date(self, tokens):
+        # resolve m (month) to M (minutes) after hours or before seconds, and .0 after seconds
+        tokens = list(tokens)
+        significant = [i for i, (kind, value) in enumerate(tokens) if kind not in ('lit',)]
+        for n, i in enumerate(significant):
+            kind, value = tokens[i]
+            if kind == 'm' and value <= 2:
+                before = tokens[significant[n - 1]] if n > 0 else None
+                after = tokens[significant[n + 1]] if n + 1 < len(significant) else None
+                if _is_unit(before, 'h') or _is_unit(after, 's'):
+                    tokens[i] = ('M', value)
+        out = []
+        i = 0
+        while i < len(tokens):
+            kind, value = tokens[i]
+            if kind == 'point' and i + 1 < len(tokens) and tokens[i + 1] == ('digit', '0'):
+                end = i + 1
+                while end < len(tokens) and tokens[end] == ('digit', '0'):
+                    end += 1
+                out.append(('subsec', end - i - 1))
+                i = end
+                continue
+            out.append((kind, value))
+            i += 1
+        tokens = out
+
+        kinds = {kind for kind, value in tokens}
+        self.has_date = bool(kinds & {'y', 'm', 'd'})
+        self.has_time = bool(kinds & {'h', 'M', 's', 'ampm', 'elapsed', 'subsec'})
+        places = max([value for kind, value in tokens if kind == 'subsec'], default=0)
+        ticks_per_second = 10 ** places
+        ticks_per_day = 86400 * ticks_per_second
+        twelve_hour = 'ampm' in kinds
+        has_date = self.has_date
+
+        # compile the tokens into a template for str.format
+        parts = []
+        ampm = []
+        for kind, value in tokens:
+            if kind == 'y':
+                parts.append('{year2:02d}' if value <= 2 else '{year:04d}')
+            elif kind == 'm':
+                parts.append(('{month:0%dd}' % value) if value <= 2 else ('{month_name:.3}', '{month_name}', '{month_name:.1}')[min(value, 5) - 3])
+            elif kind == 'd':
+                parts.append(('{day:0%dd}' % value) if value <= 2 else '{day_name:.3}' if value == 3 else '{day_name}')
+            elif kind == 'h':
+                parts.append('{hour:0%dd}' % min(value, 2))
+            elif kind == 'M':
+                parts.append('{minute:0%dd}' % min(value, 2))
+            elif kind == 's':
+                parts.append('{second:0%dd}' % min(value, 2))
+            elif kind == 'subsec':
+                parts.append('.{fraction:.%d}' % value)
+            elif kind == 'ampm':
+                parts.append('{ampm%d}' % len(ampm))
+                ampm.append(('AM', 'PM',) if len(value) == 5 else (value[0], value[2],))
+            elif kind == 'elapsed':
+                parts.append('{elapsed_%s:0%dd}' % value)
+            elif isinstance(value, str):
+                parts.append(value.replace('{', '{{').replace('}', '}}'))
+        template = ''.join(parts)
+
+        def render(value, date1904=False):
+            if value < 0:
+                return format_general(value) # Excel shows ##### for negative dates
+            days, ticks = divmod(round(value * ticks_per_day), ticks_per_day)
+            seconds, fraction = divmod(ticks, ticks_per_second)
+            hours, rest = divmod(seconds, 3600)
+            minutes, second = divmod(rest, 60)
+            if has_date:
+                try:
+                    fields = _date_fields(days, date1904).copy()
+                except (OverflowError, ValueError):
+                    return format_general(value)
+            else:
+                fields = {}
+            fields['hour'] = (hours % 12 or 12) if twelve_hour else hours
+            fields['minute'] = minutes
+            fields['second'] = second
+            if places:
+                fields['fraction'] = '%0*d' % (places, fraction)
+            for i, (am, pm) in enumerate(ampm):
+                fields['ampm%d' % i] = am if hours < 12 else pm
+            if 'elapsed' in kinds:
+                total = days * 86400 + seconds
+                fields.update(elapsed_h=total // 3600, elapsed_m=total // 60, elapsed_s=total)
+            return template.format_map(fields)
+
+        return render
+
+
+def _is_unit(token, unit):
+    """ True if a date token is for hours or seconds (unit "h" or "s"), including elapsed times """
+    if token is None:
+        return False
+    return token[0] == unit or (token[0] == 'elapsed' and token[1][0] == unit)
+
+@functools.lru_cache(maxsize=65536)
+def _date_fields(days, date1904):
+    """ Return the template fields for the date of a serial day number, as Excel shows it
+
+    Dates in a sheet usually repeat, so the fields are cached.
+
+    @raises OverflowError: if the date is out of range for Python
+    @raises ValueError: if the date is before year 1
+
+    """
+    if date1904:
+        d = date.fromordinal(_ORDINAL_1904 + days)
+        year, month, day, weekday = d.year, d.month, d.day, (days + 5) % 7
+    elif days == 0:
+        year, month, day, weekday = 1900, 1, 0, 6
+    elif days == 60:
+        year, month, day, weekday = 1900, 2, 29, 3
+    else:
+        d = date.fromordinal(_ORDINAL_1900 + days + (1 if days < 60 else 0))
+        year, month, day, weekday = d.year, d.month, d.day, (days + 6) % 7
+    return {
+        'year': year,
+        'year2': year % 100,
+        'month': month,
+        'month_name': MONTH_NAMES[month - 1],
+        'day': day,
+        'day_name': DAY_NAMES[weekday],
+    }
+
+
+class NumberFormat:
+    """ A compiled Excel number format (see compile_format) """
+
+    def __init__(self, code):
+        """ Tokenize and compile a format code
+
+        @param code: the format code, like "#,##0.00" or "yyyy-mm-dd"
+
+        """
+        self.code = code
+        sections = [Section(tokens) for tokens in _tokenize(code)]
+
+        self.text_section = None
+        """ The Section for strings, or None to leave them as they are """
+        if len(sections) >= 4:
+            self.text_section = sections[3]
+            sections = sections[:3]
+        elif any(section.is_text for section in sections):
+            self.text_section = [section for section in sections if section.is_text][-1]
+            sections = [section for section in sections if not section.is_text]
+        if self.text_section is not None and self.text_section.render_text('') == '' and self.text_section.is_text:
+            self.text_section = None # just @
+
+        if not sections:
+            sections = [Section(_tokenize('General')[0])]
+        self.sections = sections
+        """ The Sections for numbers """
+
+        self.has_date = sections[0].has_date
+        """ True if the format shows a date (year, month, or day) """
+
+        self.has_time = sections[0].has_time
+        """ True if the format shows a time of day or an elapsed time """
+
+        self.__conditional = any(section.condition is not None for section in sections[:2])
+
+    def __reduce__(self):
+        # compiled sections are closures, so pickle the code instead
+        return (compile_format, (self.code,))
+
+    def __repr__(self):
+        return "<NumberFormat {!r}>".format(self.code)
+
+    def section(self, value):
+        """ Return the Section for a number, and the value to pass to it """
+        sections = self.sections
+        if self.__conditional:
+            for section in sections:
+                if section.condition is None or _test(section.condition, value):
+                    return section, value
+            return sections[-1], value
+        elif value < 0 and len(sections) > 1:
+            return sections[1], -value
+        elif value == 0 and len(sections) > 2:
+            return sections[2], value
+        return sections[0], value
+
+    def format(self, value, date1904=False):
+        """ Render a number as Excel displays it
+
+        Parameters:
+          value(float): the number (for dates and times, the serial day number)
+          date1904(bool): if True, dates use the 1904 date system
+
+        """
+        section, value = self.section(value)
+        return section.render(value, date1904)
+
+    def format_text(self, text):
+        """ Render a string as Excel displays it (only a text section changes it) """
+        if self.text_section is None:
+            return text
+        return self.text_section.render_text(text)
+
+    def color(self, value):
+        """ Return the colour name for a number (like "Red"), or None """
+        return self.section(value)[0].color
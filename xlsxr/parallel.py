@@ -0,0 +1,267 @@
+""" Read the sheets of a workbook in parallel worker processes
+
+There are two kinds of parallelism: whole sheets at a time (see
+iter_sheets), or pieces of a single large sheet (see iter_sheet_rows),
+where the sheet XML is split at <row> boundaries and each piece is
+parsed separately.
+
+Each worker receives a pickled copy of the workbook once, when it
+starts, including the shared strings and styles that have already
+been parsed (see Workbook.__getstate__), and reopens the archive by
+filename. Workers then parse whole sheets on request and send back
+the rows, cols, and merges. Every worker must have its own archive
+handle, because processes forked with an open zip file would share
+its file offset.
+
+Use Workbook.read_sheets(), Workbook.iter_all_sheets(), or
+Sheet.iter_rows_parallel() rather than calling this module directly
+(except for map_sheets, to run your own function on each sheet).
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import collections, concurrent.futures, logging, os, pickle, re, xlsxr.engines
+
+logger = logging.getLogger(__name__)
+
+SPLIT_SIZE = 4 * 1024 * 1024
+""" Default number of bytes of sheet XML in each piece parsed by a worker """
+
+ROW_PATTERN = re.compile(rb'<(?:[\w.-]+:)?row[\s/>]')
+""" Regular expression for the start of a <row> element in the raw XML """
+
+ROW_NUM_PATTERN = re.compile(rb'<(?:[\w.-]+:)?row\b[^>]*?\sr=')
+""" Regular expression for a <row> start tag with a row number """
+
+CONTAINER_PATTERNS = (
+    re.compile(rb'<((?:[\w.-]+:)?worksheet)[\s>]'),
+    re.compile(rb'<((?:[\w.-]+:)?sheetData)[\s>]'),
+)
+""" Regular expressions for the elements enclosing the rows, outermost first """
+
+_workbook = None
+""" The workbook in a worker process (set by _init_worker) """
+
+
+def _init_worker(state):
+    """ Unpickle the workbook once in each worker process """
+    global _workbook
+    _workbook = pickle.loads(state)
+
+def _call(function, index):
+    """ Call function(sheet) for a sheet in a worker process, and return (index, result) """
+    return index, function(_workbook.sheets[index])
+
+def _read_sheet(sheet):
+    """ Parse a whole sheet, and return (rows, cols, merges) """
+    rows = list(sheet.iter_rows())
+    return rows, sheet._raw_cols, sheet._raw_merges
+
+def _parse_piece(index, head, body, tail):
+    """ Parse a piece of a sheet in a worker process, and return (rows, cols, merges)
+
+    Parameters:
+      index(int): the 0-based index of the sheet in the workbook
+      head(bytes): the XML before the first row, with the start tags of the enclosing elements
+      body(bytes): the XML for a run of whole rows
+      tail(bytes): end tags to close the enclosing elements (empty if body is the end of the sheet)
+
+    """
+    sheet = _workbook.sheets[index]
+    engine = xlsxr.engines.get_engine(_workbook.engine)(sheet)
+    engine.feed(head)
+    engine.feed(body)
+    engine.feed(tail)
+    engine.close()
+    return engine.rows, sheet._raw_cols, sheet._raw_merges
+
+def _split_rows(stream, split_size):
+    """ Split the raw XML for a sheet at <row> boundaries
+
+    Yields the head of the document (everything before the first row),
+    then pieces of at least split_size bytes (except the last), each
+    starting with a <row> start tag. The last piece runs to the end of
+    the document.
+
+    Pieces after the first start only at rows with an r attribute, so
+    that a worker never has to guess where in the sheet its piece
+    starts: a row without one is the row after the one before it, so
+    it stays in the same piece as that row.
+
+    """
+    buffer = bytearray()
+    in_head = True
+    while True:
+        data = stream.read(xlsxr.engines.CHUNK_SIZE)
+        buffer += data
+
+        if in_head:
+            match = ROW_PATTERN.search(buffer)
+            if match is None and data:
+                continue
+            end = len(buffer) if match is None else match.start()
+            yield bytes(buffer[:end])
+            del buffer[:end]
+            in_head = False
+
+        if not data:
+            yield bytes(buffer)
+            return
+
+        if len(buffer) >= split_size:
+            # split at the last numbered row start, looking near the end first
+            last = None
+            for start in (max(1, len(buffer) - xlsxr.engines.CHUNK_SIZE), 1,):
+                for match in ROW_PATTERN.finditer(buffer, start):
+                    if ROW_NUM_PATTERN.match(buffer, match.start()):
+                        last = match
+                if last is not None:
+                    break
+            if last is not None:
+                yield bytes(buffer[:last.start()])
+                del buffer[:last.start()]
+
+def iter_sheet_rows(sheet, parallel=None, split_size=None):
+    """ Parse a single sheet in pieces, in up to parallel worker processes
+
+    The sheet XML is decompressed in this process and split at <row>
+    boundaries. Each worker parses a piece wrapped in the sheet's own
+    enclosing start and end tags, so namespaces are preserved. Only a
+    few pieces per worker are in flight at any time, so memory use
+    does not depend on the size of the sheet.
+
+    Row numbers come from the r attributes of the rows, and every
+    piece after the first starts with a numbered row (see
+    _split_rows); if the first row has no number, the whole sheet is
+    parsed in this process instead.
+    The cols and merges are saved in the sheet at the end.
+
+    Parameters:
+      sheet(xlsxr.sheet.Sheet): the sheet to read
+      parallel(int): the maximum number of worker processes (default: one per CPU)
+      split_size(int): the approximate number of bytes of XML in each piece (default SPLIT_SIZE)
+
+    Return:
+      An iterator over (row_num, row) pairs in order, with 1-based row numbers
+
+    """
+    workbook = sheet.workbook
+    index = workbook.sheets.index(sheet)
+    if parallel is None:
+        parallel = os.cpu_count() or 1
+    if split_size is None:
+        split_size = SPLIT_SIZE
+
+    with workbook.archive.open(sheet.filename, "r") as stream:
+        pieces = _split_rows(stream, split_size)
+        head = next(pieces)
+
+        names = [pattern.search(head) for pattern in CONTAINER_PATTERNS]
+        if None in names:
+            raise TypeError("Sheet {} has no <worksheet> or <sheetData> element".format(sheet.name))
+        tail = b''.join(b'</' + match.group(1) + b'>' for match in reversed(names))
+
+        body = next(pieces)
+        if not ROW_NUM_PATTERN.match(body):
+            logger.warning("Rows in sheet %s have no numbers, so parsing it in this process", sheet.name)
+            engine = xlsxr.engines.get_engine(workbook.engine)(sheet)
+            engine.feed(head)
+            while body:
+                engine.feed(body)
+                yield from engine.rows
+                engine.rows.clear()
+                body = next(pieces, b'')
+            engine.close()
+            yield from engine.rows
+            return
+
+        logger.debug("Parsing sheet %s in pieces with %d worker processes", sheet.name, parallel)
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=parallel,
+                initializer=_init_worker,
+                initargs=(pickle.dumps(workbook),),
+        ) as executor:
+            pending = collections.deque()
+            while body is not None:
+                next_body = next(pieces, None)
+                pending.append(executor.submit(_parse_piece, index, head, body, b'' if next_body is None else tail))
+                body = next_body
+                # keep a few pieces in flight per worker, and yield the rest in order
+                while pending and (len(pending) > 2 * parallel or body is None):
+                    rows, cols, merges = pending.popleft().result()
+                    yield from rows
+
+        sheet._raw_cols = cols
+        sheet._raw_merges = merges
+
+def iter_sheets(workbook, parallel=None, ordered=True):
+    """ Parse all of the sheets in a workbook, in up to parallel worker processes
+
+    Falls back to parsing the sheets one at a time in this process if
+    parallel is 1, if there is only one sheet, or if the workbook wasn't
+    opened from a filename.
+
+    Parameters:
+      workbook(xlsxr.workbook.Workbook): the workbook to read
+      parallel(int): the maximum number of worker processes (default: one per CPU)
+      ordered(bool): if True, yield the sheets in workbook order, otherwise as they are ready
+
+    Return:
+      An iterator over (sheet, rows) pairs, where rows is a list of rows
+
+    """
+    for sheet, (rows, cols, merges) in map_sheets(workbook, _read_sheet, parallel, ordered):
+        sheet._raw_cols = cols
+        sheet._raw_merges = merges
+        yield sheet, rows
+
+def map_sheets(workbook, function, parallel=None, ordered=True, sheets=None):
+    """ Call a function for each sheet in a workbook, in up to parallel worker processes
+
+    The function receives the worker's own copy of the sheet, so it
+    must be picklable (e.g. a module-level function, or a
+    functools.partial of one), and so must its result. Falls back to
+    calling it for one sheet at a time in this process if parallel is
+    1, if there is only one sheet, or if the workbook wasn't opened
+    from a filename.
+
+    Parameters:
+      workbook(xlsxr.workbook.Workbook): the workbook to read
+      function(callable): a function taking an xlsxr.sheet.Sheet
+      parallel(int): the maximum number of worker processes (default: one per CPU)
+      ordered(bool): if True, yield the sheets in workbook order, otherwise as they are ready
+      sheets(list): optional list of the workbook's sheets to use (default: all of them)
+
+    Return:
+      An iterator over (sheet, result) pairs
+
+    """
+    if sheets is None:
+        sheets = workbook.sheets
+    if parallel is None:
+        parallel = os.cpu_count() or 1
+    parallel = min(parallel, len(sheets))
+
+    if parallel > 1 and workbook.filename is None:
+        logger.info("Workbook was not opened from a filename, so reading its sheets in this process")
+        parallel = 1
+
+    if parallel <= 1:
+        for sheet in sheets:
+            yield sheet, function(sheet)
+        return
+
+    logger.debug("Reading %d sheets in %d worker processes", len(sheets), parallel)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=parallel,
+            initializer=_init_worker,
+            initargs=(pickle.dumps(workbook),),
+    ) as executor:
+        futures = [executor.submit(_call, function, workbook.sheets.index(sheet)) for sheet in sheets]
+        for future in futures if ordered else concurrent.futures.as_completed(futures):
+            index, result = future.result()
+            yield workbook.sheets[index], result
@@ -0,0 +1,183 @@
+""" Compact rows for sparse and heavily-merged sheets
+
+With the Workbook's sparse_rows option, each row is a Row object
+holding only its non-empty cells (their 0-based column numbers in an
+array, and their values in a tuple), instead of a list padded with ''
+for every empty cell. A row with no empty cells keeps no column
+numbers, so it is no larger than a list, and missing rows all share
+one empty Row.
+
+Merged areas are not copied into the rows. Each Row instead keeps a
+tuple of the spans of the merges covering it, as (start column, end
+column, value), and looks them up when a cell is read; consecutive rows
+covered by the same merges share the same tuple, so a full-width
+banner merge over thousands of rows costs one small tuple.
+
+Rows are read-only sequences that behave like lists for reading:
+len(), indexing (IndexError past the end), slicing (which returns a
+list), iteration, ==, and + all work as they would for the padded
+list, and to_list() returns one.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import bisect, collections.abc
+
+from array import array
+
+
+class Row(collections.abc.Sequence):
+    """ A read-only row holding only its non-empty cells and the spans of the merges covering it """
+
+    __slots__ = ('cols', 'values', 'spans', 'length',)
+
+    def __init__(self, cols, values, spans=()):
+        """ Set up a row
+
+        @param cols: array('H') of the 0-based column numbers of the non-empty cells, in order,
+          or None if the cells are in columns 0 to len(values) - 1
+        @param values: tuple of the values of those cells
+        @param spans: tuple of (start_col, end_col, value) for the merges covering the row
+
+        """
+        self.cols = cols
+        self.values = values
+        self.spans = spans
+        if cols is None:
+            length = len(values)
+        else:
+            length = cols[-1] + 1 if cols else 0
+        for start_col, end_col, value in spans:
+            length = max(length, end_col + 1)
+        self.length = length
+
+    @classmethod
+    def from_dict(cls, cells, spans=()):
+        """ Make a row from a dict of values by 0-based column number, in column order """
+        if not cells:
+            return cls(None, (), spans) if spans else EMPTY_ROW
+        return cls(_cols(cells), tuple(cells.values()), spans)
+
+    def to_list(self):
+        """ Return the row as a list, padded with '' for empty cells """
+        if self.cols is None:
+            result = list(self.values)
+            result.extend([''] * (self.length - len(result)))
+        else:
+            result = [''] * self.length
+            for col, value in zip(self.cols, self.values):
+                result[col] = value
+        for start_col, end_col, value in self.spans:
+            result[start_col:end_col + 1] = [value] * (end_col + 1 - start_col)
+        return result
+
+    def copy(self):
+        """ Return a mutable copy of the row, as a list """
+        return self.to_list()
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("row index out of range")
+        for start_col, end_col, value in self.spans:
+            if start_col <= index <= end_col:
+                return value
+        cols = self.cols
+        if cols is None:
+            return self.values[index] if index < len(self.values) else ''
+        i = bisect.bisect_left(cols, index)
+        if i < len(cols) and cols[i] == index:
+            return self.values[i]
+        return ''
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __eq__(self, other):
+        if isinstance(other, (Row, list,)):
+            return len(self) == len(other) and self.to_list() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return self.to_list() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.to_list()
+
+    def __repr__(self):
+        return repr(self.to_list())
+
+
+EMPTY_ROW = Row(None, ())
+""" The row shared by all empty rows with no merges """
+
+
+class MergeIndex:
+    """ Merged areas, sorted by first row, for finding the merges that cover a row """
+
+    def __init__(self, merges):
+        """ Index a list of merges, each parsed with xlsxr.util.parse_cell_range """
+        self.merges = sorted(merges)
+        self.starts = [start_row for (start_row, start_col,), end in self.merges]
+        self.max_height = max((end_row - start_row for (start_row, start_col,), (end_row, end_col,) in self.merges), default=0)
+
+    def covering(self, row_index):
+        """ Return the merges covering a 0-based row index """
+        lo = bisect.bisect_left(self.starts, row_index - self.max_height)
+        hi = bisect.bisect_right(self.starts, row_index)
+        return [merge for merge in self.merges[lo:hi] if merge[1][0] >= row_index]
+
+
+def make_rows(rows, merges=(), first_row=1):
+    """ Turn rows of values by column number into Row objects, attaching the merges that cover them
+
+    The value of each merge comes from its top left cell, as the rows
+    go by, so no merge may start before first_row.
+
+    Parameters:
+      rows: iterator over dicts of values by 0-based column number, with no gaps
+      merges: list of merges, parsed with xlsxr.util.parse_cell_range
+      first_row: the 1-based number of the first row
+
+    """
+    pending = sorted(merges, key=lambda ref: ref[0][0], reverse=True)
+    active = []
+    spans = ()
+    empty = EMPTY_ROW
+
+    for row_index, cells in enumerate(rows, first_row - 1):
+
+        # Pick up merges starting in this row, and drop those that have ended
+        changed = False
+        while pending and pending[-1][0][0] <= row_index:
+            (start_row, start_col,), (end_row, end_col,) = pending.pop()
+            active.append((end_row, start_col, end_col, cells.get(start_col, ''),))
+            changed = True
+        if active and min(merge[0] for merge in active) < row_index:
+            active = [merge for merge in active if merge[0] >= row_index]
+            changed = True
+        if changed:
+            spans = tuple(sorted((start_col, end_col, value,) for end_row, start_col, end_col, value in active))
+            empty = Row(None, (), spans) if spans else EMPTY_ROW
+
+        if cells:
+            yield Row(_cols(cells), tuple(cells.values()), spans)
+        else:
+            yield empty
+
+def _cols(cells):
+    """ Return the column numbers for a Row from a dict of cells, or None if they are 0 to len(cells) - 1 """
+    last = next(reversed(cells))
+    return None if last == len(cells) - 1 else array('H', cells)
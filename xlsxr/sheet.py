@@ -7,14 +7,30 @@
 
 """
 
-import logging, xml.sax
+import itertools, logging, os, re, xlsxr.columns, xlsxr.engines, xlsxr.index, xlsxr.parallel, xlsxr.rows
 
-from datetime import datetime, date
-
-from xlsxr.util import get_attr, parse_cell_ref, parse_cell_range, to_num, to_float, to_int, to_bool
+from xlsxr.util import MAX_COLS, col_number, parse_cell_ref, parse_cell_range
 
 logger = logging.getLogger(__name__)
 
+MERGE_CELL_PATTERN = re.compile(rb'<(?:[\w.-]+:)?mergeCell\b[^>]*?\sref="([^"]+)"')
+""" Regular expression for pre-scanning merges without parsing the whole sheet """
+
+DIMENSION_PATTERN = re.compile(rb'<(?:[\w.-]+:)?dimension\b[^>]*?\sref="([^"]+)"')
+""" Regular expression for the sheet's dimension (the range of cells in use) """
+
+DIMENSION_READ_SIZE = 4096
+""" Number of bytes of sheet XML to read at a time when looking for the dimension """
+
+SHEET_DATA_PATTERN = re.compile(rb'<(?:[\w.-]+:)?sheetData[\s/>]')
+""" Regular expression for the start of the rows, after which there is no dimension """
+
+COLUMN_LETTERS_PATTERN = re.compile(r'[A-Z]{1,3}')
+""" Regular expression for a column given as letters in a projection (checked against MAX_COLS too) """
+
+BATCH_SIZE = 10000
+""" Default number of rows in each batch from Sheet.iter_batches """
+
 
 class Sheet:
     """ An Excel XLSX worksheet (tab) """
@@ -43,6 +59,17 @@ class Sheet:
         self._raw_cols = None
         self._raw_rows = None
         self._raw_merges = None
+        self._row_index = None
+        self._merge_index = None
+        self._dimension = False # not read yet
+
+    def __getstate__(self):
+        """ Pickle the sheet without any parsed rows or row index, which can be read again """
+        state = self.__dict__.copy()
+        state["_raw_rows"] = None
+        state["_row_index"] = None
+        state["_merge_index"] = None
+        return state
 
     def get_col(self, index):
         """ Get info about a single column
@@ -63,12 +90,19 @@ class Sheet:
     def cols(self):
         """ Get the columns, parsing the sheet on demand """
         if self._raw_cols is None:
-            self.__parse_sheet()
+            self.__parse_metadata()
         return self._raw_cols
 
     @property
     def rows(self):
-        """ Get the rows, parsing the sheet on demand """
+        """ Get the rows, parsing the sheet on demand
+
+        If the workbook was opened with streaming=True, returns a
+        fresh row iterator each time instead of a list (see iter_rows).
+
+        """
+        if self.workbook.streaming:
+            return self.iter_rows()
         if self._raw_rows is None:
             self.__parse_sheet()
         return self._raw_rows
@@ -77,205 +111,552 @@ class Sheet:
     def merges(self):
         """ Get the merges, parsing the sheet on demand """
         if self._raw_merges is None:
-            self.__parse_sheet()
+            self.__parse_metadata()
         return self._raw_merges
 
-    def __parse_sheet(self):
-        """ On-demand parsing of the sheet itself """
+    @property
+    def dimension(self):
+        """ The range of cells in use, e.g. "A1:H5000", as saved in the sheet, or None if it has none
 
-        handler = Sheet.__SAXHandler(self)
+        Read from the <dimension> element at the start of the sheet XML,
+        without parsing the rows. Some generators leave it out, or write
+        just "A1"; Excel keeps it up to date.
 
-        with self.workbook.archive.open(self.filename) as stream:
-            xml.sax.parse(stream, handler)
+        """
+        if self._dimension is False:
+            self._dimension = self.__scan_dimension()
+        return self._dimension
+
+    @property
+    def size(self):
+        """ The uncompressed size of the sheet XML in bytes, from the zip directory """
+        return self.workbook.archive.getinfo(self.filename).file_size
 
+    @property
+    def compressed_size(self):
+        """ The compressed size of the sheet XML in bytes, from the zip directory """
+        return self.workbook.archive.getinfo(self.filename).compress_size
 
-    class __SAXHandler(xml.sax.handler.ContentHandler):
-        """ SAX content handler for parsing a sheet XML file
+    def iter_rows(self, columns=None, min_row=None, max_row=None, limit=None, names=None):
+        """ Iterate over the rows, parsing the sheet incrementally
 
-        Populates the following lists in the parent sheet:
-        
-        - _raw_cols
-        - _raw_rows
-        - _raw_merges
+        Each row is yielded as soon as its </row> end tag is parsed,
+        so memory use does not depend on the size of the sheet. Missing
+        rows appear as empty lists, as with the rows property.
 
-        TODO: add XML Namespace support
+        If the workbook has fill_merged set, this method first scans
+        the sheet for merges (which appear after the rows in the XML),
+        then fills merged areas as the rows go by.
+
+        Parameters:
+          columns(list): optional projection of the columns to return, in
+            order. Each item may be a 0-based column number (e.g. 3) or
+            a string of upper-case column letters (e.g. "AF"). The parser
+            skips all other cells without building their values, and each
+            row has exactly one value per item ('' if the cell is empty).
+          min_row(int): optional 1-based number of the first row to return.
+            Cells in earlier rows are skipped without building their values.
+          max_row(int): optional 1-based number of the last row to return.
+            Reading and decompressing the sheet stop as soon as it is passed.
+          limit(int): optional maximum number of rows to return, starting
+            at min_row (also stops reading early)
+          names(list): optional projection by header names (from the first
+            row) instead of columns, so that a header like "ID" is never
+            taken for column letters
+
+        @raises ValueError: if both columns and names are given, a column is
+          negative, past XFD, or not upper-case letters, or a name isn't in
+          the first row
 
         """
+        min_row = 1 if min_row is None else max(min_row, 1)
+        if limit is not None:
+            last_row = min_row + limit - 1
+            max_row = last_row if max_row is None else min(max_row, last_row)
+
+        merges = []
+        first_row = min_row
+        if self.workbook.fill_merged:
+            merges = [parse_cell_range(merge) for merge in self.__scan_merges()]
+            # merged areas are filled from their top left cells, so start
+            # early enough to see the top of any merge overlapping min_row
+            for (start_row, start_col,), (end_row, end_col,) in merges:
+                if start_row + 1 < min_row <= end_row + 1:
+                    first_row = min(first_row, start_row + 1)
+            merges = [merge for merge in merges if merge[0][0] + 1 >= first_row]
+
+        col_nums = self.__resolve_columns(columns, names)
+        sparse = col_nums is None and self.workbook.sparse_rows
+        if col_nums is None:
+            wanted = None
+            empty = dict if sparse else list
+        else:
+            empty = dict
+            # the top left cells of merges fill the others, so parse those too
+            wanted = set(col_nums)
+            for (start_row, start_col,), (end_row, end_col,) in merges:
+                if any(start_col <= col_num <= end_col for col_num in col_nums):
+                    wanted.add(start_col)
+
+        rows = self.__parse_rows(wanted, first_row, max_row)
+        rows = self.__fill_gaps(rows, empty, first_row, max_row)
+        if sparse:
+            rows = xlsxr.rows.make_rows(rows, merges, first_row)
+        elif merges:
+            rows = self.__fill_merges(rows, merges, col_nums, first_row)
+        if first_row < min_row:
+            rows = itertools.islice(rows, min_row - first_row, None)
+
+        if col_nums is None:
+            return rows
+        else:
+            return ([row.get(col_num, '') for col_num in col_nums] for row in rows)
+
+    def iter_batches(self, size=BATCH_SIZE, columns=None, min_row=None, max_row=None, limit=None, layout="rows", names=None):
+        """ Iterate over the rows in batches, for bulk loaders
+
+        Yields the same rows as iter_rows(), but size rows at a time
+        (the last batch may be shorter), ready for e.g. a DB-API
+        cursor's executemany(). This is a convenience for loaders, not a
+        faster path: the batches are collected from iter_rows(), so
+        they take the same time, and each batch is held in memory.
+
+        With layout="columns", each batch is instead a list of columns,
+        each a list of size values ('' for empty cells), e.g. for a
+        COPY-style loader that takes one array for each column. Every
+        column batch has at least as many columns as the sheet's
+        <dimension> says, and as any earlier batch.
 
-        def __init__(self, sheet):
-            super().__init__()
-            self.__sheet = sheet
-            self.__workbook = sheet.workbook
-
-            # Reset accumulators in parent sheet
-            self.__sheet._raw_cols = []
-            self.__sheet._raw_rows = []
-            self.__sheet._raw_merges = []
-
-            # Local accumulators for the handler
-            self.__row = None
-            self.__datatype = None
-            self.__style = None
-            self.__chunks = [] # we can reuse this list
-
-            # Very simple parse context
-            self.__in_row = False
-            self.__in_c = False
-            self.__in_v = False
-            self.__in_is = False
-            self.__in_t = False
-
-            # Track the positions
-            self.__col_num = None
-            self.__last_col_num = -1
-            self.__last_row_num = 0
-
-        def endDocument(self):
-
-            # Fill merged areas if requested (has to happen at the end)
-            if self.__workbook.fill_merged:
-                for merge in self.__sheet._raw_merges:
-                    (start_row, start_col,), (end_row, end_col,) = parse_cell_range(merge)
-                    value = self.__sheet._raw_rows[start_row][start_col]
-                    for i in range(start_row, end_row + 1):
-                        for j in range(start_col, end_col + 1):
-                            self.__sheet._raw_rows[i][j] = value
-                
+        Parameters:
+          size(int): the number of rows in each batch (default BATCH_SIZE)
+          columns, min_row, max_row, limit, names: as for iter_rows()
+          layout(str): "rows" (default) for lists of rows, or "columns" for lists of columns
 
-        def startElement(self, name, attributes):
+        @raises ValueError: if size is less than 1, the layout is unknown, or
+          the projection is bad (see iter_rows)
 
-            if name == 'col':
-                self.__sheet._raw_cols.append({
-                    "collapsed": to_bool(get_attr(attributes, "collapsed")),
-                    "hidden": to_bool(get_attr(attributes, "hidden")),
-                    "min": to_int(get_attr(attributes, "min")),
-                    "max": to_int(get_attr(attributes, "max")),
-                    "style": get_attr(attributes, "style"),
-                })
+        """
+        if size < 1:
+            raise ValueError("Batch size must be at least 1")
+        if layout not in ("rows", "columns",):
+            raise ValueError("Unknown batch layout: {}".format(layout))
+
+        batches = self.__batch_rows(self.iter_rows(columns, min_row, max_row, limit, names), size)
+        if layout == "rows":
+            return batches
+
+        width = 0
+        if columns is None and names is None and self.dimension is not None:
+            width = parse_cell_ref(self.dimension.split(':')[-1])[1] + 1
+        return self.__transpose_batches(batches, width)
+
+    def iter_rows_parallel(self, parallel=None, split_size=None):
+        """ Iterate over the rows, parsing pieces of the sheet in parallel worker processes
+
+        For very large single sheets: the sheet XML is split at row
+        boundaries, and the pieces are parsed in a process pool (see
+        xlsxr.parallel.iter_sheet_rows). The rows come back in order,
+        with gaps and (if fill_merged is set) merges filled, exactly as
+        from iter_rows(). Workbooks not opened from a filename, or
+        parallel=1, fall back to iter_rows().
 
-            if name == 'row':
-                self.__in_row = True
-                self.__row = []
-                self.__last_col_num = -1
-                self.__col_num = None
+        Parameters:
+          parallel(int): the maximum number of worker processes (default: one per CPU)
+          split_size(int): the approximate number of bytes of XML in each piece
 
-                # Fill in any missing rows
-                row_num = int(get_attr(attributes, 'r'))
-                for n in range(self.__last_row_num + 1, row_num):
-                    self.__sheet._raw_rows.append([])
-                self.__last_row_num = row_num
+        """
+        if parallel == 1 or self.workbook.filename is None:
+            return self.iter_rows()
 
-            elif name == 'c' and self.__in_row:
-                self.__in_c = True
-                self.__col_num = parse_cell_ref(get_attr(attributes, 'r'))[1]
-                self.__datatype = get_attr(attributes, 't')
-                self.__style = to_int(get_attr(attributes, 's'))
+        merges = []
+        if self.workbook.fill_merged:
+            merges = [parse_cell_range(merge) for merge in self.__scan_merges()]
 
-            elif name == 'v' and self.__in_c:
-                self.__in_v = True
+        if self.workbook.sparse_rows:
+            rows = self.__fill_gaps(xlsxr.parallel.iter_sheet_rows(self, parallel, split_size), dict)
+            return xlsxr.rows.make_rows(rows, merges)
+        rows = self.__fill_gaps(xlsxr.parallel.iter_sheet_rows(self, parallel, split_size))
+        if merges:
+            rows = self.__fill_merges(rows, merges)
+        return rows
 
-            elif name == 'is' and self.__in_c:
-                self.__in_is = True
+    def to_columns(self, header=False, dtype_inference=True):
+        """ Read the sheet into typed column buffers, without building rows
 
-            elif name == 't' and self.__in_is:
-                self.__in_t = True
+        See xlsxr.columns for the kinds of column. Missing cells are
+        tracked in each column's validity mask, and shared strings are
+        kept as codes (their indices in the shared-string table). The
+        workbook's convert_values and fill_merged settings don't apply.
 
-            elif name == 'mergeCell':
-                self.__sheet._raw_merges.append(get_attr(attributes, 'ref'))
+        Parameters:
+          header(bool): if True, name the columns from the first row, and start the data at row 2
+          dtype_inference(bool): if True (default), type each column from its cells; otherwise keep strings
 
+        Return:
+          A list of xlsxr.columns.Column objects
 
-        def endElement(self, name):
+        """
+        return xlsxr.columns.read_columns(self, header, dtype_inference)
 
-            if name == 'row':
-                self.__in_row = False
-                self.__sheet._raw_rows.append(self.__row)
+    def to_numpy(self, header=False, dtype_inference=True):
+        """ Read the sheet into a dict of NumPy masked arrays, by column name
 
-            elif name == 'c' and self.__in_row:
-                self.__in_c = False
+        Column names come from the first row if header is True, and are
+        the column letters otherwise (or for blank headers). If names
+        repeat, later columns get their letters added, e.g. "Total (F)".
+        See to_columns() and xlsxr.columns.Column.to_numpy().
 
-                # Are there blank cells preceeding this one?
-                for n in range(self.__last_col_num + 1, self.__col_num):
-                    self.__row.append('')
-                self.__last_col_num = self.__col_num
-                
-                self.__row.append(self.__make_value())
-                self.__chunks.clear()
+        @raises ImportError: if NumPy is not installed
 
-            elif name == 'v' and self.__in_c:
-                self.__in_v = False
+        """
+        columns = self.to_columns(header, dtype_inference)
+        return {name: column.to_numpy() for name, column in zip(xlsxr.columns.unique_names(columns), columns)}
 
-            elif name == 'is' and self.__in_c:
-                self.__in_is = False
+    @property
+    def index_path(self):
+        """ The path of the sidecar file for the row index (see build_index), or None if the workbook has no filename """
+        if self.workbook.filename is None:
+            return None
+        return "{}.{}.xlsxr-index".format(self.workbook.filename, os.path.splitext(os.path.basename(self.filename))[0])
+
+    def build_index(self, path=None, save=True):
+        """ Build the row offset index for random access with row() and cell()
+
+        Makes one pass through the sheet XML, recording where each row
+        starts, and saves the index to a sidecar file (see
+        xlsxr.index.RowIndex). The index is keyed by the CRC and sizes of
+        the sheet's archive member, so a saved index for an older
+        version of the workbook is ignored. row() and cell() load the
+        saved index, or build one, on first use.
 
-            elif name == 't' and self.__in_is:
-                self.__in_t = False
+        Parameters:
+          path(str): the sidecar file (default: index_path)
+          save(bool): if False, keep the index in memory only
 
+        Return:
+          The xlsxr.index.RowIndex
 
-        def characters(self, content):
+        """
+        index = xlsxr.index.RowIndex.build(self.workbook.archive, self.filename)
+        path = path or self.index_path
+        if save and path is not None:
+            try:
+                index.save(path)
+            except OSError as e:
+                logger.warning("Can't save the row index for sheet %s to %s: %s", self.name, path, e)
+        self._row_index = index
+        self._merge_index = None
+        return index
+
+    def row(self, row_num):
+        """ Return a single row, decompressing and parsing only that row (through the row index)
+
+        Values are the same as in the rows property, including
+        fill_merged. See build_index().
 
-            if self.__in_v or self.__in_t:
-                self.__chunks.append(content)
+        Parameters:
+          row_num(int): the 1-based row number
 
+        Return:
+          A list of values (empty if the row has no cells), or an xlsxr.rows.Row with sparse_rows
 
-        def __make_value(self):
-            """ Figure out the scalar value to include for a cell 
+        @raises IndexError: if row_num is before the first row or after the last one
 
-            Uses the current type and style, and may look up styles and shared strings
-            in the parent workbook.
+        """
+        index = self.__get_index()
+        if row_num < 1 or row_num > index.max_row:
+            raise IndexError("Sheet {} has no row {}".format(self.name, row_num))
+        sparse = self.workbook.sparse_rows
+        row = self.__read_indexed_row(index, row_num)
+
+        spans = []
+        if self.workbook.fill_merged:
+            if self._merge_index is None:
+                self._merge_index = xlsxr.rows.MergeIndex([parse_cell_range(merge) for merge in index.merges])
+            for (start_row, start_col,), (end_row, end_col,) in self._merge_index.covering(row_num - 1):
+                top = row if start_row + 1 == row_num else self.__read_indexed_row(index, start_row + 1)
+                if sparse:
+                    value = top.get(start_col, '')
+                else:
+                    value = top[start_col] if start_col < len(top) else ''
+                spans.append((start_col, end_col, value,))
+
+        if sparse:
+            return xlsxr.rows.Row.from_dict(row, tuple(sorted(spans)))
+        for start_col, end_col, value in spans:
+            if len(row) <= end_col:
+                row.extend([''] * (end_col + 1 - len(row)))
+            row[start_col:end_col + 1] = [value] * (end_col + 1 - start_col)
+        return row
+
+    def cell(self, ref):
+        """ Return the value of a single cell, decompressing and parsing only its row (see row())
 
-            """
+        Parameters:
+          ref(str): the cell reference, e.g. "AB123456"
 
-            # Special case: if we haven't seen any text chunks, return None
-            if len(self.__chunks) == 0:
-                return ''
+        Return:
+          The value, or '' if the cell is empty or outside the sheet's rows
 
-            # Merge all the text chunks (more efficient than using + each time
-            value = ''.join(self.__chunks)
+        """
+        row_num, col_num = parse_cell_ref(ref)
+        try:
+            row = self.row(row_num + 1)
+        except IndexError:
+            return ''
+        return row[col_num] if col_num < len(row) else ''
 
-            # Tweak by datatype
-            if self.__datatype == 'b': # boolean
-                if self.__workbook.convert_values:
-                    value = to_bool(value)
+    def header(self):
+        """ Return the first row of the sheet
 
-            elif self.__datatype == 'd': # date
-                pass
+        Reads only as far as the end of row 1, so it is cheap even for
+        very large sheets (except that fill_merged needs a scan for merges).
+        Returns an empty list if the sheet has no first row.
 
-            elif self.__datatype == 'e': # error
-                pass
+        """
+        return next(self.iter_rows(max_row=1), [])
+
+    def __get_index(self):
+        """ Return the row index, loading the saved one if it matches the sheet, or else building it """
+        if self._row_index is None:
+            path = self.index_path
+            if path is not None and os.path.exists(path):
+                try:
+                    index = xlsxr.index.RowIndex.load(path)
+                    if index.matches(self.workbook.archive.getinfo(self.filename)):
+                        self._row_index = index
+                        self._merge_index = None
+                    else:
+                        logger.info("Row index %s is out of date, so rebuilding it", path)
+                except (OSError, ValueError) as e:
+                    logger.warning("Can't read the row index %s, so rebuilding it: %s", path, e)
+            if self._row_index is None:
+                self.build_index()
+        return self._row_index
+
+    def __read_indexed_row(self, index, row_num):
+        """ Decompress and parse a single row through the index (a dict of values by column number with sparse_rows) """
+        span = index.find(row_num)
+        if span is not None:
+            engine = xlsxr.engines.get_engine(self.workbook.engine)(self)
+            engine.feed(index.head)
+            engine.feed(index.read(self.workbook.archive, *span))
+            engine.feed(index.tail)
+            if engine.rows:
+                return engine.rows[0][1]
+        return {} if self.workbook.sparse_rows else []
 
-            elif self.__datatype == 'inlineStr':
+    def __parse_sheet(self):
+        """ On-demand parsing of the sheet itself, or loading it from the workbook's cache """
+        cache = self.workbook.cache
+        if cache is not None and cache.load_rows(self):
+            return
+        sparse = self.workbook.sparse_rows
+        rows = list(self.__fill_gaps(self.__parse_rows(), dict if sparse else list))
+        merges = []
+        if self.workbook.fill_merged:
+            merges = [parse_cell_range(merge) for merge in self._raw_merges]
+        if sparse:
+            rows = list(xlsxr.rows.make_rows(rows, merges))
+        elif merges:
+            rows = list(self.__fill_merges(rows, merges))
+        self._raw_rows = rows
+        if cache is not None:
+            cache.save_rows(self)
+
+    def __parse_metadata(self):
+        """ On-demand parsing of the cols and merges
+
+        In streaming mode, parses through the sheet without keeping the rows.
+
+        """
+        if self.workbook.streaming:
+            for row in self.__parse_rows():
                 pass
+        else:
+            self.__parse_sheet()
 
-            elif self.__datatype == 'n': # number
-                cell_format = None
-                if self.__style is not None:
-                    cell_format = self.__workbook.styles.cell_formats[self.__style]
-
-                # is it a date or datetime? Excel handles these awkwardly
-                if cell_format is not None and cell_format['has_date']:
-                    value = to_num(value)
-                    if cell_format['has_time']:
-                        dt = datetime.fromordinal(datetime(1900, 1, 1).toordinal() + value - 2)
-                        if self.__workbook.convert_values:
-                            value = dt
-                        else:
-                            value = dt.strftime('%Y-%m-%dT%H:%M:%S')
-                    else:
-                        dt = date.fromordinal(datetime(1900, 1, 1).toordinal() + value - 2)
-                        if self.__workbook.convert_values:
-                            value = dt
-                        else:
-                            value = dt.strftime('%Y-%m-%d')
+    def __resolve_columns(self, columns, names):
+        """ Resolve a projection by columns or names (see iter_rows) to a list of 0-based column numbers, or None for all """
+        if columns is not None and names is not None:
+            raise ValueError("Project by columns or by names, not both")
+        elif names is not None:
+            header = self.header()
+            col_nums = []
+            for name in names:
+                try:
+                    col_nums.append(header.index(name))
+                except ValueError:
+                    raise ValueError("No column with the header {!r} in sheet {}".format(name, self.name))
+            return col_nums
+        elif columns is not None:
+            col_nums = []
+            for column in columns:
+                if isinstance(column, int):
+                    col_num = column
+                elif isinstance(column, str) and COLUMN_LETTERS_PATTERN.fullmatch(column):
+                    col_num = col_number(column)
+                else:
+                    raise ValueError("Not a column number or upper-case column letters: {!r} (use names for headers)".format(column))
+                if not 0 <= col_num < MAX_COLS:
+                    raise ValueError("Column {!r} is outside the sheet (A to XFD)".format(column))
+                col_nums.append(col_num)
+            return col_nums
+        return None
 
-                # just a plain old number
-                elif self.__workbook.convert_values:
-                    value = to_num(value)
+    def __parse_rows(self, columns=None, min_row=None, max_row=None):
+        """ Feed the sheet XML to the parser in chunks, yielding (row_num, row) pairs
 
-            elif self.__datatype == 's': # shared string
-                value = self.__workbook.shared_strings[int(value)]
+        Row numbers are 1-based, as in the sheet XML. The cols and merges
+        are saved in the sheet once the end of the document is reached.
+        If max_row is given, stops after the first row past it (so that
+        the caller knows about any gap before that row) instead.
 
-            elif self.__datatype == 'str': # simple inline string
-                pass
+        Parameters:
+          columns(set): optional 0-based column numbers to keep (see xlsxr.engines)
+          min_row(int): optional 1-based number of the first row to keep
+          max_row(int): optional 1-based number of the last row to keep
+
+        """
+        engine = xlsxr.engines.get_engine(self.workbook.engine)(self, columns, min_row)
+
+        with self.workbook.archive.open(self.filename, "r") as stream:
+            while True:
+                data = stream.read(xlsxr.engines.CHUNK_SIZE)
+                if data:
+                    engine.feed(data)
+                else:
+                    engine.close()
+                rows, engine.rows = engine.rows, []
+                for row_num, row in rows:
+                    yield row_num, row
+                    if max_row is not None and row_num > max_row:
+                        return # stop reading the archive member
+                if not data:
+                    break
+
+    def __batch_rows(self, rows, size):
+        """ Collect a row iterator into lists of size rows (see iter_batches) """
+        while True:
+            batch = list(itertools.islice(rows, size))
+            if not batch:
+                return
+            yield batch
+
+    def __transpose_batches(self, batches, width=0):
+        """ Turn batches of rows into batches of columns, padded with ''
+
+        Parameters:
+          batches: iterator over lists of rows
+          width: the minimum number of columns in each batch
+
+        """
+        for rows in batches:
+            columns = [list(column) for column in itertools.zip_longest(*rows, fillvalue='')]
+            width = max(width, len(columns))
+            columns.extend([''] * len(rows) for n in range(len(columns), width))
+            yield columns
+
+    def __fill_gaps(self, rows, empty=list, first_row=1, max_row=None):
+        """ Yield the rows in a sheet, adding an empty row for each missing row number
+
+        Parameters:
+          rows: iterator over (row_num, row) pairs
+          empty: the type to use for empty rows
+          first_row: the 1-based number of the first row to yield
+          max_row: optional 1-based number of the last row to yield
+
+        """
+        last_row_num = first_row - 1
+        for row_num, row in rows:
+            if max_row is not None and row_num > max_row:
+                # fill any gap up to max_row, then stop
+                for n in range(last_row_num + 1, max_row + 1):
+                    yield empty()
+                return
+            for n in range(last_row_num + 1, row_num):
+                yield empty()
+            last_row_num = row_num
+            yield row
+
+    def __fill_merges(self, rows, merges, columns=None, first_row=1):
+        """ Fill merged areas in a row sequence, one row at a time
+
+        The value in the top left cell of each merge is copied into
+        every cell of the merge, padding short rows with ''.
+
+        If columns is given, the rows are dicts of values by column
+        number (see xlsxr.engines), and only those columns are filled.
+
+        Parameters:
+          rows: iterator over the rows, with no gaps
+          merges: list of merges, parsed with xlsxr.util.parse_cell_range,
+            none of them starting before first_row
+          columns: optional list of 0-based column numbers in the rows
+          first_row: the 1-based number of the first row
+
+        """
+        pending = sorted(merges, key=lambda ref: ref[0][0], reverse=True)
+        active = []
+
+        for row_num, row in enumerate(rows, first_row - 1):
+
+            # Pick up merges starting in this row, and remember their values
+            while pending and pending[-1][0][0] == row_num:
+                (start_row, start_col,), (end_row, end_col,) = pending.pop()
+                if columns is None:
+                    value = row[start_col] if start_col < len(row) else ''
+                else:
+                    value = row.get(start_col, '')
+                active.append((end_row, start_col, end_col, value,))
+
+            if active:
+                active = [merge for merge in active if merge[0] >= row_num]
+                for end_row, start_col, end_col, value in active:
+                    if columns is None:
+                        if len(row) <= end_col:
+                            row.extend([''] * (end_col + 1 - len(row)))
+                        for j in range(start_col, end_col + 1):
+                            row[j] = value
+                    else:
+                        for j in columns:
+                            if start_col <= j <= end_col:
+                                row[j] = value
+
+            yield row
+
+    def __scan_dimension(self):
+        """ Scan the head of the raw sheet XML for the dimension, stopping at the start of the rows """
+        buffer = b''
+        with self.workbook.archive.open(self.filename, "r") as stream:
+            while True:
+                data = stream.read(DIMENSION_READ_SIZE)
+                if not data:
+                    break
+                buffer += data
+                match = DIMENSION_PATTERN.search(buffer)
+                if match is not None:
+                    return match.group(1).decode('utf-8')
+                if SHEET_DATA_PATTERN.search(buffer):
+                    break
+                # keep enough of the tail to catch a tag split across reads
+                buffer = buffer[-1024:]
+        return None
 
-            # Return the tweaked value
-            return value
+    def __scan_merges(self):
+        """ Scan the raw sheet XML for merges, without parsing the rows """
+        merges = []
+        buffer = b''
+        with self.workbook.archive.open(self.filename, "r") as stream:
+            while True:
+                data = stream.read(xlsxr.engines.CHUNK_SIZE)
+                if not data:
+                    break
+                buffer += data
+                pos = 0
+                for match in MERGE_CELL_PATTERN.finditer(buffer):
+                    merges.append(match.group(1).decode('utf-8'))
+                    pos = match.end()
+                # keep enough of the tail to catch a tag split across reads
+                buffer = buffer[max(pos, len(buffer) - 1024):]
+        return merges
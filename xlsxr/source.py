@@ -0,0 +1,221 @@
+""" Byte sources for workbooks that aren't local files: URLs and non-seekable streams
+
+A zip archive has its directory at the end, so reading it needs a
+seekable source. Instead of downloading a whole remote workbook into
+memory, open_url() returns an HTTPRangeFile, a read-only file object
+that fetches only the byte ranges that are read, using HTTP Range
+requests. Opening a workbook reads the zip directory at the end of the
+file, then only the members that it parses (the workbook, relations,
+styles, and shared strings, plus each sheet when it is read), so
+reading one sheet of a large remote workbook downloads little more
+than that sheet.
+
+The first request asks for the last BLOCK_SIZE bytes, which gives the
+size of the file and usually the whole zip directory in one round
+trip. Later reads fetch whole blocks, keeping the most recent
+CACHE_BLOCKS, and sequential reads fetch twice as many blocks each
+time (up to CACHE_BLOCKS), so that streaming a large sheet doesn't
+cost a round trip for every block.
+
+If the server doesn't support range requests, the response body is
+copied to a temporary file instead, as are non-seekable streams (see
+spool()). Temporary files stay in memory up to SPOOL_SIZE bytes, and
+spill to disk after that.
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import collections, io, logging, re, shutil, tempfile
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 256 * 1024
+""" Number of bytes in each block fetched from a server """
+
+CACHE_BLOCKS = 32
+""" Number of blocks to keep in memory, and the most to fetch in one request """
+
+SPOOL_SIZE = 64 * 1024 * 1024
+""" Number of bytes to keep in memory when spooling, before spilling to a temporary file on disk """
+
+COPY_SIZE = 64 * 1024
+""" Number of bytes to copy at a time when spooling """
+
+CONTENT_RANGE_PATTERN = re.compile(r'^bytes\s+(\d+)-(\d+)/(\d+|\*)$')
+""" Regular expression for a Content-Range header """
+
+
+def spool(stream, max_size=None):
+    """ Copy a non-seekable byte stream to a temporary file, in memory until it's larger than max_size
+
+    Parameters:
+      stream: a file-like object (byte stream), or an iterator over byte strings
+      max_size(int): the most bytes to keep in memory (default SPOOL_SIZE)
+
+    Return:
+      A tempfile.SpooledTemporaryFile, positioned at the start
+
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE if max_size is None else max_size)
+    if hasattr(stream, "read"):
+        shutil.copyfileobj(stream, output, COPY_SIZE)
+    else:
+        for data in stream:
+            output.write(data)
+    logger.debug("Spooled %d bytes", output.tell())
+    output.seek(0)
+    return output
+
+def open_url(url, session=None):
+    """ Open a URL as a seekable, read-only file object
+
+    Return an HTTPRangeFile if the server supports range requests, or
+    else a spooled copy of the whole response (see spool()).
+
+    Parameters:
+      url(str): the web address of the file
+      session(requests.Session): optional session to use for the requests
+
+    @raises requests.RequestException: if a request fails (a subclass of OSError)
+
+    """
+    import requests # only when needed, because it's slow to import
+    if session is None:
+        session = requests.Session()
+
+    # ask for the end of the file, where the zip directory is
+    response = session.get(url, headers={"Range": "bytes=-{}".format(BLOCK_SIZE)}, stream=True)
+    response.raise_for_status()
+    if response.status_code == 206:
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+        if match is not None and match.group(3) != '*':
+            with response:
+                data = response.content
+            size = int(match.group(3))
+            logger.debug("Reading %s with range requests (%d bytes)", url, size)
+            return HTTPRangeFile(url, size, session, response.headers.get("ETag"), (int(match.group(1)), data,))
+
+    logger.debug("Server doesn't support range requests for %s, so downloading it", url)
+    with response:
+        return spool(response.iter_content(COPY_SIZE))
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """ A seekable, read-only file object over a URL, fetching blocks with HTTP Range requests
+
+    Use open_url() rather than creating one directly.
+
+    """
+
+    def __init__(self, url, size, session, etag=None, data=None):
+        """ Set up the file
+
+        Parameters:
+          url(str): the web address of the file
+          size(int): the size of the file in bytes
+          session(requests.Session): the session to use for requests
+          etag(str): optional entity tag, to make sure that the file doesn't change between requests
+          data(tuple): optional (offset, bytes) pair already fetched from the end of the file
+
+        """
+        super().__init__()
+        self.url = url
+        self.size = size
+        self.session = session
+        self.etag = etag
+        self.requests = 0
+        """ Number of range requests made (not counting the first one, in open_url) """
+        self.bytes_fetched = 0
+        """ Number of bytes received from range requests (not counting the first one) """
+        self.__position = 0
+        self.__blocks = collections.OrderedDict() # block number -> bytes, least recently used first
+        self.__next_block = None # the block after the last one fetched
+        self.__read_ahead = 1 # blocks to fetch for the next sequential miss
+        self.__tail_start, self.__tail = data if data is not None else (size, b'',)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.__position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.__position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError("Invalid whence ({}, should be 0, 1, or 2)".format(whence))
+        if position < 0:
+            raise ValueError("Negative seek position {}".format(position))
+        self.__position = position
+        return position
+
+    def readinto(self, buffer):
+        """ Read up to len(buffer) bytes into a writable buffer, and return the number read """
+        size = max(min(len(buffer), self.size - self.__position), 0)
+        view = memoryview(buffer).cast('B')
+        done = 0
+        while done < size:
+            position = self.__position + done
+            if position >= self.__tail_start:
+                data = self.__tail[position - self.__tail_start:position - self.__tail_start + size - done]
+                view[done:done + len(data)] = data
+                done += len(data)
+                continue
+            block_num, offset = divmod(position, BLOCK_SIZE)
+            block = self.__blocks.get(block_num)
+            if block is None:
+                block = self.__fetch(block_num, -(-min(position + size - done, self.__tail_start) // BLOCK_SIZE))
+            else:
+                self.__blocks.move_to_end(block_num)
+            data = block[offset:offset + size - done]
+            view[done:done + len(data)] = data
+            done += len(data)
+        self.__position += done
+        return done
+
+    def __fetch(self, block_num, end_block_num):
+        """ Fetch a block and any others up to end_block_num (exclusive) or the read-ahead, and return the first """
+        if block_num == self.__next_block:
+            self.__read_ahead = min(self.__read_ahead * 2, CACHE_BLOCKS)
+        else:
+            self.__read_ahead = 1
+        count = min(max(end_block_num - block_num, self.__read_ahead), CACHE_BLOCKS)
+        start = block_num * BLOCK_SIZE
+        end = min(start + count * BLOCK_SIZE, self.__tail_start)
+
+        headers = {"Range": "bytes={}-{}".format(start, end - 1)}
+        if self.etag is not None:
+            headers["If-Match"] = self.etag
+        with self.session.get(self.url, headers=headers) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise OSError("Server ignored a range request for {}".format(self.url))
+            data = response.content
+        if len(data) != end - start:
+            raise OSError("Expected {} bytes from {}, but received {}".format(end - start, self.url, len(data)))
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        self.__next_block = block_num + count
+        self.__cache(start, data)
+        return self.__blocks[block_num]
+
+    def __cache(self, start, data):
+        """ Add the blocks in data (starting at block boundary start) to the cache """
+        block_num = start // BLOCK_SIZE
+        for i in range(0, len(data), BLOCK_SIZE):
+            self.__blocks[block_num] = data[i:i + BLOCK_SIZE]
+            self.__blocks.move_to_end(block_num)
+            block_num += 1
+        while len(self.__blocks) > CACHE_BLOCKS:
+            self.__blocks.popitem(last=False)
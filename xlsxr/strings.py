@@ -0,0 +1,300 @@
+""" Compact storage for an Excel workbook's shared strings
+
+@author: David Megginson
+@organization: UN Centre for Humanitarian Data
+@license: Public Domain
+@date: Started 2020-03-21
+
+"""
+
+import io, logging, re, threading, xlsxr.engines
+
+from array import array
+from collections import OrderedDict
+from itertools import accumulate, islice
+
+logger = logging.getLogger(__name__)
+
+SI_PATTERN = re.compile(rb'<(?:[\w.-]+:)?si[\s/>]')
+""" Regular expression for the start of a shared string in the raw XML """
+
+SST_END_PATTERN = re.compile(rb'</(?:[\w.-]+:)?sst\s*>')
+""" Regular expression for the end of the shared-string table in the raw XML """
+
+
+class SharedStrings:
+    """ Table of shared strings, stored as one UTF-8 buffer plus an array of offsets
+
+    A list of a million short strings costs roughly 60 bytes of object
+    overhead per entry; this table costs 8 bytes per entry plus the
+    encoded text. Strings are decoded when they are looked up.
+
+    Behaves like a read-only list of str.
+
+    """
+
+    def __init__(self, intern=False):
+        """ Create an empty table
+
+        Parameters:
+          intern(bool): if True, keep each string once it has been decoded, so
+            that repeated lookups (e.g. for very repetitive columns) return
+            the same object without decoding again
+
+        """
+        self._buffer = bytearray()
+        self._offsets = array('Q', [0])
+        self._pool = {} if intern else None
+
+    @classmethod
+    def from_buffers(cls, offsets, buffer, intern=False):
+        """ Make a read-only table from existing storage in the layout of buffers()
+
+        Used for tables memory-mapped from a cache file (see xlsxr.cache).
+
+        Parameters:
+          offsets: sequence of 8-byte unsigned offsets, such as an array('Q') or a memoryview cast to 'Q'
+          buffer: the UTF-8 text, as any bytes-like object
+          intern(bool): as for the constructor
+
+        """
+        table = cls(intern)
+        table._offsets = offsets
+        table._buffer = buffer
+        return table
+
+    def __getstate__(self):
+        """ Pickle the table, copying its storage if it's a view of a mapped file """
+        state = self.__dict__.copy()
+        if not isinstance(self._buffer, bytearray):
+            state.update(_buffer=bytearray(self._buffer), _offsets=array('Q', self._offsets))
+        return state
+
+    def append(self, s):
+        """ Add a string to the end of the table """
+        self._buffer += s.encode('utf-8')
+        self._offsets.append(len(self._buffer))
+
+    def extend(self, strings):
+        """ Add a sequence of strings to the end of the table
+
+        Works in batches, to avoid growing the buffer once per string.
+
+        """
+        strings = iter(strings)
+        while True:
+            batch = [s.encode('utf-8') for s in islice(strings, 4096)]
+            if not batch:
+                break
+            ends = accumulate(map(len, batch), initial=len(self._buffer))
+            self._offsets.extend(islice(ends, 1, None))
+            self._buffer += b''.join(batch)
+
+    def buffers(self):
+        """ Return the raw storage, as an (offsets, buffer) pair
+
+        The offsets are an array('Q') with the start of each string in
+        the UTF-8 buffer, plus the end of the last one (the same layout
+        as an Apache Arrow large_string array). Don't modify either.
+
+        """
+        return self._offsets, self._buffer
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        pool = self._pool
+        if pool is not None:
+            s = pool.get(index)
+            if s is not None:
+                return s
+
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError("shared string index out of range")
+        offsets = self._offsets
+        s = str(self._buffer[offsets[index]:offsets[index + 1]], 'utf-8')
+
+        if pool is not None:
+            pool[index] = s
+        return s
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __contains__(self, s):
+        return any(s == item for item in self)
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return "<SharedStrings: {} strings, {} bytes>".format(len(self), len(self._buffer))
+
+
+class LazySharedStrings:
+    """ Shared strings looked up on demand from the workbook archive
+
+    Nothing is read until the first lookup. Then a single scan of
+    the raw XML records the byte offset of each <si> element, and
+    each lookup reads and parses only a small block of entries,
+    keeping decoded strings in a bounded LRU cache. The full table is
+    never in memory.
+
+    Behaves like a read-only list of str. Safe to use from several
+    threads at once: lookups share one archive stream and one cache,
+    so they take turns under a lock.
+
+    """
+
+    CACHE_SIZE = 16384
+    """ Default maximum number of decoded strings to keep """
+
+    BLOCK_SIZE = 64
+    """ Number of consecutive entries to decode on each cache miss """
+
+    def __init__(self, archive, filename, cache_size=None):
+        """ Set up lazy lookups
+
+        Parameters:
+          archive(zipfile.ZipFile): the workbook archive
+          filename(str): the name of the shared-strings member in the archive
+          cache_size(int): the maximum number of decoded strings to keep (default CACHE_SIZE)
+
+        """
+        self.archive = archive
+        self.filename = filename
+        self.cache_size = self.CACHE_SIZE if cache_size is None else cache_size
+        self._offsets = None
+        self._cache = OrderedDict()
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """ Pickle the offset index, but not the archive, stream, cache, or lock
+
+        The owner must set the archive again after unpickling (as
+        xlsxr.workbook.Workbook does).
+
+        """
+        state = self.__dict__.copy()
+        state.update(archive=None, _stream=None, _cache=OrderedDict())
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """ Close the archive stream used for lookups, if open """
+        with self._lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+
+    def __build_index(self):
+        """ Scan the raw XML once for the offset of each <si>, plus the end of the last """
+        offsets = array('Q')
+        end = None
+        pos = 0 # offset of the start of the buffer in the whole stream
+        buffer = b''
+        with self.archive.open(self.filename, "r") as stream:
+            while True:
+                data = stream.read(xlsxr.engines.CHUNK_SIZE)
+                if not data:
+                    break
+                buffer += data
+                last = 0
+                for match in SI_PATTERN.finditer(buffer):
+                    offsets.append(pos + match.start())
+                    last = match.end()
+                match = SST_END_PATTERN.search(buffer, last)
+                if match is not None:
+                    end = pos + match.start()
+                # keep enough of the tail to catch a tag split across reads
+                cut = max(last, len(buffer) - 64)
+                pos += cut
+                buffer = buffer[cut:]
+        offsets.append(pos + len(buffer) if end is None else end)
+        self._offsets = offsets
+        logger.debug("Indexed %d shared strings", len(offsets) - 1)
+
+    def __read_block(self, index):
+        """ Decode a block of entries starting at index, add them to the cache, and return the first
+
+        The caller must hold the lock, because the seek and read share
+        one stream (and one decompressor position).
+
+        """
+        offsets = self._offsets
+        end_index = min(index + self.BLOCK_SIZE, len(offsets) - 1)
+        start, end = offsets[index], offsets[end_index]
+
+        # backward seeks resume from the nearest checkpoint (see xlsxr.inflate)
+        if self._stream is None:
+            self._stream = self.archive.open(self.filename, "r")
+        self._stream.seek(start)
+        data = self._stream.read(end - start)
+
+        strings = xlsxr.engines.SheetEngine.read_shared_strings(io.BytesIO(b'<sst>' + data + b'</sst>'))
+        cache = self._cache
+        for i, s in enumerate(strings, index):
+            cache[i] = s
+            cache.move_to_end(i)
+        s = cache[index]
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return s
+
+    def __len__(self):
+        if self._offsets is None:
+            with self._lock:
+                if self._offsets is None:
+                    self.__build_index()
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("shared string index out of range")
+
+        with self._lock:
+            cache = self._cache
+            s = cache.get(index)
+            if s is None:
+                s = self.__read_block(index)
+            else:
+                cache.move_to_end(index)
+            return s
+
+    def __iter__(self):
+        """ Iterate by streaming the whole table, without using the cache """
+        with self.archive.open(self.filename, "r") as stream:
+            yield from xlsxr.engines.SheetEngine.read_shared_strings(stream)
+
+    def __contains__(self, s):
+        return any(s == item for item in self)
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return "<LazySharedStrings: {}>".format(self.filename)
@@ -1,6 +1,57 @@
-import re, xml.sax
+import functools, xml.sax
+
+from xlsxr.numfmt import compile_format, date_from_excel, from_excel, get_format_code
+from xlsxr.util import get_attr, to_bool, to_num
+
+
+def _as_is(value):
+    return value
+
+def _date_string(value, date1904=False):
+    return date_from_excel(float(value), date1904).isoformat()
+
+def _date_value(value, date1904=False):
+    return date_from_excel(float(value), date1904)
+
+def _datetime_string(value, date1904=False):
+    return from_excel(float(value), date1904).isoformat(timespec='seconds')
+
+def _datetime_value(value, date1904=False):
+    return from_excel(float(value), date1904)
+
+def _display(number_format, date1904, value):
+    return number_format.format(float(value), date1904)
+
+@functools.lru_cache(maxsize=None)
+def number_converter(convert_values, has_date, has_time, date1904=False):
+    """ Return a function to convert the text of a number cell (t="n")
+
+    Parameters:
+      convert_values(bool): if True, return Python values; otherwise strings (with dates in ISO 8601 format)
+      has_date(bool): if True, the cell's format is a date or datetime
+      has_time(bool): if True (and has_date), the cell's format is a datetime
+      date1904(bool): if True, dates use the 1904 date system
+
+    """
+    if not has_date:
+        return to_num if convert_values else _as_is
+    elif has_time:
+        function = _datetime_value if convert_values else _datetime_string
+    else:
+        function = _date_value if convert_values else _date_string
+    return functools.partial(function, date1904=True) if date1904 else function
+
+@functools.lru_cache(maxsize=None)
+def display_converter(code, date1904=False):
+    """ Return a function to render the text of a number cell as Excel displays it
+
+    Parameters:
+      code(str): the number format code (see xlsxr.numfmt)
+      date1904(bool): if True, dates use the 1904 date system
+
+    """
+    return functools.partial(_display, compile_format(code), date1904)
 
-from xlsxr.util import get_attr, to_bool
 
 class Styles:
 
@@ -12,6 +63,8 @@ class Styles:
         self.cell_formats = []
         self.cell_styles = []
 
+        self.__number_converters = {}
+
         handler = Styles.__SAXHandler(self)
         with self.workbook.archive.open(filename, "r") as stream:
             xml.sax.parse(stream, handler)
@@ -19,27 +72,94 @@ class Styles:
         # Guess which cell formats are dates, times, or date-times
         self.__guess_dates()
 
+    def to_json(self):
+        """ Return the parsed styles as a JSON-serialisable dict (see from_json) """
+        return {
+            "number_formats": self.number_formats,
+            "cell_style_formats": self.cell_style_formats,
+            "cell_formats": self.cell_formats,
+            "cell_styles": self.cell_styles,
+        }
+
+    @classmethod
+    def from_json(cls, workbook, data):
+        """ Restore styles saved with to_json, without parsing the styles XML (see xlsxr.cache) """
+        styles = cls.__new__(cls)
+        styles.workbook = workbook
+        styles.number_formats = data["number_formats"]
+        styles.cell_style_formats = data["cell_style_formats"]
+        styles.cell_formats = data["cell_formats"]
+        styles.cell_styles = data["cell_styles"]
+        styles.__number_converters = {}
+        return styles
+
+    def format_code(self, index):
+        """ Return the number format code for a cell format (custom or built in)
+
+        @param index: the index in cell_formats (the s attribute of a cell)
+
+        """
+        return get_format_code(self.cell_formats[index]['numFmtId'], self.number_formats)
+
+    def number_format(self, index):
+        """ Return the compiled xlsxr.numfmt.NumberFormat for a cell format
+
+        @param index: the index in cell_formats (the s attribute of a cell)
+
+        """
+        return compile_format(self.format_code(index))
+
+    def number_converters(self, convert_values=False, date1904=False, display_values=False):
+        """ Return the functions to convert the text of number cells, one for each cell format
+
+        The list is indexed like cell_formats (by the s attribute of
+        a cell), and is built once for each combination of settings,
+        so that parsers don't have to look at the cell format for every
+        cell. See number_converter() and display_converter().
+
+        Parameters:
+          convert_values(bool): if True, return Python values
+          date1904(bool): if True, dates use the 1904 date system
+          display_values(bool): if True, return the text Excel displays (overrides convert_values)
+
+        """
+        key = (convert_values, date1904, display_values,)
+        converters = self.__number_converters.get(key)
+        if converters is None:
+            if display_values:
+                converters = [display_converter(self.format_code(i), date1904) for i in range(len(self.cell_formats))]
+            else:
+                converters = [
+                    number_converter(convert_values, cell_format['has_date'], cell_format['has_time'], date1904)
+                    for cell_format in self.cell_formats
+                ]
+            self.__number_converters[key] = converters
+        return converters
+
+    def text_formatters(self):
+        """ Return the functions to render strings as Excel displays them, one for each cell format
+
+        The list is indexed like cell_formats, with None for the
+        (usual) formats that show strings as they are.
+
+        """
+        formatters = []
+        for i in range(len(self.cell_formats)):
+            number_format = self.number_format(i)
+            formatters.append(None if number_format.text_section is None else number_format.format_text)
+        return formatters
+
     def __guess_dates(self):
-        """ Update the cell formats to flag whether they represent dates and/or times """
-        for cell_format in self.cell_formats:
-            cell_format['has_date'] = False
-            cell_format['has_time'] = False
-
-            # get a cleaned-up version of the format string, with literals removed
-            key = cell_format['numFmtId']
-            if key in self.number_formats:
-                s = self.number_formats[cell_format['numFmtId']]
-                s = re.sub(r'(?:\'[^\']*\'|"[^"]*"|\\.)', '', s).lower()
-
-                # look for key characters
-                for c in ('y', 'd',):
-                    if c in s:
-                        cell_format['has_date'] = True
-                        break
-                for c in ('h', 's',):
-                    if c in s:
-                        cell_format['has_time'] = True
-                        break
+        """ Update the cell formats to flag whether they represent dates and/or times
+
+        Uses the compiled number format (see xlsxr.numfmt), so the
+        built-in date formats (e.g. numFmtId 14) count as well.
+
+        """
+        for i, cell_format in enumerate(self.cell_formats):
+            number_format = self.number_format(i)
+            cell_format['has_date'] = number_format.has_date
+            cell_format['has_time'] = number_format.has_time
 
 
     class __SAXHandler(xml.sax.handler.ContentHandler):
@@ -1,5 +1,17 @@
 """ Utility methods """
 
+import itertools, string
+
+DIGITS = '0123456789'
+""" Characters for the row number in a cell reference """
+
+MAX_COLS = 16384
+""" Number of columns in an Excel sheet (A to XFD) """
+
+_col_letters = []
+_col_nums = {}
+""" The shared tables from col_table() (empty until first needed) """
+
 def get_attr(attributes, name):
     """ Try looking up a DOM attribute, handling an exception """
     try:
@@ -33,8 +45,23 @@ def to_bool(s):
 
 def parse_cell_ref(s):
     """ Return a tuple of the row and column number, zero-based.
-    D3 will return (3, 2)
+    D3 will return (2, 3)
+
+    Looks up the letters in the shared table from col_table() without
+    upper-casing them, and falls back to decoding the reference one
+    character at a time for anything else (lower case, $ signs, or
+    columns past XFD).
     """
+    letters = s.rstrip(DIGITS)
+    col_num = _col_nums.get(letters)
+    if col_num is None or len(letters) == len(s):
+        if not _col_nums:
+            col_table() # for next time
+        return _decode_cell_ref(s)
+    return (int(s[len(letters):]) - 1, col_num,)
+
+def _decode_cell_ref(s):
+    """ Decode any cell reference one character at a time (see parse_cell_ref) """
     row_num = None
     col_num = None
     for c in s.upper():
@@ -59,3 +86,42 @@ def parse_cell_range(s):
     start_ref = parse_cell_ref(start)
     end_ref = parse_cell_ref(end)
     return (start_ref, end_ref,)
+
+def col_letters(col_num):
+    """ Return the letters for a zero-based column number.
+    2 will return "C", and 27 will return "AB"
+    """
+    if 0 <= col_num < MAX_COLS:
+        return col_table()[0][col_num]
+    letters = ''
+    col_num += 1
+    while col_num > 0:
+        col_num, remainder = divmod(col_num - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def col_number(letters):
+    """ Return the zero-based column number for column letters.
+    "C" will return 2, and "AB" will return 27
+    """
+    col_num = col_table()[1].get(letters)
+    if col_num is None:
+        col_num = _decode_cell_ref(letters + '1')[1]
+    return col_num
+
+def col_table():
+    """ Return the column letters for every column from A to XFD, and their numbers.
+    Returns a tuple of a list of the letters (by zero-based column
+    number) and a dict of the zero-based column numbers (by letters).
+    Built the first time it's needed (it takes a few milliseconds),
+    and then shared; don't modify it.
+    """
+    if not _col_letters:
+        alphabet = string.ascii_uppercase
+        letters = list(alphabet)
+        letters += [a + b for a in alphabet for b in alphabet]
+        letters += [''.join(abc) for abc in itertools.product(alphabet, repeat=3)]
+        del letters[MAX_COLS:]
+        _col_nums.update((s, col_num) for col_num, s in enumerate(letters))
+        _col_letters.extend(letters)
+    return _col_letters, _col_nums
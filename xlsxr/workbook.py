@@ -6,7 +6,7 @@
 @date: Started 2020-03-20
 """
 
-import io, logging, requests, shutil, tempfile, xlsxr.style, xlsxr.sheet, xml.dom.pulldom, zipfile
+import logging, shutil, tempfile, xlsxr.cache, xlsxr.engines, xlsxr.inflate, xlsxr.parallel, xlsxr.source, xlsxr.style, xlsxr.sheet, xlsxr.strings, xml.dom.pulldom
 
 logger = logging.getLogger(__name__)
 
@@ -17,47 +17,182 @@ class Workbook:
     """ An Excel XLSX workbook
     """
 
-    def __init__(self, filename=None, stream=None, url=None, convert_values=False, fill_merged=False):
+    def __init__(self, filename=None, stream=None, url=None, convert_values=False, fill_merged=False, streaming=False, engine=None, intern_strings=False, lazy_shared_strings=False, positional_cells=False, display_values=False, sparse_rows=False, cache_dir=None, metadata_only=False):
         """ Open an Excel file.
         One of filename, stream, and url must be specified.
 
         Parameters:
             filename: path to an Excel file on the local system.
-            stream: file-like object (byte stream)
-            url: web address of a remote Excel file
+            stream: file-like object (byte stream); a non-seekable stream is copied to a temporary file first
+            url: web address of a remote Excel file, read with HTTP range requests if the server supports them
             convert_values: if True, convert numbers and dates from strings to Python values (default is False)
             fill_merged: if True, fill merged areas with repeated values
+            streaming: if True, Sheet.rows returns a row iterator instead of a list
+            engine: the name of the parser engine, "sax", "expat", "lxml", or "auto" (default is "auto")
+            intern_strings: if True, keep each shared string once it has been decoded (faster, but more memory)
+            lazy_shared_strings: if True, don't load the shared strings at open time, but look them up on demand
+            positional_cells: if True, ignore the cell references (r attributes) and number the cells in each row
+              by position (faster, but correct only if the sheets leave out no empty cells)
+            display_values: if True, render numbers, dates, and booleans as Excel displays them, using their
+              number formats (see xlsxr.numfmt); overrides convert_values (default is False)
+            sparse_rows: if True, return rows as compact xlsxr.rows.Row objects holding only the non-empty
+              cells, with merged areas looked up instead of copied (default is False)
+            cache_dir: optional path to a directory for caching the parsed workbook and sheets between runs
+              (see xlsxr.cache)
+            metadata_only: if True, parse only the workbook relations and sheet list when opening, and load the
+              shared strings and styles the first time they're used (default is False)
         """
 
+        self.filename = filename
+        """ Path to the workbook file, if opened from one (needed to reopen it in worker processes) """
+
         self.convert_values = convert_values
 
         self.fill_merged = fill_merged
 
+        self.streaming = streaming
+
+        self.intern_strings = intern_strings
+
+        self.lazy_shared_strings = lazy_shared_strings
+
+        self.positional_cells = positional_cells
+
+        self.display_values = display_values
+
+        self.sparse_rows = sparse_rows
+
+        self.metadata_only = metadata_only
+
+        self.cache = None if cache_dir is None else xlsxr.cache.WorkbookCache(cache_dir)
+        """ The xlsxr.cache.WorkbookCache for the parsed workbook and sheets, or None """
+
+        self.cache_key = None
+        """ The workbook's key in the cache """
+
+        self.date1904 = False
+        """ True if the workbook uses the 1904 date system (serial day 0 is 1904-01-01) """
+
+        self.engine = xlsxr.engines.get_engine(engine).name
+        """ Name of the engine actually used to parse sheets and shared strings (see xlsxr.engines) """
+        logger.debug("Using the %s parser engine", self.engine)
+
         if filename is not None:
             logger.debug("Opening from file %s", filename)
-            self.archive = zipfile.ZipFile(filename, "r")
+            self.archive = xlsxr.inflate.SeekableZipFile(filename, "r")
         elif stream is not None:
             logger.debug("Opening from a byte stream")
-            self.archive = zipfile.ZipFile(stream, "r")
+            if hasattr(stream, "seekable") and not stream.seekable():
+                stream = xlsxr.source.spool(stream)
+            self.archive = xlsxr.inflate.SeekableZipFile(stream, "r")
         elif url is not None:
             logger.debug("Opening from a URL %s", url)
-            with requests.get(url, stream=True) as response:
-                self.archive = zipfile.ZipFile(io.BytesIO(response.content))
+            self.archive = xlsxr.inflate.SeekableZipFile(xlsxr.source.open_url(url), "r")
         else:
             raise ValueError("Must specify filename, stream, or url argument")
 
         self.sheets = []
         """ List of xlxr.sheet.Sheet objects """
 
-        self.shared_strings = []
+        self._shared_strings = None
+        self._styles = None
 
         self.relations = dict()
         """ Dict of relations """
 
-        self.styles = None
-        """ Object of type xlsxr.style.Styles with style information """
-
         self.setup() # will throw an exception if it's not an XLSX file
+
+    def __getstate__(self):
+        """ Pickle the parsed workbook without the open archive
+
+        The archive is reopened by filename when unpickling, so worker
+        processes (see xlsxr.parallel) get the already-parsed shared
+        strings and styles without parsing them again.
+
+        @raises TypeError: if the workbook wasn't opened from a filename
+
+        """
+        if self.filename is None:
+            raise TypeError("Only a workbook opened from a filename can be pickled")
+        self.shared_strings, self.styles # load them once here, rather than in every worker
+        state = self.__dict__.copy()
+        del state["archive"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.archive = xlsxr.inflate.SeekableZipFile(self.filename, "r")
+        if isinstance(self._shared_strings, xlsxr.strings.LazySharedStrings):
+            self._shared_strings.archive = self.archive
+
+    @property
+    def shared_strings(self):
+        """ Table of shared strings (see xlsxr.strings.SharedStrings and xlsxr.strings.LazySharedStrings)
+
+        Loaded when the workbook is opened, or on first use with metadata_only.
+
+        """
+        if self._shared_strings is None:
+            self.load_shared_strings()
+        return self._shared_strings
+
+    @shared_strings.setter
+    def shared_strings(self, shared_strings):
+        self._shared_strings = shared_strings
+
+    @property
+    def styles(self):
+        """ Object of type xlsxr.style.Styles with style information
+
+        Loaded when the workbook is opened, or on first use with metadata_only.
+
+        """
+        if self._styles is None:
+            self._styles = xlsxr.style.Styles(self, "xl/styles.xml")
+        return self._styles
+
+    @styles.setter
+    def styles(self, styles):
+        self._styles = styles
+
+    def read_sheets(self, parallel=None):
+        """ Parse all of the sheets, optionally in parallel worker processes
+
+        The rows are also kept in each sheet, as if its rows property
+        had been read (unless the workbook is streaming).
+
+        Parameters:
+          parallel(int): the maximum number of worker processes (default: one per CPU);
+            1 parses the sheets one at a time in this process
+
+        Return:
+          A list of row lists, one for each sheet, in order
+
+        """
+        result = []
+        for sheet, rows in self.iter_all_sheets(parallel):
+            if not self.streaming:
+                sheet._raw_rows = rows
+            result.append(rows)
+        return result
+
+    def iter_all_sheets(self, parallel=None, ordered=True):
+        """ Iterate over the sheets, parsing each one in a worker process
+
+        Each worker reopens the archive by filename, so a workbook opened
+        from a stream or URL is read one sheet at a time in this process.
+        See xlsxr.parallel.
+
+        Parameters:
+          parallel(int): the maximum number of worker processes (default: one per CPU)
+          ordered(bool): if True (default), yield the sheets in workbook order;
+            otherwise, yield each one as soon as it is ready
+
+        Return:
+          An iterator over (sheet, rows) pairs, where rows is a list of rows
+
+        """
+        return xlsxr.parallel.iter_sheets(self, parallel, ordered)
             
 
     def setup(self):
@@ -66,6 +201,11 @@ class Workbook:
 
         """
 
+        if self.cache is not None:
+            self.cache_key = self.cache.workbook_key(self)
+            if self.cache.load_workbook(self):
+                return
+
         try:
             with self.archive.open("xl/_rels/workbook.xml.rels", "r") as stream:
                 self.parse_rels(stream)
@@ -74,14 +214,24 @@ class Workbook:
         except KeyError:
             raise TypeError("Zip archive is not an Excel XLSX workbook")
 
+        if not self.metadata_only:
+            self.load_shared_strings()
+            self.styles # parses them
+            if self.cache is not None:
+                self.cache.save_workbook(self)
+
+    def load_shared_strings(self):
+        """ Load the shared strings (or set up lazy lookups, with lazy_shared_strings) """
+        self._shared_strings = xlsxr.strings.SharedStrings(intern=self.intern_strings)
         try:
-            with self.archive.open("xl/sharedStrings.xml", "r") as stream:
-                self.parse_shared_strings(stream)
+            if self.lazy_shared_strings:
+                self.archive.getinfo("xl/sharedStrings.xml")
+                self._shared_strings = xlsxr.strings.LazySharedStrings(self.archive, "xl/sharedStrings.xml")
+            else:
+                with self.archive.open("xl/sharedStrings.xml", "r") as stream:
+                    self.parse_shared_strings(stream)
         except KeyError:
             logger.info("No sharedStrings.xml in this workbook")
-            
-        self.styles = xlsxr.style.Styles(self, "xl/styles.xml")
-        
 
     def parse_workbook(self, stream):
         """ Parse the workbook metadata
@@ -106,33 +256,16 @@ class Workbook:
                     logger.debug("Creating sheet %s", name)
                     sheet = xlsxr.sheet.Sheet(self, name, sheet_id, state, relation_id, filename)
                     self.sheets.append(sheet)
+                elif node.namespaceURI == SPREADSHEETML_NS and node.localName == 'workbookPr':
+                    self.date1904 = node.getAttribute('date1904').lower() in ('1', 'true',)
         logger.debug("Workbook has %d sheets", len(self.sheets))
 
 
     def parse_shared_strings(self, stream):
         """ Parse the workbook shared strings """
         
-        in_t = False # reading actual text
-        text = None # text accumulator
-        doc = xml.dom.pulldom.parse(stream)
-
-        for event, node in doc:
-            if event == xml.dom.pulldom.START_ELEMENT:
-                if node.localName == 'si':
-                    text = None
-                elif node.localName == 't':
-                    in_t = True
-            elif event == xml.dom.pulldom.END_ELEMENT:
-                if node.localName == 'si':
-                    self.shared_strings.append(text)
-                    text = None
-                elif node.localName == 't':
-                    in_t = False
-            elif event == xml.dom.pulldom.CHARACTERS:
-                if text is None:
-                    text = node.data
-                else:
-                    text.append(node.data)
+        engine = xlsxr.engines.get_engine(self.engine)
+        self.shared_strings.extend(engine.read_shared_strings(stream))
 
         logger.debug("Workbook has %d shared strings", len(self.shared_strings))
 